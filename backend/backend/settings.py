@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -70,16 +71,27 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'childcare_app',  # Replace with your database name
-        'USER': 'postgres',       # Replace with your PostgreSQL username
-        'PASSWORD': 'Kleenex2000',  # Replace with your PostgreSQL password
-        'HOST': 'localhost',     # Default is localhost
-        'PORT': '5432',          # Default PostgreSQL port
+# Connection details can be overridden with the DB_* variables used in
+# docker-compose.yml. DB_ENGINE=sqlite runs everything (including the test
+# suite) offline without a PostgreSQL server.
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'childcare_app'),  # Replace with your database name
+            'USER': os.environ.get('DB_USER', 'postgres'),       # Replace with your PostgreSQL username
+            'PASSWORD': os.environ.get('DB_PASSWORD', 'Kleenex2000'),  # Replace with your PostgreSQL password
+            'HOST': os.environ.get('DB_HOST', 'localhost'),     # Default is localhost
+            'PORT': os.environ.get('DB_PORT', '5432'),          # Default PostgreSQL port
+        }
     }
-}
 
 
 # Password validation
@@ -1,6 +1,6 @@
 # core/admin.py
 from django.contrib import admin
-from .models import Transition, Family, Child, Classroom, Attendance, Payment, Invoice, GovernmentFunding, Deposit, Calendar, SubsidyRate
+from .models import Transition, Family, Child, Classroom, Attendance, Payment, Invoice, GovernmentFunding, Deposit, Calendar, SubsidyRate, WaitlistEntry
 
 # Register models
 admin.site.register(Family)
@@ -18,12 +18,24 @@ class TransitionAdmin(admin.ModelAdmin):
     search_fields = ('child__first_name', 'child__last_name', 'next_classroom__classroom_name')
     list_filter = ('status', 'transition_date')
 
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('first_name', 'last_name', 'program_type', 'desired_start_date', 'priority', 'status',
+                    'matched_classroom', 'matched_start_date')
+    list_filter = ('program_type', 'status')
+    readonly_fields = ('matched_classroom', 'matched_start_date', 'matched_at')
+
 @admin.register(Calendar)
 class CalendarAdmin(admin.ModelAdmin):
-    list_display = ('date', 'is_stat_holiday', 'is_closed', 'stat_substitution_date')
-    list_filter = ('is_stat_holiday', 'is_closed')
+    list_display = ('date', 'is_stat_holiday', 'is_closed', 'stat_substitution_date', 'manual')
+    list_filter = ('is_stat_holiday', 'is_closed', 'manual')
     search_fields = ('date',)
 
+    def save_model(self, request, obj, form, change):
+        # Days edited here are kept when the calendar is rebuilt
+        obj.manual = True
+        super().save_model(request, obj, form, change)
+
 @admin.register(Child)
 class ChildAdmin(admin.ModelAdmin):
     list_display = (
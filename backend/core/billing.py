@@ -0,0 +1,200 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Min, Q, Sum
+from django.db.models.functions import Coalesce
+
+from core.calendar_service import get_calendar, month_bounds
+from core.funding import reconcile_funding
+from core.ledger import sync_ledger
+from core.models import Child, Classroom, Invoice, Withdrawal
+from core.occupancy import effective_spans
+from core.payments import allocate_payments
+from core.rates import CENTS, load_rates
+
+def billable_days(first, last, rates, child_ids=None):
+    """Count each child's billable open days in [first, last] per rate version.
+
+    Returns {child_id: {SubsidyRate: days}}. The program comes from the
+    child's effective classroom, so a mid-month transition splits the month
+    between two programs, and ``rates`` (a RateTable) splits it again where
+    a rate version changes. Billing stops at the enrollment end date or the
+    earliest withdrawal date, whichever comes first. Open days are counted
+    from the calendar prefix sums, so the cost is one bisect per span.
+    """
+    calendar = get_calendar()
+    programs = dict(Classroom.objects.values_list('id', 'program_type'))
+    withdrawals = Withdrawal.objects.filter(withdrawal_date__lte=last)
+    if child_ids is not None:
+        withdrawals = withdrawals.filter(child_id__in=child_ids)
+    withdrawn = dict(
+        withdrawals.values('child_id').annotate(first_withdrawal=Min('withdrawal_date'))
+        .values_list('child_id', 'first_withdrawal')
+    )
+
+    days = defaultdict(lambda: defaultdict(int))
+    for child_id, classroom_id, _, start, end in effective_spans(first, last, child_ids=child_ids):
+        program = programs.get(classroom_id)
+        if program is None:
+            continue
+        start = max(start, first)
+        end = min(end or last, last, withdrawn.get(child_id, last))
+        for segment_start, segment_end, rate in rates.segments(program, start, end):
+            count = calendar.open_days_between(segment_start, segment_end)
+            if count:
+                days[child_id][rate] += count
+    return days
+
+
+def build_invoices(first, last, days, due_date):
+    """Price ``days`` (as returned by billable_days) into unsaved Invoices.
+
+    Children with no billable days get no invoice.
+    """
+    families = dict(Child.objects.filter(id__in=list(days)).values_list('id', 'family_id'))
+    invoices = []
+    for child_id, by_rate in days.items():
+        full = sum((rate.daily_tuition_rate * count for rate, count in by_rate.items()), Decimal(0))
+        parent = sum((rate.daily_parent_rate * count for rate, count in by_rate.items()), Decimal(0))
+        billed = sum(by_rate.values())
+        if not billed:
+            continue
+        full, parent = full.quantize(CENTS), parent.quantize(CENTS)
+        invoices.append(Invoice(
+            due_date=due_date,
+            full_tuition=full,
+            # Derived so that full tuition always equals parent + subsidy
+            subsidy_amount=full - parent,
+            parent_portion=parent,
+            child_id=child_id,
+            family_id=families[child_id],
+            billing_period_start=first,
+            billing_period_end=last,
+            notes=f"{billed} billable days",
+        ))
+    return invoices
+
+
+def run_billing(year, month, batch_size=1000):
+    """Create the month's tuition invoices for every active child.
+
+    Each day is priced at the rate in effect on it, so a past month can be
+    billed at the rates that applied then. Children that already have an
+    invoice for the month are skipped, so the run can be repeated safely;
+    the invoice_billing_run constraint stops a concurrent run from billing
+    a child twice, and the run then skips the children it billed.
+    Everything happens in one transaction with a fixed number of queries.
+    The new invoices are posted to the ledger, open payments are allocated
+    to them and the month's funding reconciliation is refreshed. Returns the
+    created invoices.
+    """
+    first, last = month_bounds(year, month)
+    due_date = get_calendar().nth_business_day(year, month, 1) or first
+    with transaction.atomic():
+        days = billable_days(first, last, load_rates())
+        for attempt in range(2):
+            invoiced = set(
+                Invoice.objects.filter(billing_period_start=first, adjusts__isnull=True)
+                .values_list('child_id', flat=True)
+            )
+            pending = {child_id: by_rate for child_id, by_rate in days.items() if child_id not in invoiced}
+            try:
+                with transaction.atomic():
+                    invoices = Invoice.objects.bulk_create(
+                        build_invoices(first, last, pending, due_date), batch_size=batch_size
+                    )
+                break
+            except IntegrityError:
+                # Another run billed some of these children first
+                if attempt:
+                    raise
+        # Bulk inserts bypass the signals: post to the ledger and apply any
+        # payments on account to the new invoices
+        family_ids = {invoice.family_id for invoice in invoices}
+        sync_ledger(family_ids)
+        allocate_payments(family_ids)
+        reconcile_funding(first, last)
+        return invoices
+
+
+def recalculate_invoices(child_ids, start=None, end=None, today=None):
+    """Re-price billing-run invoices after an enrollment change.
+
+    Only invoices of ``child_ids`` whose billing period overlaps [start, end]
+    (``None`` leaves that side open) are recomputed. Where the new amounts
+    differ from what was billed, including earlier adjustments, an adjustment
+    invoice for the difference is created; a negative one is a credit.
+    The funding reconciliation of the adjusted months is refreshed.
+    Returns the created adjustments.
+    """
+    today = today or date.today()
+    invoices = Invoice.objects.filter(
+        child_id__in=child_ids, adjusts__isnull=True, billing_period_start__isnull=False
+    )
+    if start is not None:
+        invoices = invoices.filter(billing_period_end__gte=start)
+    if end is not None:
+        invoices = invoices.filter(billing_period_start__lte=end)
+    originals = list(invoices.values('id', 'child_id', 'family_id', 'billing_period_start', 'billing_period_end'))
+    if not originals:
+        return []
+
+    billed = {
+        row['original']: (row['billed_full'], row['billed_parent'])
+        for row in Invoice.objects.filter(
+            Q(id__in=[invoice['id'] for invoice in originals])
+            | Q(adjusts_id__in=[invoice['id'] for invoice in originals])
+        )
+        .annotate(original=Coalesce('adjusts_id', 'id'))
+        .values('original')
+        .annotate(billed_full=Sum('full_tuition'), billed_parent=Sum('parent_portion'))
+        .order_by()
+    }
+
+    periods = defaultdict(list)
+    for invoice in originals:
+        periods[(invoice['billing_period_start'], invoice['billing_period_end'])].append(invoice)
+
+    rates = load_rates()
+    due_date = get_calendar().nth_open_day(today, 1) or today
+    adjustments = []
+    for (first, last), period_invoices in periods.items():
+        period_children = [invoice['child_id'] for invoice in period_invoices]
+        days = billable_days(first, last, rates, child_ids=period_children)
+        expected = {
+            invoice.child_id: invoice for invoice in build_invoices(first, last, days, due_date)
+        }
+        for invoice in period_invoices:
+            billed_full, billed_parent = billed[invoice['id']]
+            new = expected.get(invoice['child_id'])
+            full = (new.full_tuition if new else Decimal(0)) - billed_full
+            parent = (new.parent_portion if new else Decimal(0)) - billed_parent
+            if not full and not parent:
+                continue
+            adjustments.append(Invoice(
+                due_date=due_date,
+                full_tuition=full,
+                subsidy_amount=full - parent,
+                parent_portion=parent,
+                child_id=invoice['child_id'],
+                family_id=invoice['family_id'],
+                billing_period_start=first,
+                billing_period_end=last,
+                adjusts_id=invoice['id'],
+                # A credit has nothing left to pay
+                payment_status="Paid" if parent <= 0 else "Unpaid",
+                notes=f"Adjustment: {new.notes if new else '0 billable days'}",
+            ))
+    with transaction.atomic():
+        adjustments = Invoice.objects.bulk_create(adjustments)
+        family_ids = {invoice.family_id for invoice in adjustments}
+        sync_ledger(family_ids)
+        allocate_payments(family_ids)
+        if adjustments:
+            reconcile_funding(
+                min(invoice.billing_period_start for invoice in adjustments),
+                max(invoice.billing_period_end for invoice in adjustments),
+            )
+    return adjustments
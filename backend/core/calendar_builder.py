@@ -0,0 +1,151 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from core.calendar_service import invalidate_calendar
+from core.models import Calendar
+from core.occupancy import refresh_daily_occupancy
+
+
+# Functions to calculate specific holidays
+def nth_weekday(year, month, weekday, n):
+    # The nth (1-based) occurrence of ``weekday`` (Monday=0) in the month
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def third_monday_of_february(year):
+    return nth_weekday(year, 2, 0, 3)
+
+
+def friday_before_easter(year):
+    # Computus algorithm to calculate Easter Sunday
+    a = year % 19
+    b = year // 100
+    c = year % 100
+    d = b // 4
+    e = b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i = c // 4
+    k = c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = ((h + l - 7 * m + 114) % 31) + 1
+
+    # Good Friday is two days before Easter Sunday
+    return date(year, month, day) - timedelta(days=2)
+
+
+def last_monday_before_may_25(year):
+    may_24 = date(year, 5, 24)
+    return may_24 - timedelta(days=may_24.weekday())
+
+
+def first_monday_of_august(year):
+    return nth_weekday(year, 8, 0, 1)
+
+
+def first_monday_of_september(year):
+    return nth_weekday(year, 9, 0, 1)
+
+
+def second_monday_of_october(year):
+    return nth_weekday(year, 10, 0, 2)
+
+
+def fixed_date(month, day):
+    return lambda year: date(year, month, day)
+
+
+STAT_HOLIDAYS = {
+    "New Year's Day": fixed_date(1, 1),
+    "Family Day": third_monday_of_february,
+    "Good Friday": friday_before_easter,
+    "Victoria Day": last_monday_before_may_25,
+    "Canada Day": fixed_date(7, 1),
+    "Civic Holiday": first_monday_of_august,
+    "Labour Day": first_monday_of_september,
+    "Thanksgiving Day": second_monday_of_october,
+    "Christmas Day": fixed_date(12, 25),
+    "Boxing Day": fixed_date(12, 26),
+}
+
+
+def stat_holidays(start_year, end_year):
+    """Return {holiday date: substitution date or None} for the year range.
+
+    A holiday falling on a weekend is observed on the next weekday that is
+    not already a holiday or another holiday's substitution day, so Christmas
+    on a Saturday and Boxing Day on a Sunday move to Monday and Tuesday.
+    """
+    holidays = sorted(
+        rule(year) for year in range(start_year, end_year + 1) for rule in STAT_HOLIDAYS.values()
+    )
+    taken = set(holidays)
+    substitutions = {}
+    for holiday in holidays:
+        if holiday.weekday() < 5:
+            substitutions[holiday] = None
+            continue
+        observed = holiday + timedelta(days=1)
+        while observed.weekday() >= 5 or observed in taken:
+            observed += timedelta(days=1)
+        taken.add(observed)
+        substitutions[holiday] = observed
+    return substitutions
+
+
+def calendar_rows(start_year, end_year, skip_dates=()):
+    """Compute Calendar rows in memory for every day of the year range.
+
+    Days in ``skip_dates`` (the ones set by hand) get no row.
+    """
+    holidays = stat_holidays(start_year, end_year)
+    substitution_days = {observed for observed in holidays.values() if observed}
+    skip_dates = set(skip_dates)
+
+    rows = []
+    day = date(start_year, 1, 1)
+    last = date(end_year, 12, 31)
+    while day <= last:
+        if day not in skip_dates:
+            is_weekday = day.weekday() < 5
+            is_stat_holiday = day in holidays or day in substitution_days
+            rows.append(Calendar(
+                date=day,
+                is_weekday=is_weekday,
+                is_stat_holiday=is_stat_holiday,
+                stat_substitution_date=holidays.get(day),
+                is_closed=not is_weekday or is_stat_holiday,
+            ))
+        day += timedelta(days=1)
+    return rows
+
+
+def build_calendar(start_year, end_year, batch_size=1000):
+    """Create or update every Calendar day from ``start_year`` to ``end_year``.
+
+    Weekdays, stat holidays and substitution days are computed in memory and
+    written with one upsert per batch inside a single transaction. Days set
+    by hand (``Calendar.manual``) are left as they are; every other day is
+    reset to the rules, so rows written by older versions of the rules are
+    corrected. Returns the number of days written.
+    """
+    first, last = date(start_year, 1, 1), date(end_year, 12, 31)
+    with transaction.atomic():
+        manual_dates = Calendar.objects.filter(date__range=(first, last), manual=True).values_list('date', flat=True)
+        rows = calendar_rows(start_year, end_year, manual_dates)
+        Calendar.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=['is_weekday', 'is_stat_holiday', 'stat_substitution_date', 'is_closed'],
+        )
+        # Bulk writes bypass the Calendar signals
+        refresh_daily_occupancy(first, last)
+    invalidate_calendar()
+    return len(rows)
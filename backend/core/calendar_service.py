@@ -0,0 +1,126 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.models import Calendar
+
+WEEKDAY = 1
+STAT_HOLIDAY = 2
+CLOSED = 4
+
+
+class CalendarIndex:
+    """Compact in-memory copy of the Calendar table.
+
+    Dates are kept as a sorted array of ordinals with a parallel array of
+    bit flags and a prefix sum of open days, so lookups are a bisect and
+    open-day counts are a subtraction.
+    """
+
+    def __init__(self, rows):
+        # ``rows`` are (date, is_weekday, is_stat_holiday, is_closed) sorted by date
+        self.ordinals = array('l')
+        self.flags = bytearray()
+        self.open_prefix = array('l', [0])  # open_prefix[i]: open days among the first i dates
+        for day, is_weekday, is_stat_holiday, is_closed in rows:
+            flags = (WEEKDAY if is_weekday else 0) | (STAT_HOLIDAY if is_stat_holiday else 0) | (CLOSED if is_closed else 0)
+            self.ordinals.append(day.toordinal())
+            self.flags.append(flags)
+            self.open_prefix.append(self.open_prefix[-1] + (flags == WEEKDAY))
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def _position(self, day):
+        i = bisect_left(self.ordinals, day.toordinal())
+        if i < len(self.ordinals) and self.ordinals[i] == day.toordinal():
+            return i
+        return None
+
+    def flags_for(self, day):
+        # Bit flags for ``day``, or None when the date is not in the calendar
+        i = self._position(day)
+        return None if i is None else self.flags[i]
+
+    def is_open(self, day):
+        # Open means a weekday that is neither a stat holiday nor closed
+        return self.flags_for(day) == WEEKDAY
+
+    def days(self):
+        # Yield (date, flags) for every calendar date in order
+        for ordinal, flags in zip(self.ordinals, self.flags):
+            yield date.fromordinal(ordinal), flags
+
+    def open_days_between(self, start, end):
+        # Number of open days from ``start`` to ``end`` inclusive
+        if end < start:
+            return 0
+        lo = bisect_left(self.ordinals, start.toordinal())
+        hi = bisect_right(self.ordinals, end.toordinal())
+        return self.open_prefix[hi] - self.open_prefix[lo]
+
+    def open_days(self, start, end):
+        # The open dates from ``start`` to ``end`` inclusive
+        lo = bisect_left(self.ordinals, start.toordinal())
+        hi = bisect_right(self.ordinals, end.toordinal())
+        return [
+            date.fromordinal(self.ordinals[i]) for i in range(lo, hi) if self.flags[i] == WEEKDAY
+        ]
+
+    def nth_open_day(self, start, n):
+        # The nth (1-based) open day on or after ``start``, or None
+        if n < 1:
+            return None
+        lo = bisect_left(self.ordinals, start.toordinal())
+        i = bisect_left(self.open_prefix, self.open_prefix[lo] + n)
+        if i >= len(self.open_prefix):
+            return None
+        return date.fromordinal(self.ordinals[i - 1])
+
+    def nth_business_day(self, year, month, n):
+        # The nth open day of the month, or None if the month has fewer
+        day = self.nth_open_day(date(year, month, 1), n)
+        if day is None or (day.year, day.month) != (year, month):
+            return None
+        return day
+
+
+def month_bounds(year, month):
+    first = date(year, month, 1)
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return first, last
+
+
+# Each process keeps its own index; the version in the shared Django cache
+# tells it when another process has changed the Calendar table
+VERSION_KEY = 'calendar_version'
+_index = None
+_version = None
+
+
+def get_calendar():
+    """Return the cached CalendarIndex, reloading it when the version changes."""
+    global _index, _version
+    version = cache.get(VERSION_KEY)
+    if _index is None or version != _version:
+        _index = CalendarIndex(
+            Calendar.objects.order_by('date').values_list('date', 'is_weekday', 'is_stat_holiday', 'is_closed')
+        )
+        _version = version
+    return _index
+
+
+def _bump_version():
+    cache.set(VERSION_KEY, uuid4().hex, None)
+
+
+def invalidate_calendar():
+    # Called from the Calendar signals and after bulk calendar writes. Other
+    # processes reload once the change is committed.
+    global _index
+    _index = None
+    transaction.on_commit(_bump_version)
@@ -0,0 +1,205 @@
+from bisect import bisect_right
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, timedelta
+from heapq import heappop, heappush
+
+from django.db.models import Min
+
+from core.models import Classroom, Withdrawal
+from core.occupancy import effective_spans
+
+
+def add_months(day, months):
+    # Same day ``months`` later, clamped to the end of a shorter month
+    year, month = divmod(day.month - 1 + months, 12)
+    year, month = day.year + year, month + 1
+    return date(year, month, min(day.day, monthrange(year, month)[1]))
+
+
+def occupancy_timeline(first, last, classroom_ids=None):
+    """Projected enrolment per classroom over [first, last] as change points.
+
+    Returns {classroom_id: [(date, enrolled), ...]} sorted by date, starting
+    with the count on ``first`` and followed by every date the count changes.
+    Starts, enrollment ends, withdrawals and transitions become +1/-1 events
+    that are swept once in date order, so the cost does not depend on the
+    length of the range. A withdrawn child counts up to their withdrawal
+    date.
+    """
+    if classroom_ids is None:
+        classroom_ids = Classroom.objects.values_list('id', flat=True)
+    rooms = list(classroom_ids)
+    withdrawn = dict(
+        Withdrawal.objects.filter(withdrawal_date__lte=last).values('child_id')
+        .annotate(first_withdrawal=Min('withdrawal_date')).values_list('child_id', 'first_withdrawal')
+    )
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for child_id, classroom_id, _, start, end in effective_spans(first, last, rooms):
+        start = max(start, first)
+        end = min(end or last, last, withdrawn.get(child_id, last))
+        if end < start:
+            continue
+        deltas[classroom_id][start] += 1
+        if end < last:
+            deltas[classroom_id][end + timedelta(days=1)] -= 1
+
+    timeline = {}
+    for classroom_id in rooms:
+        enrolled, points = 0, [(first, 0)]
+        for day in sorted(deltas[classroom_id]):
+            enrolled += deltas[classroom_id][day]
+            if day == first:
+                points[0] = (first, enrolled)
+            elif enrolled != points[-1][1]:
+                points.append((day, enrolled))
+        timeline[classroom_id] = points
+    return timeline
+
+
+class SeatTimeline:
+    """Free seats in one classroom up to ``last``, as change points.
+
+    Built from one classroom's occupancy_timeline() points and its capacity.
+    Planned moves are applied in place with add(), so children can be
+    placed one after another against the updated counts.
+    """
+
+    def __init__(self, points, capacity, last):
+        self.dates = [day for day, _ in points]
+        self.free = [capacity - enrolled for _, enrolled in points]
+        self.last = last
+        self._open_from = None
+        self._stale = True
+
+    def _split(self, day):
+        # Index of the change point starting on ``day``, inserting one if needed
+        i = bisect_right(self.dates, day) - 1
+        if self.dates[i] != day:
+            i += 1
+            self.dates.insert(i, day)
+            self.free.insert(i, self.free[i - 1])
+        return i
+
+    def add(self, start, end, seats):
+        # Change the free seats on every day of [start, end] (end None is open)
+        start = max(start, self.dates[0])
+        if end is not None and end < start:
+            return
+        i = self._split(start)
+        j = self._split(end + timedelta(days=1)) if end is not None and end < self.last else len(self.dates)
+        for n in range(i, j):
+            self.free[n] += seats
+        self._stale = True
+
+    def open_from(self):
+        # First date from which a seat stays free to the end, or None; cached
+        # until the next add()
+        if self._stale:
+            n = len(self.free)
+            while n and self.free[n - 1] > 0:
+                n -= 1
+            self._open_from = self.dates[n] if n < len(self.dates) else None
+            self._stale = False
+        return self._open_from
+
+    def first_free_from(self, day, until=None):
+        """Earliest date on or after ``day`` from which a seat stays free up to ``until``.
+
+        ``until`` defaults to the end of the timeline. Returns None if no
+        such date exists.
+        """
+        until = min(until or self.last, self.last)
+        day = max(day, self.dates[0])
+        if day > until:
+            return None
+        if until == self.last:
+            start = self.open_from()
+            return None if start is None else max(day, start)
+        i = bisect_right(self.dates, day) - 1
+        k = bisect_right(self.dates, until) - 1
+        for n in range(k, i - 1, -1):
+            if self.free[n] <= 0:
+                return self.dates[n + 1] if n < k else None
+        return day
+
+
+class ClassroomSeats:
+    """A SeatTimeline per classroom over [first, last], grouped by program type.
+
+    Each program also keeps a heap of its rooms by the date a seat opens
+    for good, so an open-ended placement is found without looking at every
+    room. Heap entries whose room has changed since are skipped lazily.
+    """
+
+    def __init__(self, first, last):
+        self.last = last
+        classrooms = list(Classroom.objects.order_by('id').values_list('id', 'program_type', 'max_capacity'))
+        timeline = occupancy_timeline(first, last, [classroom_id for classroom_id, _, _ in classrooms])
+        self.seats = {
+            classroom_id: SeatTimeline(timeline[classroom_id], capacity, last)
+            for classroom_id, _, capacity in classrooms
+        }
+        self.programs = {classroom_id: program for classroom_id, program, _ in classrooms}
+        self.rooms = defaultdict(list)
+        self.opening = defaultdict(list)
+        for classroom_id, program, _ in classrooms:
+            self.rooms[program].append(classroom_id)
+            self._push(classroom_id)
+
+    def _push(self, room):
+        start = self.seats[room].open_from()
+        if start is not None:
+            heappush(self.opening[self.programs[room]], (start, room))
+
+    def earliest(self, program, day, until=None):
+        """(date, classroom_id) of the earliest seat in ``program`` from ``day``.
+
+        The seat must stay free up to ``until`` (the end of the timeline by
+        default). Returns None if no room has one.
+        """
+        if until is not None and until < self.last:
+            options = [
+                (start, room) for room in self.rooms[program]
+                for start in [self.seats[room].first_free_from(day, until)] if start is not None
+            ]
+            return min(options) if options else None
+        heap = self.opening[program]
+        while heap and heap[0][0] != self.seats[heap[0][1]].open_from():
+            heappop(heap)
+        return (max(day, heap[0][0]), heap[0][1]) if heap else None
+
+    def add(self, room, start, end, seats):
+        # Change the free seats of ``room`` on every day of [start, end]
+        self.seats[room].add(start, end, seats)
+        self._push(room)
+
+
+def capacity_forecast(first, months=12):
+    """Projected enrolment against capacity for every classroom.
+
+    Covers ``months`` months from ``first``. Each classroom lists its change
+    points, its peak, and the first date enrolment goes over max_capacity
+    (None if it never does). Alternative capacities are returned alongside
+    so the office can see what a room would hold if repurposed.
+    """
+    last = add_months(first, months) - timedelta(days=1)
+    classrooms = list(Classroom.objects.prefetch_related('alternative_capacities').order_by('id'))
+    timeline = occupancy_timeline(first, last, [classroom.id for classroom in classrooms])
+    forecast = []
+    for classroom in classrooms:
+        points = timeline[classroom.id]
+        forecast.append({
+            "classroom_id": classroom.id,
+            "classroom_name": classroom.classroom_name,
+            "program_type": classroom.program_type,
+            "capacity": classroom.max_capacity,
+            "alternative_capacities": list(classroom.alternative_capacities.all()),
+            "peak_enrolled": max(enrolled for _, enrolled in points),
+            "first_over_capacity": next(
+                (day for day, enrolled in points if enrolled > classroom.max_capacity), None
+            ),
+            "changes": [{"date": day, "enrolled": enrolled} for day, enrolled in points],
+        })
+    return {"start": first, "end": last, "classrooms": forecast}
@@ -0,0 +1,123 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+from core.calendar_service import get_calendar, month_bounds
+from core.models import DailyOccupancy, FundingReconciliation, GovernmentFunding, Invoice
+from core.rates import CENTS, load_rates
+
+# Invoice.subsidy_amount is the CWELCCA daily subsidy, so it is reconciled
+# against receipts in this stream
+SUBSIDY_STREAM = "CWELCCA"
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _in_range(queryset, field, start, end):
+    if start is not None:
+        queryset = queryset.filter(**{f"{field}__gte": start})
+    if end is not None:
+        queryset = queryset.filter(**{f"{field}__lte": end})
+    return queryset
+
+
+def subsidy_invoiced_by_month(start=None, end=None):
+    # Invoiced subsidy per billed month; manual invoices count in their due month
+    invoices = Invoice.objects.annotate(billed_on=Coalesce('billing_period_start', 'due_date'))
+    invoices = _in_range(invoices, 'billed_on', start, end)
+    return dict(
+        invoices.values(month=TruncMonth('billed_on')).annotate(total=Sum('subsidy_amount'))
+        .values_list('month', 'total').order_by()
+    )
+
+
+def subsidy_from_occupancy_by_month(start=None, end=None):
+    """Estimate the subsidy owed from DailyOccupancy x daily_CWELCCA_rate.
+
+    Only open days count. One grouped query returns enrolment per date and
+    program; the calendar and the rate in effect on each day are in-memory
+    lookups.
+    """
+    calendar = get_calendar()
+    rates = load_rates()
+    rows = _in_range(DailyOccupancy.objects.all(), 'date', start, end)
+    totals = defaultdict(Decimal)
+    for day, program, enrolled in (
+        rows.values('date', 'classroom__program_type').annotate(total=Sum('enrolled'))
+        .values_list('date', 'classroom__program_type', 'total').order_by()
+    ):
+        rate = rates.rate_for(program, day)
+        if rate is not None and enrolled and calendar.is_open(day):
+            totals[_month(day)] += rate.daily_CWELCCA_rate * enrolled
+    return totals
+
+
+def funding_by_month(start=None, end=None):
+    # {(stream, month): amount received}
+    receipts = _in_range(GovernmentFunding.objects.all(), 'date_received', start, end)
+    return {
+        (stream, month): total
+        for stream, month, total in receipts.values('stream', month=TruncMonth('date_received'))
+        .annotate(total=Sum('amount_received')).values_list('stream', 'month', 'total').order_by()
+    }
+
+
+def update_remaining_amounts(stream=SUBSIDY_STREAM):
+    """Draw the invoiced subsidy down from the stream's receipts, oldest first.
+
+    Sets GovernmentFunding.remaining_amount on every receipt in the stream.
+    """
+    owed = Invoice.objects.aggregate(total=Sum('subsidy_amount'))['total'] or Decimal(0)
+    receipts = list(GovernmentFunding.objects.filter(stream=stream).order_by('date_received', 'id'))
+    for receipt in receipts:
+        used = min(max(owed, 0), receipt.amount_received)
+        receipt.remaining_amount = receipt.amount_received - used
+        owed -= used
+    GovernmentFunding.objects.bulk_update(receipts, ['remaining_amount'], batch_size=1000)
+
+
+def reconcile_funding(start=None, end=None):
+    """Store a FundingReconciliation row per stream and month in [start, end].
+
+    ``None`` leaves that side of the range open. Subsidy owed is only
+    attributed to the CWELCCA stream; other streams show what was received.
+    Returns the number of rows written.
+    """
+    start = _month(start) if start is not None else None
+    with transaction.atomic():
+        invoiced = subsidy_invoiced_by_month(start, end)
+        from_occupancy = subsidy_from_occupancy_by_month(start, end)
+        received = funding_by_month(start, end)
+
+        keys = set(received) | {(SUBSIDY_STREAM, month) for month in set(invoiced) | set(from_occupancy)}
+        rows = []
+        for stream, month in sorted(keys):
+            owed = invoiced.get(month, Decimal(0)) if stream == SUBSIDY_STREAM else Decimal(0)
+            estimated = from_occupancy.get(month, Decimal(0)) if stream == SUBSIDY_STREAM else Decimal(0)
+            funding = received.get((stream, month), Decimal(0))
+            rows.append(FundingReconciliation(
+                stream=stream,
+                period_start=month,
+                period_end=month_bounds(month.year, month.month)[1],
+                subsidy_invoiced=owed,
+                subsidy_from_occupancy=estimated.quantize(CENTS),
+                funding_received=funding,
+                variance=funding - owed,
+            ))
+        FundingReconciliation.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['stream', 'period_start'],
+            update_fields=[
+                'period_end', 'subsidy_invoiced', 'subsidy_from_occupancy', 'funding_received', 'variance',
+                'computed_at',
+            ],
+        )
+        update_remaining_amounts()
+    return len(rows)
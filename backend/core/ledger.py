@@ -0,0 +1,198 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Min, Sum
+
+from core.models import Deposit, Family, Invoice, LedgerEntry, LedgerSnapshot, Payment
+
+AGING_BUCKETS = ('current', '30', '60', '90+')
+
+
+def aging_bucket(days_past_due):
+    # current is under 30 days past due (or not yet due), then 30/60/90+
+    if days_past_due < 30:
+        return 'current'
+    if days_past_due < 60:
+        return '30'
+    if days_past_due < 90:
+        return '60'
+    return '90+'
+
+
+def expected_entries(family_ids=None):
+    """What the ledger should add up to for every invoice, payment and deposit.
+
+    Returns {(family_id, source_type, source_id, entry_type): (date, amount,
+    description)}.
+    """
+    invoices = Invoice.objects.all()
+    payments = Payment.objects.all()
+    deposits = Deposit.objects.filter(date_collected__isnull=False).exclude(status='Owing')
+    if family_ids is not None:
+        invoices = invoices.filter(family_id__in=family_ids)
+        payments = payments.filter(family_id__in=family_ids)
+        deposits = deposits.filter(child__family_id__in=family_ids)
+
+    expected = {}
+    for invoice_id, family_id, due_date, full, subsidy in invoices.values_list(
+        'id', 'family_id', 'due_date', 'full_tuition', 'subsidy_amount'
+    ):
+        expected[(family_id, 'invoice', invoice_id, 'charge')] = (due_date, full, f"Tuition, invoice {invoice_id}")
+        expected[(family_id, 'invoice', invoice_id, 'subsidy_credit')] = (
+            due_date, -subsidy, f"Subsidy, invoice {invoice_id}"
+        )
+    for payment_id, family_id, payment_date, amount, method in payments.values_list(
+        'id', 'family_id', 'payment_date', 'amount_paid', 'method'
+    ):
+        expected[(family_id, 'payment', payment_id, 'payment')] = (
+            payment_date, -amount, f"Payment {payment_id} ({method})"
+        )
+    for deposit_id, family_id, deposit_type, amount, deposit_status, collected, refunded in deposits.values_list(
+        'id', 'child__family_id', 'deposit_type', 'amount', 'status', 'date_collected', 'date_refunded'
+    ):
+        # A held deposit is money the centre keeps on the family's behalf
+        expected[(family_id, 'deposit', deposit_id, 'deposit_hold')] = (
+            collected, -amount, f"{deposit_type} deposit held"
+        )
+        if deposit_status == 'Refunded':
+            expected[(family_id, 'deposit', deposit_id, 'deposit_refund')] = (
+                refunded or collected, amount, f"{deposit_type} deposit refunded"
+            )
+        elif deposit_status == 'Forfeited':
+            expected[(family_id, 'deposit', deposit_id, 'deposit_forfeit')] = (
+                refunded or collected, amount, f"{deposit_type} deposit forfeited"
+            )
+    return expected
+
+
+def sync_ledger(family_ids=None, today=None):
+    """Post ledger entries so each source's entries add up to its current values.
+
+    New sources get their entries, changed ones a correction for the
+    difference and deleted ones a reversal; nothing already posted is
+    modified. Corrections and reversals are dated ``today`` (the day they
+    are recorded), with the source's date in the description, so closed
+    periods keep their balances. Snapshots that a back-dated new entry would
+    make stale are dropped. Returns the entries posted.
+    """
+    today = today or date.today()
+    with transaction.atomic():
+        expected = expected_entries(family_ids)
+        posted = LedgerEntry.objects.all()
+        if family_ids is not None:
+            posted = posted.filter(family_id__in=family_ids)
+        posted = {
+            (row['family_id'], row['source_type'], row['source_id'], row['entry_type']): row
+            for row in posted.values('family_id', 'source_type', 'source_id', 'entry_type')
+            .annotate(total=Sum('amount'), first_date=Min('date'))
+            .order_by()
+        }
+
+        entries = []
+        for key in sorted(expected.keys() | posted.keys()):
+            family_id, source_type, source_id, entry_type = key
+            already = posted[key] if key in posted else None
+            if key not in expected:
+                day, amount = today, Decimal(0)
+                description = f"Reversal, {source_type} {source_id} of {already['first_date']} removed"
+            elif already:
+                source_day, amount, description = expected[key]
+                day, description = today, f"Correction: {description} of {source_day}"
+            else:
+                day, amount, description = expected[key]
+            difference = amount - (already['total'] if already else 0)
+            if difference:
+                entries.append(LedgerEntry(
+                    family_id=family_id, date=day, entry_type=entry_type, amount=difference,
+                    description=description, source_type=source_type, source_id=source_id,
+                ))
+        # Entries may outlive their family row within a cascade delete
+        live_families = set(Family.objects.filter(
+            id__in={entry.family_id for entry in entries}
+        ).values_list('id', flat=True)) if entries else set()
+        entries = [entry for entry in entries if entry.family_id in live_families]
+        entries = LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+        if entries:
+            LedgerSnapshot.objects.filter(
+                family_id__in=live_families, date__gte=min(entry.date for entry in entries)
+            ).delete()
+    return entries
+
+
+def take_snapshots(day, family_ids=None):
+    """Store each family's balance as of ``day``. Returns the number written."""
+    entries = LedgerEntry.objects.filter(date__lte=day)
+    if family_ids is not None:
+        entries = entries.filter(family_id__in=family_ids)
+    snapshots = [
+        LedgerSnapshot(family_id=family_id, date=day, balance=balance)
+        for family_id, balance in entries.values('family_id').annotate(balance=Sum('amount'))
+        .values_list('family_id', 'balance').order_by()
+    ]
+    LedgerSnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['family', 'date'],
+        update_fields=['balance'],
+    )
+    return len(snapshots)
+
+
+def balance_as_of(family_id, day):
+    # The latest snapshot on or before ``day`` plus the entries after it
+    snapshot = LedgerSnapshot.objects.filter(family_id=family_id, date__lte=day).order_by('-date').first()
+    tail = LedgerEntry.objects.filter(family_id=family_id, date__lte=day)
+    if snapshot:
+        tail = tail.filter(date__gt=snapshot.date)
+    total = tail.aggregate(total=Sum('amount'))['total'] or Decimal(0)
+    return (snapshot.balance if snapshot else Decimal(0)) + total
+
+
+def statement(family_id, start, end):
+    """Opening balance, entries with a running balance, and closing balance."""
+    opening = balance_as_of(family_id, date.fromordinal(start.toordinal() - 1))
+    balance = opening
+    lines = []
+    for entry in LedgerEntry.objects.filter(family_id=family_id, date__gte=start, date__lte=end).order_by('date', 'id'):
+        balance += entry.amount
+        lines.append({
+            "date": entry.date,
+            "entry_type": entry.entry_type,
+            "description": entry.description,
+            "amount": entry.amount,
+            "balance": balance,
+        })
+    return {"opening_balance": opening, "entries": lines, "closing_balance": balance}
+
+
+def family_aging(family_id, day):
+    """Bucket the family's unpaid tuition by days past the charge date.
+
+    Each invoice's charge and subsidy credit are netted, then payments and
+    credits settle the oldest invoices first. Deposits are held separately
+    and are left out.
+    """
+    entries = LedgerEntry.objects.filter(family_id=family_id, date__lte=day)
+    credit = -(entries.filter(source_type='payment').aggregate(total=Sum('amount'))['total'] or Decimal(0))
+    charges = []
+    for charged_on, net in (
+        entries.filter(source_type='invoice').values('source_id')
+        .annotate(charged_on=Min('date'), net=Sum('amount'))
+        .order_by('charged_on', 'source_id').values_list('charged_on', 'net')
+    ):
+        if net > 0:
+            charges.append((charged_on, net))
+        else:
+            credit -= net
+
+    buckets = defaultdict(Decimal)
+    for charged_on, net in charges:
+        settled = min(max(credit, 0), net)
+        credit -= settled
+        if net > settled:
+            buckets[aging_bucket((day - charged_on).days)] += net - settled
+    return {bucket: buckets[bucket] for bucket in AGING_BUCKETS}
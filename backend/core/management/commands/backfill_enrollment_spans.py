@@ -0,0 +1,15 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from core.occupancy import rebuild_enrollment_spans
+
+
+class Command(BaseCommand):
+    help = "Rebuild the EnrollmentSpan history from Child and Transition rows."
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        spans = rebuild_enrollment_spans()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {spans} enrollment spans in {perf_counter() - started:.1f}s."
+        ))
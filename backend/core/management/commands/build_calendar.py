@@ -0,0 +1,25 @@
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from core.calendar_builder import build_calendar
+
+
+class Command(BaseCommand):
+    help = "Build the Calendar table (weekdays, stat holidays and substitutions) for a range of years."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start-year", type=int, default=date.today().year, help="First year to build.")
+        parser.add_argument("--end-year", type=int, help="Last year to build (defaults to --start-year).")
+
+    def handle(self, *args, **options):
+        start_year = options["start_year"]
+        end_year = options["end_year"] or start_year
+        if end_year < start_year:
+            raise CommandError("--end-year must not be before --start-year.")
+
+        started = perf_counter()
+        days = build_calendar(start_year, end_year)
+        self.stdout.write(self.style.SUCCESS(
+            f"Calendar built for {start_year}-{end_year}: {days} days in {perf_counter() - started:.1f}s."
+        ))
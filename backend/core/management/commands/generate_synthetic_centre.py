@@ -0,0 +1,48 @@
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from core.occupancy import rebuild_daily_occupancy
+from core.synthetic import generate_centre
+
+
+class Command(BaseCommand):
+    help = "Bulk-create a synthetic centre for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--children", type=int, default=1000, help="Number of children to create.")
+        parser.add_argument("--start-year", type=int, default=date.today().year - 1, help="First calendar year.")
+        parser.add_argument("--years", type=int, default=2, help="Number of calendar years to create.")
+        parser.add_argument("--billing-months", type=int, default=1, help="Months of invoices and payments.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same centre.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT.")
+        parser.add_argument(
+            "--ledger",
+            action="store_true",
+            help="Post the ledger and allocate payments for the new families (slower on large centres).",
+        )
+        parser.add_argument(
+            "--rebuild-occupancy",
+            action="store_true",
+            help="Rebuild DailyOccupancy afterwards (bulk inserts bypass the signals).",
+        )
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        counts = generate_centre(
+            children=options["children"],
+            start_year=options["start_year"],
+            years=options["years"],
+            seed=options["seed"],
+            billing_months=options["billing_months"],
+            batch_size=options["batch_size"],
+            ledger=options["ledger"],
+        )
+        for model, count in counts.items():
+            self.stdout.write(f"{model}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Synthetic centre created in {perf_counter() - started:.1f}s."))
+
+        if options["rebuild_occupancy"]:
+            started = perf_counter()
+            rows = rebuild_daily_occupancy()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily occupancy rows in {perf_counter() - started:.1f}s."))
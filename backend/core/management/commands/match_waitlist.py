@@ -0,0 +1,20 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from core.waitlist import match_waitlist
+
+
+class Command(BaseCommand):
+    help = "Recompute the earliest seat for every waitlist entry. Run daily, as desired start dates come due."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--program", action="append", dest="programs", help="Only this program type (repeatable)."
+        )
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        matched = match_waitlist(options["programs"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Matched {matched} waitlist entries in {perf_counter() - started:.1f}s."
+        ))
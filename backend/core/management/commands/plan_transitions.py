@@ -0,0 +1,18 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from core.transitions import plan_age_outs
+
+
+class Command(BaseCommand):
+    help = "Propose Planned transitions for children ageing out of their program."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=24, help="How far ahead to plan (default 24).")
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        planned = plan_age_outs(months=options["months"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Planned {len(planned)} transitions in {perf_counter() - started:.1f}s."
+        ))
@@ -1,3 +1,5 @@
+from datetime import date
+
 from core.models import SubsidyRate
 
 from django.core.management.base import BaseCommand
@@ -5,6 +7,13 @@ from django.core.management.base import BaseCommand
 class Command(BaseCommand):
     help = "Populate subsidy rates for each program type"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--effective-date", type=date.fromisoformat,
+            help="First day the rates apply (YYYY-MM-DD). Earlier versions are kept for re-billing past months; "
+                 "without it the rates apply from the beginning.",
+        )
+
     def handle(self, *args, **kwargs):
         subsidy_rates = [
             {"program_type": "Infant", "daily_tuition_rate": 110.19, "daily_parent_rate": 22},
@@ -16,6 +25,7 @@ class Command(BaseCommand):
             daily_CWELCCA_rate = rate["daily_tuition_rate"] - rate["daily_parent_rate"]
             SubsidyRate.objects.update_or_create(
                 program_type=rate["program_type"],
+                effective_date=kwargs["effective_date"],
                 defaults={
                     "daily_tuition_rate": rate["daily_tuition_rate"],
                     "daily_parent_rate": rate["daily_parent_rate"],
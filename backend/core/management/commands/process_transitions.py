@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from core.transitions import process_transitions
+
+
+class Command(BaseCommand):
+    help = "Move children to their next classroom for every due transition. Run daily, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date", type=date.fromisoformat, help="Process transitions dated up to this day (default today)."
+        )
+
+    def handle(self, *args, **options):
+        processed = process_transitions(options["date"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} transitions."))
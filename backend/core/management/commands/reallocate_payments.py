@@ -0,0 +1,21 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from core.payments import reallocate_payments
+
+
+class Command(BaseCommand):
+    help = "Re-apply every payment to invoices oldest first and rebuild the family balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--family", type=int, action="append", dest="families",
+            help="Only reallocate this family (may be repeated).",
+        )
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        allocations = reallocate_payments(options["families"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(allocations)} payment allocations in {perf_counter() - started:.1f}s."
+        ))
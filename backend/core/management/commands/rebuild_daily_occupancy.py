@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Calendar, DailyOccupancy
+from core.occupancy import occupancy_counts_on, rebuild_daily_occupancy
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyOccupancy table from scratch and optionally verify it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Compare every stored row against a per-date recount after rebuilding.",
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_occupancy()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily occupancy rows."))
+
+        if options["check"]:
+            mismatches = self.check_against_live()
+            if mismatches:
+                raise CommandError(f"{mismatches} daily occupancy rows do not match the live counts.")
+            self.stdout.write(self.style.SUCCESS("Daily occupancy matches the live counts."))
+
+    def check_against_live(self):
+        stored = {
+            (row['date'], row['classroom_id']): (row['enrolled'], row['transitioning_in'], row['transitioning_out'])
+            for row in DailyOccupancy.objects.values(
+                'date', 'classroom_id', 'enrolled', 'transitioning_in', 'transitioning_out'
+            )
+        }
+        mismatches = 0
+        for day in Calendar.objects.order_by('date').values_list('date', flat=True):
+            # Recount each date in SQL with the effective-classroom annotation
+            for classroom_id, values in occupancy_counts_on(day).items():
+                expected = (values['enrolled'], values['transitioning_in'], values['transitioning_out'])
+                actual = stored.get((day, classroom_id))
+                if expected != actual:
+                    mismatches += 1
+                    self.stderr.write(f"{day} classroom {classroom_id}: stored {actual}, live {expected}")
+        return mismatches
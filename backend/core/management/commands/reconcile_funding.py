@@ -0,0 +1,20 @@
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from core.funding import reconcile_funding
+
+
+class Command(BaseCommand):
+    help = "Reconcile invoiced and occupancy-based CWELCCA subsidy against government funding per month."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=date.fromisoformat, help="First month to reconcile (YYYY-MM-DD).")
+        parser.add_argument("--end", type=date.fromisoformat, help="Last day to reconcile (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        rows = reconcile_funding(options["start"], options["end"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {rows} funding reconciliation rows in {perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,24 @@
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from core.billing import run_billing
+
+
+class Command(BaseCommand):
+    help = "Create the tuition invoices for a month from Calendar open days and SubsidyRate."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, default=date.today().year, help="Year to bill.")
+        parser.add_argument("--month", type=int, default=date.today().month, help="Month to bill (1-12).")
+
+    def handle(self, *args, **options):
+        if not 1 <= options["month"] <= 12:
+            raise CommandError("--month must be between 1 and 12.")
+
+        started = perf_counter()
+        invoices = run_billing(options["year"], options["month"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(invoices)} invoices for {options['year']}-{options['month']:02d} "
+            f"in {perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,25 @@
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from core.ledger import sync_ledger, take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Post missing ledger entries for every invoice, payment and deposit, then snapshot balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--snapshot-date", type=date.fromisoformat, default=date.today(),
+            help="Store every family's balance as of this date (YYYY-MM-DD, default today).",
+        )
+        parser.add_argument("--no-snapshot", action="store_true", help="Only post entries.")
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        entries = sync_ledger()
+        self.stdout.write(self.style.SUCCESS(f"Posted {len(entries)} ledger entries in {perf_counter() - started:.1f}s."))
+
+        if not options["no_snapshot"]:
+            snapshots = take_snapshots(options["snapshot_date"])
+            self.stdout.write(self.style.SUCCESS(f"Stored {snapshots} balance snapshots for {options['snapshot_date']}."))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_alter_calendar_is_weekday_alter_withdrawal_child'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='calendar',
+            name='is_weekday',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='withdrawal',
+            name='child',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.child'),
+        ),
+        migrations.CreateModel(
+            name='DailyOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('enrolled', models.PositiveIntegerField(default=0)),
+                ('transitioning_in', models.PositiveIntegerField(default=0)),
+                ('transitioning_out', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_occupancy', to='core.classroom')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'classroom'), name='unique_daily_occupancy')],
+            },
+        ),
+    ]
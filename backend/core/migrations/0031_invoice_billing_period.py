@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_dailyoccupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='billing_period_end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='billing_period_start',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_invoice_billing_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='adjusts',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='adjustments', to='core.invoice'),
+        ),
+    ]
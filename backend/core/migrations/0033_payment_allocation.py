@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_invoice_adjusts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FamilyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoiced', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('family', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='balance', to='core.family')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaymentAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='core.invoice')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='core.payment')),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_payment_allocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('entry_type', models.CharField(choices=[('charge', 'Charge'), ('subsidy_credit', 'Subsidy credit'), ('payment', 'Payment'), ('deposit_hold', 'Deposit hold'), ('deposit_refund', 'Deposit refund'), ('deposit_forfeit', 'Deposit forfeit')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('source_type', models.CharField(choices=[('invoice', 'Invoice'), ('payment', 'Payment'), ('deposit', 'Deposit')], max_length=20)),
+                ('source_id', models.PositiveIntegerField()),
+                ('posted_at', models.DateTimeField(auto_now_add=True)),
+                ('family', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='core.family')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['family', 'date'], name='ledger_family_date')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('family', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_snapshots', to='core.family')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('family', 'date'), name='unique_ledger_snapshot')],
+            },
+        ),
+    ]
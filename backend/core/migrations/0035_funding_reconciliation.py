@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_family_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundingReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(max_length=255)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('subsidy_invoiced', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('subsidy_from_occupancy', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('funding_received', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('variance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stream', 'period_start'), name='unique_funding_reconciliation')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_funding_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subsidyrate',
+            name='effective_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='subsidyrate',
+            constraint=models.UniqueConstraint(fields=('program_type', 'effective_date'), name='unique_subsidy_rate_version'),
+        ),
+    ]
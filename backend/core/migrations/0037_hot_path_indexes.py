@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_subsidy_rate_effective_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='child',
+            index=models.Index(fields=['enrollment_start_date', 'enrollment_end_date'], name='child_enrollment_dates'),
+        ),
+        migrations.AddIndex(
+            model_name='child',
+            index=models.Index(fields=['classroom', 'enrollment_start_date'], name='child_classroom_start'),
+        ),
+        migrations.AddIndex(
+            model_name='child',
+            index=models.Index(condition=models.Q(('enrollment_end_date__isnull', True)), fields=['classroom', 'enrollment_start_date'], name='child_active_enrollment'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['family', 'due_date'], name='invoice_family_due'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['payment_status', 'due_date'], name='invoice_status_due'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('adjusts__isnull', True)), fields=['billing_period_start', 'child'], name='invoice_billing_run'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['family', 'payment_date'], name='payment_family_date'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date'], name='payment_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transition',
+            index=models.Index(fields=['child', 'transition_date'], name='transition_child_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transition',
+            index=models.Index(fields=['next_classroom', 'transition_date'], name='transition_room_date'),
+        ),
+        migrations.AddIndex(
+            model_name='transition',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['transition_date'], name='transition_pending_date'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_transition_previous_classroom'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('child', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_spans', to='core.child')),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_spans', to='core.classroom')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['classroom', 'start_date', 'end_date'], name='span_classroom_dates'), models.Index(fields=['child', 'start_date'], name='span_child_start')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_enrollment_span'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('date_of_birth', models.DateField()),
+                ('program_type', models.CharField(choices=[('Infant', 'Infant'), ('Toddler', 'Toddler'), ('Preschool', 'Preschool')], max_length=50)),
+                ('desired_start_date', models.DateField()),
+                ('priority', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('Waiting', 'Waiting'), ('Offered', 'Offered'), ('Enrolled', 'Enrolled'), ('Withdrawn', 'Withdrawn')], default='Waiting', max_length=20)),
+                ('date_added', models.DateTimeField(auto_now_add=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('matched_start_date', models.DateField(blank=True, null=True)),
+                ('matched_at', models.DateTimeField(blank=True, null=True)),
+                ('family', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entries', to='core.family')),
+                ('matched_classroom', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.classroom')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status__in', ['Waiting', 'Offered'])), fields=['program_type', 'priority'], name='waitlist_open_entries')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+def drop_duplicate_base_rates(apps, schema_editor):
+    # Keep the newest undated rate per program, the one billing already used
+    SubsidyRate = apps.get_model('core', 'SubsidyRate')
+    kept = set()
+    for rate_id, program_type in (
+        SubsidyRate.objects.filter(effective_date__isnull=True).order_by('-id').values_list('id', 'program_type')
+    ):
+        if program_type in kept:
+            SubsidyRate.objects.filter(id=rate_id).delete()
+        kept.add(program_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_waitlist_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_base_rates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subsidyrate',
+            constraint=models.UniqueConstraint(condition=models.Q(('effective_date__isnull', True)), fields=('program_type',), name='unique_subsidy_rate_base'),
+        ),
+    ]
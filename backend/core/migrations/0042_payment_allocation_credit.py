@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_subsidy_rate_base_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentallocation',
+            name='credit',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='credit_allocations', to='core.invoice'),
+        ),
+        migrations.AlterField(
+            model_name='paymentallocation',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='core.payment'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_payment_allocation_credit'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='invoice_billing_run',
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('adjusts__isnull', True)), fields=('billing_period_start', 'child'), name='invoice_billing_run'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_invoice_billing_run_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='family',
+            index=models.Index(fields=['parent_1_name', 'id'], name='family_name_id'),
+        ),
+        migrations.AddIndex(
+            model_name='family',
+            index=models.Index(fields=['parent_1_email', 'id'], name='family_email_id'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:01
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_family_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='child',
+            name='child_classroom_start',
+        ),
+        migrations.RemoveIndex(
+            model_name='child',
+            name='child_active_enrollment',
+        ),
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payment_family_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='transition',
+            name='transition_room_date',
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:04
+
+from datetime import date, timedelta
+
+from django.db import migrations, models
+from django.db.models import Q
+
+from core.calendar_builder import stat_holidays
+
+
+def old_victoria_days(year):
+    # The rule populate_stat_holidays used before the calendar builder: the
+    # day before May 25, moved to Monday when it is a weekend. In 2026 it
+    # closed Monday May 25 instead of May 18.
+    holiday = date(year, 5, 25) - timedelta(days=date(year, 5, 25).weekday() + 1)
+    if holiday.weekday() >= 5:
+        return {holiday, holiday + timedelta(days=7 - holiday.weekday())}
+    return {holiday}
+
+
+def mark_manual_days(apps, schema_editor):
+    # Weekday closures and holidays that neither the current rules nor the
+    # old Victoria Day rule produce were set by hand. Old rule-generated rows
+    # stay unmarked, so the next build_calendar corrects them.
+    Calendar = apps.get_model('core', 'Calendar')
+    flagged = Calendar.objects.filter(Q(is_closed=True) | Q(is_stat_holiday=True), is_weekday=True)
+    years = {day.year for day in flagged.values_list('date', flat=True)}
+    if not years:
+        return
+    holidays = stat_holidays(min(years), max(years))
+    generated = set(holidays) | {observed for observed in holidays.values() if observed}
+    for year in years:
+        generated |= old_victoria_days(year)
+    flagged.exclude(date__in=generated).update(manual=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_drop_unused_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendar',
+            name='manual',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_manual_days, migrations.RunPython.noop),
+    ]
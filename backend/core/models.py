@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 
@@ -39,6 +41,13 @@ class Family(models.Model):
     ])
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pages of the family list (see KeysetPagination)
+            models.Index(fields=['parent_1_name', 'id'], name='family_name_id'),
+            models.Index(fields=['parent_1_email', 'id'], name='family_email_id'),
+        ]
+
     def __str__(self):
         return f"Family {self.id}: {self.parent_1_name}"
 
@@ -50,6 +59,10 @@ class Transition(models.Model):
     notes = models.TextField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=[('Planned', 'Planned'), ('Completed', 'Completed')])
     processed = models.BooleanField(default=False)  # Tracks if the transition has been applied
+    # Set when the transition is processed: the classroom the child left
+    previous_classroom = models.ForeignKey(
+        'Classroom', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
 
     class Meta:
         constraints = [
@@ -59,10 +72,57 @@ class Transition(models.Model):
                 name='unique_unprocessed_transition'
             )
         ]
+        indexes = [
+            # A child's latest transition on or before a date (effective classroom)
+            models.Index(fields=['child', 'transition_date'], name='transition_child_date'),
+            # Transitions still waiting to be applied
+            models.Index(
+                fields=['transition_date'], condition=models.Q(processed=False), name='transition_pending_date'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.child} transitions to {self.next_classroom} on {self.transition_date}"
 
+class ChildQuerySet(models.QuerySet):
+    def active_on(self, day):
+        # Children enrolled on ``day``
+        return self.filter(enrollment_start_date__lte=day).exclude(enrollment_end_date__lt=day)
+
+    def with_effective_classroom(self, day):
+        # The classroom a child is in on ``day`` (a date, or an OuterRef to one
+        # of the child's own date fields). ``home_classroom_id`` is the room
+        # they were assigned to then: Child.classroom, or before a processed
+        # transition the room it moved them out of. ``effective_classroom_id``
+        # is the destination of their latest transition dated on or before
+        # ``day`` when that one is unprocessed, otherwise the home room, so a
+        # later processed transition overrides an earlier pending one as in
+        # occupancy.effective_spans.
+        next_processed = Transition.objects.filter(
+            child=OuterRef('pk'), processed=True, transition_date__gt=day
+        ).order_by('transition_date', 'id')
+        latest_transition = Transition.objects.filter(
+            child=OuterRef('pk'), transition_date__lte=day
+        ).order_by('-transition_date', '-id').annotate(
+            pending_classroom_id=Case(When(processed=False, then=F('next_classroom_id')))
+        )
+        return self.annotate(
+            home_classroom_id=Coalesce(
+                Subquery(next_processed.values('previous_classroom_id')[:1]),
+                F('classroom_id'),
+                output_field=models.BigIntegerField(),
+            ),
+            effective_classroom_id=Coalesce(
+                Subquery(latest_transition.values('pending_classroom_id')[:1]),
+                F('home_classroom_id'),
+                output_field=models.BigIntegerField(),
+            ),
+        )
+
+    def effective_on(self, day):
+        return self.active_on(day).with_effective_classroom(day)
+
+
 class Child(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -85,6 +145,14 @@ class Child(models.Model):
     notes = models.TextField(blank=True, null=True)
     allergy_info = models.TextField(blank=True, null=True)
 
+    objects = ChildQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Who is enrolled over a date range (active_on, effective_spans)
+            models.Index(fields=['enrollment_start_date', 'enrollment_end_date'], name='child_enrollment_dates'),
+        ]
+
     def age_in_months_at_start(self):
         if self.enrollment_start_date and self.date_of_birth:
             return (
@@ -144,6 +212,11 @@ class Payment(models.Model):
     ])
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['payment_date'], name='payment_date'),
+        ]
+
     def __str__(self):
         return f"Payment {self.id} of ${self.amount_paid} by Family {self.family.id}"
 
@@ -168,15 +241,43 @@ class Invoice(models.Model):
     notes = models.TextField(blank=True, null=True)
     child = models.ForeignKey("Child", on_delete=models.CASCADE)
     family = models.ForeignKey("Family", on_delete=models.CASCADE)
+    # Set on invoices created by a billing run (core/billing.py)
+    billing_period_start = models.DateField(null=True, blank=True)
+    billing_period_end = models.DateField(null=True, blank=True)
+    # Adjustment invoices point at the billing-run invoice they correct
+    adjusts = models.ForeignKey(
+        "self", on_delete=models.CASCADE, null=True, blank=True, related_name="adjustments"
+    )
+
+    class Meta:
+        indexes = [
+            # A family's invoices by due date (allocation, statements)
+            models.Index(fields=['family', 'due_date'], name='invoice_family_due'),
+            # Unpaid / overdue screens
+            models.Index(fields=['payment_status', 'due_date'], name='invoice_status_due'),
+        ]
+        constraints = [
+            # One billing-run invoice per child and period (adjustments aside);
+            # also the index for a period's billing-run invoices
+            models.UniqueConstraint(
+                fields=['billing_period_start', 'child'],
+                condition=models.Q(adjusts__isnull=True),
+                name='invoice_billing_run',
+            ),
+        ]
 
     def clean(self):
         # Ensure full_tuition equals the sum of parent_portion and subsidy_amount
         if self.parent_portion + self.subsidy_amount != self.full_tuition:
             raise ValidationError("Full tuition must equal the sum of parent and subsidy amounts.")
 
-        # Ensure paid_amount does not exceed the parent_portion
-        if self.paid_amount > self.parent_portion:
+        # Ensure paid_amount does not exceed the parent_portion (negative
+        # portions are adjustment credits, which take no payments)
+        if self.paid_amount > max(self.parent_portion, 0):
             raise ValidationError("Paid amount cannot exceed the parent portion.")
+        # A credit's paid_amount is minus the part applied to other invoices
+        if self.paid_amount < min(self.parent_portion, 0):
+            raise ValidationError("Applied credit cannot exceed the credit.")
 
     def __str__(self):
         return f"Invoice {self.id} for Child {self.child}"
@@ -218,6 +319,8 @@ class Calendar(models.Model):
     is_stat_holiday = models.BooleanField(default=False)
     stat_substitution_date = models.DateField(null=True, blank=True)  # New field
     is_closed = models.BooleanField(default=False)
+    # Set by hand (e.g. in CalendarAdmin): build_calendar leaves the day alone
+    manual = models.BooleanField(default=False)
 
     def __str__(self):
         return f"Date: {self.date}, Closed: {self.is_closed}"
@@ -227,6 +330,18 @@ class SubsidyRate(models.Model):
     daily_tuition_rate = models.DecimalField(max_digits=6, decimal_places=2)  # Full daily tuition
     daily_parent_rate = models.DecimalField(max_digits=6, decimal_places=2)  # Max parent pays per day
     daily_CWELCCA_rate = models.DecimalField(max_digits=6, decimal_places=2)  # Daily subsidy amount
+    effective_date = models.DateField(null=True, blank=True)  # First day the rate applies; None is since always
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['program_type', 'effective_date'], name='unique_subsidy_rate_version'),
+            # NULLs are distinct in the constraint above, so the one
+            # "since always" version per program needs its own
+            models.UniqueConstraint(
+                fields=['program_type'], condition=models.Q(effective_date__isnull=True),
+                name='unique_subsidy_rate_base',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         # Automatically calculate subsidy if not provided
@@ -235,5 +350,196 @@ class SubsidyRate(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
+        if self.effective_date:
+            return f"{self.program_type} from {self.effective_date} - Daily Tuition: ${self.daily_tuition_rate}"
         return f"{self.program_type} - Daily Tuition: ${self.daily_tuition_rate}"
 
+
+
+class DailyOccupancy(models.Model):
+    # Precomputed per-classroom occupancy for each Calendar date, kept up to
+    # date by the signal handlers in core/signals.py
+    date = models.DateField()
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='daily_occupancy')
+    enrolled = models.PositiveIntegerField(default=0)
+    transitioning_in = models.PositiveIntegerField(default=0)
+    transitioning_out = models.PositiveIntegerField(default=0)
+    capacity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'classroom'], name='unique_daily_occupancy')
+        ]
+
+    def __str__(self):
+        return f"{self.classroom} on {self.date}: {self.enrolled}/{self.capacity}"
+
+
+class EnrollmentSpanQuerySet(models.QuerySet):
+    def on(self, day):
+        # Spans covering ``day``
+        return self.filter(start_date__lte=day).exclude(end_date__lt=day)
+
+    def overlapping(self, first, last):
+        # Spans sharing at least one day with [first, last]
+        return self.filter(start_date__lte=last).exclude(end_date__lt=first)
+
+
+class EnrollmentSpan(models.Model):
+    # A child's effective classroom over [start_date, end_date] (end_date None
+    # is open-ended), kept up to date by the signal handlers in
+    # core/signals.py and rebuilt by the backfill_enrollment_spans command
+    child = models.ForeignKey(Child, on_delete=models.CASCADE, related_name='enrollment_spans')
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='enrollment_spans')
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+
+    objects = EnrollmentSpanQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Who was in a room on a date or over a range
+            models.Index(fields=['classroom', 'start_date', 'end_date'], name='span_classroom_dates'),
+            models.Index(fields=['child', 'start_date'], name='span_child_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.child} in {self.classroom} from {self.start_date} to {self.end_date or 'open'}"
+
+
+class WaitlistEntry(models.Model):
+    # A child waiting for a seat. The matched_* fields hold the earliest seat
+    # found by core/waitlist.py, recomputed when enrollment or capacity changes
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    date_of_birth = models.DateField()
+    family = models.ForeignKey(
+        Family, on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entries'
+    )
+    program_type = models.CharField(max_length=50, choices=[
+        ('Infant', 'Infant'),
+        ('Toddler', 'Toddler'),
+        ('Preschool', 'Preschool'),
+    ])
+    desired_start_date = models.DateField()
+    priority = models.PositiveIntegerField(default=0)  # Higher is matched first; ties go to the earliest entry
+    status = models.CharField(max_length=20, default='Waiting', choices=[
+        ('Waiting', 'Waiting'),
+        ('Offered', 'Offered'),  # Holds its matched seat
+        ('Enrolled', 'Enrolled'),
+        ('Withdrawn', 'Withdrawn'),
+    ])
+    date_added = models.DateTimeField(auto_now_add=True)
+    notes = models.TextField(blank=True, null=True)
+    matched_classroom = models.ForeignKey(
+        Classroom, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    matched_start_date = models.DateField(null=True, blank=True)
+    matched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['program_type', 'priority'],
+                condition=models.Q(status__in=['Waiting', 'Offered']),
+                name='waitlist_open_entries',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name} waiting for {self.program_type} from {self.desired_start_date}"
+
+
+class PaymentAllocation(models.Model):
+    # The part of a payment, or of a credit (a negative adjustment invoice),
+    # applied to one invoice (core/payments.py). Exactly one of payment and
+    # credit is set.
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, null=True, blank=True, related_name='allocations')
+    credit = models.ForeignKey(
+        Invoice, on_delete=models.CASCADE, null=True, blank=True, related_name='credit_allocations'
+    )
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='allocations')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        source = f"Payment {self.payment_id}" if self.payment_id else f"Credit {self.credit_id}"
+        return f"${self.amount} of {source} to Invoice {self.invoice_id}"
+
+
+class FamilyBalance(models.Model):
+    # Running totals per family, kept up to date by core/payments.py
+    family = models.OneToOneField(Family, on_delete=models.CASCADE, related_name='balance')
+    invoiced = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # invoiced - paid
+
+    def __str__(self):
+        return f"Family {self.family_id} balance: ${self.balance}"
+
+
+class LedgerEntry(models.Model):
+    # Append-only family account history posted by core/ledger.py. Entries
+    # are never edited; a changed invoice, payment or deposit gets a
+    # correcting entry for the difference. Positive amounts are owed by the
+    # family, negative amounts are credits.
+    ENTRY_TYPES = [
+        ('charge', 'Charge'),
+        ('subsidy_credit', 'Subsidy credit'),
+        ('payment', 'Payment'),
+        ('deposit_hold', 'Deposit hold'),
+        ('deposit_refund', 'Deposit refund'),
+        ('deposit_forfeit', 'Deposit forfeit'),
+    ]
+    SOURCE_TYPES = [('invoice', 'Invoice'), ('payment', 'Payment'), ('deposit', 'Deposit')]
+
+    family = models.ForeignKey(Family, on_delete=models.CASCADE, related_name='ledger_entries')
+    date = models.DateField()
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.CharField(max_length=255, blank=True)
+    # Plain ids so history survives the source row being deleted
+    source_type = models.CharField(max_length=20, choices=SOURCE_TYPES)
+    source_id = models.PositiveIntegerField()
+    posted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['family', 'date'], name='ledger_family_date')]
+
+    def __str__(self):
+        return f"{self.date} {self.entry_type} ${self.amount} for Family {self.family_id}"
+
+
+class LedgerSnapshot(models.Model):
+    # Family balance including every ledger entry dated on or before ``date``
+    family = models.ForeignKey(Family, on_delete=models.CASCADE, related_name='ledger_snapshots')
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['family', 'date'], name='unique_ledger_snapshot')
+        ]
+
+    def __str__(self):
+        return f"Family {self.family_id} balance on {self.date}: ${self.balance}"
+
+
+class FundingReconciliation(models.Model):
+    # Subsidy owed against funding received per stream and month, computed
+    # in bulk by core/funding.py
+    stream = models.CharField(max_length=255)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    subsidy_invoiced = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    subsidy_from_occupancy = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    funding_received = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    variance = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # received - invoiced
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stream', 'period_start'], name='unique_funding_reconciliation')
+        ]
+
+    def __str__(self):
+        return f"{self.stream} {self.period_start:%Y-%m}: variance ${self.variance}"
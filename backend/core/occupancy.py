@@ -0,0 +1,312 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+
+from core.models import Calendar, Child, Classroom, DailyOccupancy, EnrollmentSpan, Transition
+
+OCCUPANCY_FIELDS = ('enrolled', 'transitioning_in', 'transitioning_out')
+
+
+class _IntervalCounter:
+    # Counts how many [start, end] intervals (end may be None) cover a date
+    # by bisecting their sorted boundaries.
+    def __init__(self):
+        self.starts = []
+        self.exits = []  # First day an interval no longer applies
+
+    def add(self, start, end):
+        if end is not None and end < start:
+            return
+        self.starts.append(start)
+        if end is not None:
+            self.exits.append(end + timedelta(days=1))
+
+    def finish(self):
+        self.starts.sort()
+        self.exits.sort()
+        return self
+
+    def count(self, day):
+        return bisect_right(self.starts, day) - bisect_right(self.exits, day)
+
+
+def effective_spans(first, last, classroom_ids=None, child_ids=None):
+    """Return every child's effective classroom over [first, last] as spans.
+
+    Each span is (child_id, classroom_id, home_classroom_id, start, end) where
+    ``end`` may be None and ``home_classroom_id`` is the room the child was
+    assigned to at the time: Child.classroom, or before a processed
+    transition the room it moved them out of. A child moves to a
+    transition's next classroom on its transition date, matching
+    ChildQuerySet.effective_on. Children and transitions are loaded with one
+    query each, whatever the length of the range. With ``classroom_ids``
+    only children assigned to, or with a transition into or out of, one of
+    those rooms are loaded.
+    """
+    children = Child.objects.filter(enrollment_start_date__lte=last).exclude(
+        enrollment_end_date__lt=first
+    )
+    if child_ids is not None:
+        children = children.filter(id__in=child_ids)
+    if classroom_ids is not None:
+        classroom_ids = set(classroom_ids)
+        children = children.filter(Q(classroom_id__in=classroom_ids) | Exists(
+            Transition.objects.filter(child_id=OuterRef('pk')).filter(
+                Q(next_classroom_id__in=classroom_ids) | Q(previous_classroom_id__in=classroom_ids)
+            )
+        ))
+    enrollments = {
+        child_id: (classroom_id, start, end)
+        for child_id, classroom_id, start, end in children.values_list(
+            'id', 'classroom_id', 'enrollment_start_date', 'enrollment_end_date'
+        )
+    }
+
+    # Processed transitions after ``last`` are still needed for the room the
+    # child was in before them
+    moves = defaultdict(list)
+    transitions = Transition.objects.filter(child__in=children).filter(
+        Q(transition_date__lte=last) | Q(processed=True)
+    ).order_by('transition_date', 'id')
+    for child_id, next_id, transition_date, processed, previous_id in transitions.values_list(
+        'child_id', 'next_classroom_id', 'transition_date', 'processed', 'previous_classroom_id'
+    ):
+        moves[child_id].append((transition_date, next_id, processed, previous_id))
+
+    spans = []
+    for child_id, (classroom_id, start, end) in enrollments.items():
+        if end is not None and end < start:
+            continue
+        processed = [move for move in moves[child_id] if move[2]]
+        home_id = processed[0][3] if processed and processed[0][3] is not None else classroom_id
+        current_id, current_start = home_id, start
+        for transition_date, next_id, is_processed, _ in moves[child_id]:
+            if transition_date > last:
+                break
+            if transition_date > current_start:
+                span_end = transition_date - timedelta(days=1)
+                if end is not None:
+                    span_end = min(span_end, end)
+                spans.append((child_id, current_id, home_id, current_start, span_end))
+                current_start = transition_date
+            current_id = next_id
+            if is_processed:
+                home_id = next_id
+            if end is not None and current_start > end:
+                break
+        if end is None or current_start <= end:
+            spans.append((child_id, current_id, home_id, current_start, end))
+
+    if classroom_ids is not None:
+        spans = [span for span in spans if span[1] in classroom_ids or span[2] in classroom_ids]
+    return [span for span in spans if span[1] is not None or span[2] is not None]
+
+
+def compute_daily_occupancy(dates, classroom_ids=None):
+    """Compute occupancy live for ``dates``.
+
+    Returns {(date, classroom_id): {field: value}} with one entry per date and
+    classroom. ``enrolled`` counts children by effective classroom; children
+    whose effective classroom differs from Child.classroom are also counted
+    as transitioning in to one room and out of the other.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+    first, last = dates[0], dates[-1]
+
+    classrooms = Classroom.objects.all()
+    if classroom_ids is not None:
+        classrooms = classrooms.filter(id__in=classroom_ids)
+    capacities = dict(classrooms.values_list('id', 'max_capacity'))
+
+    counters = defaultdict(lambda: {field: _IntervalCounter() for field in OCCUPANCY_FIELDS})
+    for _, classroom_id, home_id, start, end in effective_spans(first, last, capacities):
+        counters[classroom_id]['enrolled'].add(start, end)
+        if classroom_id != home_id:
+            counters[classroom_id]['transitioning_in'].add(start, end)
+            counters[home_id]['transitioning_out'].add(start, end)
+
+    occupancy = {}
+    for classroom_id, capacity in capacities.items():
+        room = {field: counter.finish() for field, counter in counters[classroom_id].items()}
+        for day in dates:
+            values = {field: counter.count(day) for field, counter in room.items()}
+            values['capacity'] = capacity
+            occupancy[(day, classroom_id)] = values
+    return occupancy
+
+
+def occupancy_counts_on(day, classroom_ids=None):
+    """Compute occupancy live for a single ``day`` with grouped aggregates.
+
+    Returns {classroom_id: {field: value}}. Children are counted in the
+    database, grouped by (home classroom, effective classroom), and the
+    pairs are merged in Python, so the query count is fixed however many
+    classrooms or children there are.
+    """
+    classrooms = Classroom.objects.all()
+    if classroom_ids is not None:
+        classrooms = classrooms.filter(id__in=classroom_ids)
+    occupancy = {
+        classroom_id: {'enrolled': 0, 'transitioning_in': 0, 'transitioning_out': 0, 'capacity': capacity}
+        for classroom_id, capacity in classrooms.values_list('id', 'max_capacity')
+    }
+
+    pairs = (
+        Child.objects.effective_on(day)
+        .values_list('home_classroom_id', 'effective_classroom_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for home_id, classroom_id, total in pairs:
+        if classroom_id in occupancy:
+            occupancy[classroom_id]['enrolled'] += total
+            if classroom_id != home_id:
+                occupancy[classroom_id]['transitioning_in'] += total
+        if home_id in occupancy and home_id != classroom_id:
+            occupancy[home_id]['transitioning_out'] += total
+    return occupancy
+
+
+def refresh_daily_occupancy(start=None, end=None, classroom_ids=None):
+    """Recompute the stored DailyOccupancy rows for Calendar dates in [start, end].
+
+    ``None`` leaves that side of the range open. Returns the number of rows
+    written.
+    """
+    calendar = Calendar.objects.all()
+    if start is not None:
+        calendar = calendar.filter(date__gte=start)
+    if end is not None:
+        calendar = calendar.filter(date__lte=end)
+    dates = list(calendar.values_list('date', flat=True))
+
+    if len(dates) == 1:
+        # A single date is cheaper to count in the database
+        occupancy = {
+            (dates[0], classroom_id): values
+            for classroom_id, values in occupancy_counts_on(dates[0], classroom_ids).items()
+        }
+    else:
+        occupancy = compute_daily_occupancy(dates, classroom_ids)
+    rows = [
+        DailyOccupancy(date=day, classroom_id=classroom_id, **values)
+        for (day, classroom_id), values in occupancy.items()
+    ]
+    with transaction.atomic():
+        DailyOccupancy.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['date', 'classroom'],
+            update_fields=[*OCCUPANCY_FIELDS, 'capacity'],
+        )
+    return len(rows)
+
+
+def rebuild_daily_occupancy():
+    # Drop every stored row and rebuild the table from scratch
+    with transaction.atomic():
+        DailyOccupancy.objects.all().delete()
+        return refresh_daily_occupancy()
+
+
+def occupancy_for_date(day):
+    """Return per-classroom occupancy for ``day``, ordered by classroom id.
+
+    Reads the materialized rows and falls back to a live computation for
+    classrooms that have no row on that date (e.g. dates outside Calendar).
+    """
+    classrooms = list(Classroom.objects.order_by('id').values('id', 'classroom_name'))
+    stored = {
+        row['classroom_id']: row
+        for row in DailyOccupancy.objects.filter(date=day).values(
+            'classroom_id', *OCCUPANCY_FIELDS, 'capacity'
+        )
+    }
+    missing = [c['id'] for c in classrooms if c['id'] not in stored]
+    live = occupancy_counts_on(day, missing) if missing else {}
+
+    result = []
+    for classroom in classrooms:
+        values = stored.get(classroom['id']) or live[classroom['id']]
+        result.append({
+            "classroom_id": classroom['id'],
+            "classroom_name": classroom['classroom_name'],
+            **{field: values[field] for field in (*OCCUPANCY_FIELDS, 'capacity')},
+        })
+    return result
+
+
+def occupancy_by_date(dates, classroom_id=None):
+    """Return {date: {"enrolled": n, "capacity": n}} for one classroom or the centre.
+
+    Dates without materialized rows are computed live.
+    """
+    dates = list(dates)
+    if not dates:
+        return {}
+    rows = DailyOccupancy.objects.filter(date__gte=min(dates), date__lte=max(dates))
+    if classroom_id is not None:
+        rows = rows.filter(classroom_id=classroom_id)
+    totals = {
+        row['date']: {"enrolled": row['total_enrolled'], "capacity": row['total_capacity']}
+        for row in rows.values('date').annotate(
+            total_enrolled=Sum('enrolled'), total_capacity=Sum('capacity')
+        )
+    }
+
+    missing = [day for day in dates if day not in totals]
+    totals = {day: totals[day] for day in dates if day in totals}
+    if missing:
+        live = compute_daily_occupancy(missing, None if classroom_id is None else [classroom_id])
+        for day in missing:
+            totals[day] = {"enrolled": 0, "capacity": 0}
+        for (day, _), values in live.items():
+            totals[day]["enrolled"] += values['enrolled']
+            totals[day]["capacity"] += values['capacity']
+    return totals
+
+
+ROSTER_FIELDS = ('id', 'first_name', 'last_name', 'date_of_birth')
+
+
+def classroom_roster(classroom_id, day):
+    # Children whose effective classroom on ``day`` is ``classroom_id``. Past
+    # rosters are a range lookup on the enrollment history; today and later
+    # depend on pending transitions, so they are resolved live.
+    if day < date.today():
+        spans = EnrollmentSpan.objects.on(day).filter(classroom_id=classroom_id)
+        return list(
+            Child.objects.filter(id__in=spans.values('child_id')).order_by('id').values(*ROSTER_FIELDS)
+        )
+    return list(
+        Child.objects.effective_on(day)
+        .filter(effective_classroom_id=classroom_id)
+        .order_by('id')
+        .values(*ROSTER_FIELDS)
+    )
+
+
+def rebuild_enrollment_spans(child_ids=None):
+    """Rewrite the EnrollmentSpan rows of ``child_ids`` (every child if None).
+
+    The spans are effective_spans() over all time, so the history matches
+    the live resolution. Returns the number of spans written.
+    """
+    spans = [
+        EnrollmentSpan(child_id=child_id, classroom_id=classroom_id, start_date=start, end_date=end)
+        for child_id, classroom_id, _, start, end in effective_spans(date.min, date.max, child_ids=child_ids)
+        if classroom_id is not None
+    ]
+    existing = EnrollmentSpan.objects.all()
+    if child_ids is not None:
+        existing = existing.filter(child_id__in=child_ids)
+    with transaction.atomic():
+        existing.delete()
+        EnrollmentSpan.objects.bulk_create(spans, batch_size=1000)
+    return len(spans)
@@ -0,0 +1,132 @@
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination on an indexed, unique ordering for high-volume lists.
+
+    Each page is a range scan on an index: ``WHERE id > <cursor>`` by
+    default, or ``WHERE (name, id) > (<name>, <id>)`` when a view's
+    OrderingFilter picks one of its ``ordering_fields``. The primary key
+    is appended to every ordering so it is unique, and each ordering field
+    needs an index on ``(field, id)``. There is no OFFSET, so latency does
+    not grow with depth. Clients pick ``?page_size=`` up to
+    ``max_page_size``. The total is only counted when asked for with
+    ``?count=true``.
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    count_query_param = 'count'
+
+    def get_ordering(self, request, queryset, view):
+        # The chosen field, then the primary key in the same direction, so
+        # the position of a row is unique and rows sharing a name are
+        # neither skipped nor repeated
+        ordering = super().get_ordering(request, queryset, view)[:1]
+        if ordering[0].lstrip('-') in ('id', 'pk'):
+            return ordering
+        return ordering + (('-' if ordering[0].startswith('-') else '') + 'id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor and self.cursor.position
+        queryset = queryset.order_by(*(self._flip(order) for order in self.ordering) if reverse else self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after(current_position, reverse))
+
+        # One extra row tells whether there is a following page
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+        )
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next, self.has_previous = following_position is not None, current_position is not None
+            self.next_position, self.previous_position = following_position, current_position
+        self.display_page_controls = self.has_previous or self.has_next
+        return self.page
+
+    def get_next_link(self):
+        # The cursor is the last row shown; the next page starts after it
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else self.next_position
+        return self._link(position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.previous_position
+        return self._link(position, reverse=True)
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is not None and cursor.position is not None:
+            try:
+                values = json.loads(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def _link(self, position, reverse):
+        return self.encode_cursor(Cursor(offset=0, reverse=reverse, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [order.lstrip('-') for order in ordering]
+        if isinstance(instance, dict):
+            values = [instance[field] for field in fields]
+        else:
+            values = [getattr(instance, field) for field in fields]
+        return json.dumps(values, default=str)
+
+    def _after(self, position, reverse):
+        # Rows past ``position`` in the page direction:
+        # a >= x AND (a > x OR (a = x AND id > y)). The leading bound lets
+        # the (a, id) index start its range scan at the cursor.
+        bounds = [
+            (order.lstrip('-'), 'lt' if order.startswith('-') != reverse else 'gt', value)
+            for order, value in zip(self.ordering, json.loads(position))
+        ]
+        condition = None
+        for field, lookup, value in reversed(bounds):
+            beyond = Q(**{f'{field}__{lookup}': value})
+            condition = beyond if condition is None else beyond | (Q(**{field: value}) & condition)
+        if len(bounds) > 1:
+            field, lookup, value = bounds[0]
+            condition &= Q(**{f'{field}__{lookup}e': value})
+        return condition
+
+    @staticmethod
+    def _flip(order):
+        return order[1:] if order.startswith('-') else '-' + order
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = {'count': self.count, **response.data}
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
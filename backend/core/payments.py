@@ -0,0 +1,136 @@
+from collections import defaultdict, deque
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from core.models import Family, FamilyBalance, Invoice, Payment, PaymentAllocation
+
+
+def payment_status(invoice):
+    if invoice.paid_amount >= invoice.parent_portion:
+        return "Paid"
+    return "Partially Paid" if invoice.paid_amount > 0 else "Unpaid"
+
+
+def refresh_family_balances(family_ids=None):
+    """Recompute FamilyBalance for ``family_ids`` (every family if None).
+
+    Credits (negative adjustment invoices) lower the invoiced total. Returns
+    the number of balances written.
+    """
+    families = Family.objects.all()
+    invoices = Invoice.objects.all()
+    payments = Payment.objects.all()
+    if family_ids is not None:
+        families = families.filter(id__in=family_ids)
+        invoices = invoices.filter(family_id__in=family_ids)
+        payments = payments.filter(family_id__in=family_ids)
+    invoiced = dict(
+        invoices.values('family_id').annotate(total=Sum('parent_portion')).values_list('family_id', 'total')
+    )
+    paid = dict(
+        payments.values('family_id').annotate(total=Sum('amount_paid')).values_list('family_id', 'total')
+    )
+
+    balances = []
+    for family_id in families.values_list('id', flat=True):
+        family_invoiced = invoiced.get(family_id) or Decimal(0)
+        family_paid = paid.get(family_id) or Decimal(0)
+        balances.append(FamilyBalance(
+            family_id=family_id, invoiced=family_invoiced, paid=family_paid, balance=family_invoiced - family_paid,
+        ))
+    FamilyBalance.objects.bulk_create(
+        balances,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['family'],
+        update_fields=['invoiced', 'paid', 'balance'],
+    )
+    return len(balances)
+
+
+def allocate_payments(family_ids=None, batch_size=1000):
+    """Apply the unallocated part of each payment and credit to open invoices, oldest first.
+
+    Credits are negative adjustment invoices; they are applied like a
+    payment received on their due date. Payments and credits are taken in
+    date order and each fills the family's open invoices in due date order.
+    A credit records the part applied in its own paid_amount, as a negative
+    amount. Invoice.paid_amount, payment_status and the family balances are
+    updated in the same transaction. Returns the allocations created.
+    """
+    with transaction.atomic():
+        # Invoices with something to pay and credits with something to apply
+        invoices = Invoice.objects.exclude(parent_portion=F('paid_amount')).order_by('due_date', 'id')
+        payments = Payment.objects.annotate(
+            allocated=Coalesce(Sum('allocations__amount'), Value(Decimal(0)), output_field=DecimalField())
+        ).filter(amount_paid__gt=F('allocated'))
+        if family_ids is not None:
+            invoices = invoices.filter(family_id__in=family_ids)
+            payments = payments.filter(family_id__in=family_ids)
+
+        open_invoices = defaultdict(deque)
+        sources = []
+        for invoice in invoices.select_for_update().only(
+            'id', 'family_id', 'due_date', 'parent_portion', 'paid_amount', 'payment_status'
+        ):
+            if invoice.parent_portion > invoice.paid_amount:
+                open_invoices[invoice.family_id].append(invoice)
+            else:
+                sources.append((invoice.due_date, 1, invoice.id, invoice.family_id, invoice))
+        for payment_id, family_id, payment_date, amount_paid, allocated in payments.values_list(
+            'id', 'family_id', 'payment_date', 'amount_paid', 'allocated'
+        ):
+            sources.append((payment_date, 0, payment_id, family_id, amount_paid - allocated))
+        sources.sort(key=lambda source: source[:3])
+
+        allocations = []
+        touched = {}
+        for _, is_credit, source_id, family_id, source in sources:
+            remaining = source.paid_amount - source.parent_portion if is_credit else source
+            queue = open_invoices[family_id]
+            while remaining > 0 and queue:
+                invoice = queue[0]
+                amount = min(remaining, invoice.parent_portion - invoice.paid_amount)
+                allocations.append(PaymentAllocation(
+                    payment_id=None if is_credit else source_id, credit_id=source_id if is_credit else None,
+                    invoice_id=invoice.id, amount=amount,
+                ))
+                invoice.paid_amount += amount
+                remaining -= amount
+                touched[invoice.id] = invoice
+                if invoice.paid_amount >= invoice.parent_portion:
+                    queue.popleft()
+            if is_credit and remaining != source.paid_amount - source.parent_portion:
+                source.paid_amount = source.parent_portion + remaining
+                touched[source.id] = source
+
+        for invoice in touched.values():
+            invoice.payment_status = payment_status(invoice)
+        Invoice.objects.bulk_update(touched.values(), ['paid_amount', 'payment_status'], batch_size=batch_size)
+        allocations = PaymentAllocation.objects.bulk_create(allocations, batch_size=batch_size)
+        refresh_family_balances(family_ids)
+    return allocations
+
+
+def reallocate_payments(family_ids=None):
+    """Drop the existing allocations and apply every payment and credit again from scratch.
+
+    Used for backfills and whenever a payment or invoice is edited or
+    deleted. Returns the allocations created.
+    """
+    with transaction.atomic():
+        allocations = PaymentAllocation.objects.all()
+        invoices = Invoice.objects.all()
+        if family_ids is not None:
+            allocations = allocations.filter(invoice__family_id__in=family_ids)
+            invoices = invoices.filter(family_id__in=family_ids)
+        allocations.delete()
+        # Credits have nothing to pay
+        invoices.update(
+            paid_amount=0,
+            payment_status=Case(When(parent_portion__lte=0, then=Value("Paid")), default=Value("Unpaid")),
+        )
+        return allocate_payments(family_ids)
@@ -0,0 +1,53 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from core.models import SubsidyRate
+
+CENTS = Decimal('0.01')
+
+
+class RateTable:
+    """Effective-dated SubsidyRate versions per program type.
+
+    Each program keeps its versions sorted by effective date, so the rate on
+    a day is one bisect. Build it once per billing run with load_rates().
+    """
+
+    def __init__(self, rates):
+        versions = defaultdict(list)
+        for rate in rates:
+            versions[rate.program_type].append((rate.effective_date or date.min, rate))
+        self.starts = {}
+        self.rates = {}
+        for program, program_versions in versions.items():
+            program_versions.sort(key=lambda version: version[0])
+            self.starts[program] = [start for start, _ in program_versions]
+            self.rates[program] = [rate for _, rate in program_versions]
+
+    def rate_for(self, program, day):
+        # The version in effect on ``day``, or None
+        i = bisect_right(self.starts.get(program, []), day) - 1
+        return self.rates[program][i] if i >= 0 else None
+
+    def segments(self, program, start, end):
+        """Split [start, end] where the program's rate changes.
+
+        Yields (segment_start, segment_end, rate); days before the first
+        version have no rate and are skipped.
+        """
+        starts = self.starts.get(program, [])
+        i = bisect_right(starts, start) - 1
+        while start <= end:
+            next_start = starts[i + 1] if i + 1 < len(starts) else None
+            segment_end = end if next_start is None or next_start > end else next_start - timedelta(days=1)
+            if i >= 0:
+                yield start, segment_end, self.rates[program][i]
+            if next_start is None:
+                break
+            start, i = next_start, i + 1
+
+
+def load_rates():
+    return RateTable(SubsidyRate.objects.all())
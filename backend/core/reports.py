@@ -0,0 +1,79 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from core.ledger import AGING_BUCKETS
+from core.models import Invoice, PaymentAllocation
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _allocated(allocations, field):
+    # Sum of ``allocations`` per invoice in ``field``, as a correlated subquery
+    return Coalesce(Subquery(
+        allocations.filter(**{field: OuterRef('pk')}).values(field).annotate(total=Sum('amount')).values('total')
+    ), Value(Decimal(0)), output_field=MONEY)
+
+
+def ar_aging(day):
+    """Accounts receivable aging as of ``day``, in one aggregate query.
+
+    Each invoice issued by ``day`` contributes what was still unpaid on
+    that day, parent_portion - paid_amount as kept by the payment
+    allocator. Credits (negative adjustment invoices) contribute the part
+    not yet applied, so family totals net them as the ledger does. For a
+    past ``day`` only allocations from payments received, and credits due,
+    by then are counted. Amounts are bucketed by days past due_date with the
+    ledger aging's boundaries: current (under 30 days or not yet due), 30,
+    60 and 90+. Returns (families, totals) where families is a list of
+    {family_id, family_name, aging, total} ordered by family id.
+    """
+    invoices = Invoice.objects.filter(date_issued__lte=day)
+    if day >= date.today():
+        outstanding = F('parent_portion') - F('paid_amount')
+    else:
+        allocations = PaymentAllocation.objects.filter(payment__payment_date__lte=day) | (
+            PaymentAllocation.objects.filter(credit__due_date__lte=day)
+        )
+        invoices = invoices.alias(
+            received=_allocated(allocations, 'invoice'), applied=_allocated(allocations, 'credit')
+        )
+        outstanding = F('parent_portion') - F('received') + F('applied')
+
+    bounds = {
+        'current': {'due_date__gt': day - timedelta(days=30)},
+        '30': {'due_date__gt': day - timedelta(days=60), 'due_date__lte': day - timedelta(days=30)},
+        '60': {'due_date__gt': day - timedelta(days=90), 'due_date__lte': day - timedelta(days=60)},
+        '90+': {'due_date__lte': day - timedelta(days=90)},
+    }
+    annotations = {
+        f"bucket_{index}": Sum(Case(
+            When(then=F('outstanding'), **bounds[bucket]),
+            default=Value(Decimal(0)),
+            output_field=MONEY,
+        ))
+        for index, bucket in enumerate(AGING_BUCKETS)
+    }
+    rows = (
+        invoices.alias(outstanding=outstanding).exclude(outstanding=0)
+        .values('family_id', 'family__parent_1_name')
+        .annotate(**annotations)
+        .order_by('family_id')
+    )
+
+    families = []
+    totals = defaultdict(Decimal)
+    for row in rows:
+        aging = {bucket: row[f"bucket_{index}"] for index, bucket in enumerate(AGING_BUCKETS)}
+        for bucket, amount in aging.items():
+            totals[bucket] += amount
+        families.append({
+            "family_id": row['family_id'],
+            "family_name": row['family__parent_1_name'],
+            "aging": aging,
+            "total": sum(aging.values()),
+        })
+    return families, {bucket: totals[bucket] for bucket in AGING_BUCKETS}
@@ -1,7 +1,7 @@
 from datetime import datetime
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
-from core.models import Withdrawal, Transition, Family, Child, Classroom, Attendance, Payment, Invoice, GovernmentFunding, AlternativeCapacity
+from core.models import Withdrawal, Transition, Family, Child, Classroom, Attendance, Payment, Invoice, GovernmentFunding, AlternativeCapacity, FamilyBalance, FundingReconciliation, WaitlistEntry
 
 class FamilySerializer(serializers.ModelSerializer):
     class Meta:
@@ -35,6 +35,9 @@ class WithdrawalSerializer(serializers.ModelSerializer):
             'last_modified_by',
         ]
     def get_child_name(self, obj):
+        # Annotated by WithdrawalViewSet; fall back to the related child otherwise
+        if hasattr(obj, 'child_full_name'):
+            return obj.child_full_name
         return f"{obj.child.first_name} {obj.child.last_name}"  # Adjust based on your Child model
     
     
@@ -53,13 +56,21 @@ class TransitionSerializer(serializers.ModelSerializer):
         model = Transition
         fields = ['id', 'child', 'child_name', 'next_classroom', 'next_classroom_name', 'transition_date', 'notes', 'age_at_transition']
     
+    # The child_full_name, classroom_name and age_in_months annotations come
+    # from TransitionViewSet; single objects fall back to the related rows.
     def get_child_name(self, obj):
+        if hasattr(obj, 'child_full_name'):
+            return obj.child_full_name
         return f"{obj.child.first_name} {obj.child.last_name}"
 
     def get_next_classroom_name(self, obj):
+        if hasattr(obj, 'classroom_name'):
+            return obj.classroom_name
         return obj.next_classroom.classroom_name
 
     def get_age_at_transition(self, obj):
+        if hasattr(obj, 'age_in_months'):
+            return obj.age_in_months
         # Calculate the child's age in months at the transition date
         if obj.child.date_of_birth and obj.transition_date:
             dob = obj.child.date_of_birth
@@ -117,6 +128,83 @@ class InvoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invoice
         fields = '__all__'
+        # Owned by the payment allocator (core/payments.py)
+        read_only_fields = ['paid_amount', 'payment_status']
+
+class FamilyBalanceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FamilyBalance
+        fields = ['family', 'invoiced', 'paid', 'balance']
+
+class LedgerLineSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    entry_type = serializers.CharField()
+    description = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class FamilyStatementSerializer(serializers.Serializer):
+    family_id = serializers.IntegerField()
+    start = serializers.DateField()
+    end = serializers.DateField()
+    opening_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    entries = LedgerLineSerializer(many=True)
+    closing_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class FamilyAgingSerializer(serializers.Serializer):
+    family_id = serializers.IntegerField()
+    date = serializers.DateField()
+    balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    aging = serializers.DictField(child=serializers.DecimalField(max_digits=12, decimal_places=2))
+
+class ArAgingFamilySerializer(serializers.Serializer):
+    family_id = serializers.IntegerField()
+    family_name = serializers.CharField()
+    aging = serializers.DictField(child=serializers.DecimalField(max_digits=12, decimal_places=2))
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class ArAgingReportSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    families = ArAgingFamilySerializer(many=True)
+    totals = serializers.DictField(child=serializers.DecimalField(max_digits=12, decimal_places=2))
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class OccupancyChangeSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    enrolled = serializers.IntegerField()
+
+class ClassroomForecastSerializer(serializers.Serializer):
+    classroom_id = serializers.IntegerField()
+    classroom_name = serializers.CharField()
+    program_type = serializers.CharField()
+    capacity = serializers.IntegerField()
+    alternative_capacities = AlternativeCapacitySerializer(many=True)
+    peak_enrolled = serializers.IntegerField()
+    first_over_capacity = serializers.DateField(allow_null=True)
+    changes = OccupancyChangeSerializer(many=True)
+
+class CapacityForecastSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    classrooms = ClassroomForecastSerializer(many=True)
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    matched_classroom_name = serializers.CharField(source='matched_classroom.classroom_name', read_only=True, default=None)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = [
+            'id', 'first_name', 'last_name', 'date_of_birth', 'family', 'program_type', 'desired_start_date',
+            'priority', 'status', 'date_added', 'notes',
+            'matched_classroom', 'matched_classroom_name', 'matched_start_date', 'matched_at',
+        ]
+        # Filled in by the matcher (core/waitlist.py)
+        read_only_fields = ['date_added', 'matched_classroom', 'matched_start_date', 'matched_at']
+
+class FundingReconciliationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FundingReconciliation
+        fields = '__all__'
 
 class GovernmentFundingSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,333 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.billing import recalculate_invoices
+from core.calendar_service import invalidate_calendar, month_bounds
+from core.funding import reconcile_funding
+from core.ledger import sync_ledger
+from core.models import (
+    Calendar, Child, Classroom, DailyOccupancy, Deposit, GovernmentFunding, Invoice, Payment, Transition,
+    WaitlistEntry, Withdrawal,
+)
+from core.occupancy import rebuild_enrollment_spans, refresh_daily_occupancy
+from core.payments import allocate_payments, reallocate_payments
+from core.waitlist import match_waitlist
+
+
+def _earliest(*dates):
+    dates = [d for d in dates if d is not None]
+    return min(dates) if dates else None
+
+
+def _latest(*dates):
+    # An open-ended (None) date means the change reaches the end of the calendar
+    if any(d is None for d in dates):
+        return None
+    return max(dates)
+
+
+def _refresh(start, end, classroom_ids):
+    classroom_ids = {c for c in classroom_ids if c is not None}
+    if classroom_ids:
+        refresh_daily_occupancy(start, end, classroom_ids)
+
+
+@receiver(pre_save, sender=Child)
+def remember_child_enrollment(sender, instance, raw=False, **kwargs):
+    instance._previous_enrollment = None
+    if instance.pk and not raw:
+        instance._previous_enrollment = (
+            Child.objects.filter(pk=instance.pk)
+            .values_list('classroom_id', 'enrollment_start_date', 'enrollment_end_date')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Child)
+@receiver(post_delete, sender=Child)
+def update_occupancy_for_child(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    classroom_ids = {instance.classroom_id}
+    start, end = instance.enrollment_start_date, instance.enrollment_end_date
+    previous = getattr(instance, '_previous_enrollment', None)
+    if previous:
+        classroom_ids.add(previous[0])
+        start, end = _earliest(start, previous[1]), _latest(end, previous[2])
+    # Transition counts depend on the child's classroom and end date too
+    classroom_ids.update(
+        Transition.objects.filter(child_id=instance.pk).values_list('next_classroom_id', flat=True)
+    )
+    _refresh(start, end, classroom_ids)
+
+
+@receiver(pre_save, sender=Transition)
+def remember_transition(sender, instance, raw=False, **kwargs):
+    instance._previous_transition = None
+    if instance.pk and not raw:
+        instance._previous_transition = (
+            Transition.objects.filter(pk=instance.pk)
+            .values_list('next_classroom_id', 'transition_date')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Transition)
+@receiver(post_delete, sender=Transition)
+def update_occupancy_for_transition(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    child = Child.objects.filter(pk=instance.child_id).values(
+        'classroom_id', 'enrollment_end_date'
+    ).first()
+    if child is None:
+        return
+    # The child's other transitions decide which room they leave
+    classroom_ids = {instance.next_classroom_id, child['classroom_id']}
+    classroom_ids.update(
+        Transition.objects.filter(child_id=instance.child_id).values_list('next_classroom_id', flat=True)
+    )
+    start = instance.transition_date
+    previous = getattr(instance, '_previous_transition', None)
+    if previous:
+        classroom_ids.add(previous[0])
+        start = _earliest(start, previous[1])
+    _refresh(start, child['enrollment_end_date'], classroom_ids)
+
+
+@receiver(post_save, sender=Withdrawal)
+@receiver(post_delete, sender=Withdrawal)
+def update_occupancy_for_withdrawal(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    classroom_ids = set(
+        Transition.objects.filter(child_id=instance.child_id).values_list('next_classroom_id', flat=True)
+    )
+    classroom_ids.update(Child.objects.filter(pk=instance.child_id).values_list('classroom_id', flat=True))
+    _refresh(instance.withdrawal_date, None, classroom_ids)
+
+
+@receiver(post_save, sender=Calendar)
+def update_occupancy_for_calendar(sender, instance, raw=False, **kwargs):
+    invalidate_calendar()
+    if not raw:
+        refresh_daily_occupancy(instance.date, instance.date)
+
+
+@receiver(post_delete, sender=Calendar)
+def remove_occupancy_for_calendar(sender, instance, **kwargs):
+    invalidate_calendar()
+    DailyOccupancy.objects.filter(date=instance.date).delete()
+
+
+@receiver(post_save, sender=Classroom)
+def update_occupancy_for_classroom(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        refresh_daily_occupancy(classroom_ids=[instance.pk])
+    else:
+        DailyOccupancy.objects.filter(classroom=instance).update(capacity=instance.max_capacity)
+
+
+# Enrollment history: rewrite the child's spans. A deleted transition may be
+# part of its child's cascade delete, so that rebuild waits for the commit.
+
+@receiver(post_save, sender=Child)
+def update_spans_for_child(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rebuild_enrollment_spans([instance.pk])
+
+
+@receiver(post_save, sender=Transition)
+def update_spans_for_transition(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rebuild_enrollment_spans([instance.child_id])
+
+
+@receiver(post_delete, sender=Transition)
+def remove_spans_for_transition(sender, instance, **kwargs):
+    transaction.on_commit(partial(rebuild_enrollment_spans, [instance.child_id]))
+
+
+# Billing: re-price only the affected child's invoices once the change is
+# committed, instead of re-running the whole month.
+
+def _recalculate(child_id, start):
+    transaction.on_commit(partial(recalculate_invoices, [child_id], start))
+
+
+@receiver(post_save, sender=Child)
+def recalculate_invoices_for_child(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_enrollment', None)
+    if raw or created or not previous:
+        return
+    classroom_id, start, end = previous
+    changed = []
+    if classroom_id != instance.classroom_id or start != instance.enrollment_start_date:
+        changed += [start, instance.enrollment_start_date]
+    if end != instance.enrollment_end_date:
+        changed.append(_earliest(end, instance.enrollment_end_date))
+    if changed:
+        _recalculate(instance.pk, _earliest(*changed))
+
+
+@receiver(post_save, sender=Transition)
+@receiver(post_delete, sender=Transition)
+def recalculate_invoices_for_transition(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_transition', None)
+    _recalculate(instance.child_id, _earliest(instance.transition_date, previous and previous[1]))
+
+
+@receiver(pre_save, sender=Withdrawal)
+def remember_withdrawal(sender, instance, raw=False, **kwargs):
+    instance._previous_withdrawal_date = None
+    if instance.pk and not raw:
+        instance._previous_withdrawal_date = (
+            Withdrawal.objects.filter(pk=instance.pk).values_list('withdrawal_date', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Withdrawal)
+@receiver(post_delete, sender=Withdrawal)
+def recalculate_invoices_for_withdrawal(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_withdrawal_date', None)
+    _recalculate(instance.child_id, _earliest(instance.withdrawal_date, previous))
+
+
+# Payments: allocate new payments and invoices incrementally; edits and
+# deletions re-run the family's allocation from scratch.
+
+@receiver(pre_save, sender=Payment)
+@receiver(pre_save, sender=Invoice)
+def remember_family(sender, instance, raw=False, **kwargs):
+    instance._previous_family_id = None
+    if instance.pk and not raw:
+        instance._previous_family_id = (
+            sender.objects.filter(pk=instance.pk).values_list('family_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Invoice)
+def allocate_for_family(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        transaction.on_commit(partial(allocate_payments, [instance.family_id]))
+    else:
+        family_ids = {instance.family_id, getattr(instance, '_previous_family_id', None)} - {None}
+        transaction.on_commit(partial(reallocate_payments, family_ids))
+
+
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Invoice)
+def reallocate_for_family(sender, instance, **kwargs):
+    transaction.on_commit(partial(reallocate_payments, [instance.family_id]))
+
+
+# Ledger: post entries for the family's changed invoices, payments and
+# deposits once the change is committed.
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Invoice)
+def sync_ledger_for_family(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    family_ids = {instance.family_id, getattr(instance, '_previous_family_id', None)} - {None}
+    transaction.on_commit(partial(sync_ledger, family_ids))
+
+
+@receiver(post_save, sender=Deposit)
+@receiver(post_delete, sender=Deposit)
+def sync_ledger_for_deposit(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    family_id = Child.objects.filter(pk=instance.child_id).values_list('family_id', flat=True).first()
+    if family_id is not None:
+        transaction.on_commit(partial(sync_ledger, [family_id]))
+
+
+# Funding: re-reconcile the month a receipt lands in
+@receiver(post_save, sender=GovernmentFunding)
+@receiver(post_delete, sender=GovernmentFunding)
+def reconcile_funding_for_receipt(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    first = instance.date_received.replace(day=1)
+    transaction.on_commit(partial(reconcile_funding, first, month_bounds(first.year, first.month)[1]))
+
+
+# Waitlist: re-match the entries of the programs whose seats changed once the
+# change is committed. Page loads read the stored matches.
+
+def _rematch(programs):
+    programs = set(programs) - {None}
+    if programs:
+        transaction.on_commit(partial(match_waitlist, programs))
+
+
+def _programs_for_child(child_id, *classroom_ids):
+    # Program types of the child's room, the rooms they transition to and any
+    # rooms they just left
+    return Classroom.objects.filter(
+        Q(id__in=[c for c in classroom_ids if c is not None]) | Q(children__id=child_id) | Q(transition__child_id=child_id)
+    ).values_list('program_type', flat=True).distinct()
+
+
+@receiver(post_save, sender=Child)
+@receiver(post_delete, sender=Child)
+def rematch_waitlist_for_child(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_enrollment', None)
+    _rematch(_programs_for_child(instance.pk, instance.classroom_id, previous and previous[0]))
+
+
+@receiver(post_save, sender=Transition)
+@receiver(post_delete, sender=Transition)
+def rematch_waitlist_for_transition(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_transition', None)
+    _rematch(_programs_for_child(instance.child_id, instance.next_classroom_id, previous and previous[0]))
+
+
+@receiver(post_save, sender=Withdrawal)
+@receiver(post_delete, sender=Withdrawal)
+def rematch_waitlist_for_withdrawal(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _rematch(_programs_for_child(instance.child_id))
+
+
+@receiver(post_save, sender=Classroom)
+@receiver(post_delete, sender=Classroom)
+def rematch_waitlist_for_classroom(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _rematch([instance.program_type])
+
+
+@receiver(pre_save, sender=WaitlistEntry)
+def remember_program(sender, instance, raw=False, **kwargs):
+    instance._previous_program_type = None
+    if instance.pk and not raw:
+        instance._previous_program_type = (
+            WaitlistEntry.objects.filter(pk=instance.pk).values_list('program_type', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=WaitlistEntry)
+@receiver(post_delete, sender=WaitlistEntry)
+def rematch_waitlist_for_entry(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _rematch([instance.program_type, getattr(instance, '_previous_program_type', None)])
@@ -0,0 +1,180 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+
+from core.calendar_service import invalidate_calendar
+from core.ledger import sync_ledger
+from core.models import (
+    AlternativeCapacity, Calendar, Child, Classroom, Deposit, Family, GovernmentFunding,
+    Invoice, Payment, Transition, Withdrawal,
+)
+from core.occupancy import rebuild_enrollment_spans
+from core.payments import allocate_payments
+
+PROGRAM_CAPACITY = {'Infant': 10, 'Toddler': 15, 'Preschool': 24}
+PAYMENT_METHODS = ['EFT', 'Credit Card', 'Cash', 'Cheque', 'Direct Payment']
+WITHDRAWAL_STATUSES = ['refunded', 'forfeited', 'held']
+
+
+def generate_centre(
+    children, start_year, years=1, seed=0, today=None, billing_months=1, batch_size=5000, ledger=False
+):
+    """Bulk-create a synthetic centre for load testing and benchmarks.
+
+    Creates ``children`` children with families, classrooms, alternative
+    capacities, transitions, withdrawals, deposits, ``billing_months`` of
+    invoices and payments, government funding and a Calendar covering
+    ``years`` years from ``start_year``. Everything goes through bulk_create
+    in one transaction, so model signals do not fire. The enrollment
+    history is built here; with ``ledger`` the new families' ledger is
+    posted and their payments allocated too, which makes large centres
+    several times slower. Rebuild DailyOccupancy afterwards if it is
+    needed. The same ``seed`` produces the same centre.
+    Returns a dict of row counts per model.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    first_day = date(start_year, 1, 1)
+    last_day = date(start_year + years, 1, 1) - timedelta(days=1)
+    span_days = (last_day - first_day).days
+    counts = {}
+
+    def create(model, objs):
+        created = model.objects.bulk_create(objs, batch_size=batch_size)
+        counts[model.__name__] = counts.get(model.__name__, 0) + len(created)
+        return created
+
+    with transaction.atomic():
+        # Only add the Calendar days that do not exist yet
+        existing = set(Calendar.objects.filter(date__range=(first_day, last_day)).values_list('date', flat=True))
+        create(Calendar, [
+            Calendar(date=day, is_weekday=day.weekday() < 5, is_closed=day.weekday() >= 5)
+            for day in (first_day + timedelta(days=offset) for offset in range(span_days + 1))
+            if day not in existing
+        ])
+
+        program_types = list(PROGRAM_CAPACITY)
+        classrooms = create(Classroom, [
+            Classroom(
+                classroom_name=f"Room {i + 1}",
+                program_type=program_types[i % len(program_types)],
+                max_capacity=PROGRAM_CAPACITY[program_types[i % len(program_types)]],
+            )
+            for i in range(max(len(program_types), children // 12))
+        ])
+        create(AlternativeCapacity, [
+            AlternativeCapacity(
+                classroom=classroom,
+                program_type=program_types[(i + 1) % len(program_types)],
+                max_capacity=PROGRAM_CAPACITY[program_types[(i + 1) % len(program_types)]] - 2,
+            )
+            for i, classroom in enumerate(classrooms)
+        ])
+
+        classroom_ids = [classroom.id for classroom in classrooms]
+
+        families = create(Family, [
+            Family(
+                parent_1_name=f"Parent {i + 1}",
+                parent_1_phone=f"555-{i % 10000:04d}",
+                parent_1_email=f"parent{i + 1}@example.com",
+                address=f"{i + 1} Synthetic Street",
+                payment_preferences=rng.choice(PAYMENT_METHODS),
+            )
+            for i in range(max(1, children * 2 // 3))
+        ])
+
+        # Foreign keys are assigned by id to keep per-row overhead down
+        family_ids = [family.id for family in families]
+        kids = []
+        for i in range(children):
+            start = first_day + timedelta(days=rng.randint(0, span_days))
+            end = start + timedelta(days=rng.randint(60, 900)) if rng.random() < 0.15 else None
+            kids.append(Child(
+                first_name=f"Child{i + 1}",
+                last_name="Synthetic",
+                date_of_birth=start - timedelta(days=rng.randint(90, 1800)),
+                enrollment_start_date=start,
+                enrollment_end_date=end,
+                classroom_id=rng.choice(classroom_ids),
+                family_id=rng.choice(family_ids),
+                fob_required=rng.random() < 0.5,
+            ))
+        kids = create(Child, kids)
+
+        # One pending transition for roughly one child in ten
+        create(Transition, [
+            Transition(
+                child_id=child.id,
+                next_classroom_id=rng.choice(classroom_ids),
+                transition_date=today + timedelta(days=rng.randint(-90, 180)),
+                status='Planned',
+            )
+            for child in kids
+            if rng.random() < 0.1
+        ])
+        create(Withdrawal, [
+            Withdrawal(
+                child_id=child.id,
+                withdrawal_date=child.enrollment_end_date,
+                withdrawal_reason="Synthetic withdrawal",
+                status=rng.choice(WITHDRAWAL_STATUSES),
+            )
+            for child in kids
+            if child.enrollment_end_date
+        ])
+        create(Deposit, [
+            Deposit(
+                child_id=child.id,
+                deposit_type='FOB' if child.fob_required else 'Security',
+                amount=Decimal('50.00') if child.fob_required else Decimal('300.00'),
+                status='Paid',
+                date_collected=child.enrollment_start_date,
+            )
+            for child in kids
+        ])
+
+        invoices = []
+        payments = []
+        for month in range(billing_months):
+            # First of the current month, then each earlier month
+            month_index = today.year * 12 + today.month - 1 - month
+            due = date(month_index // 12, month_index % 12 + 1, 1)
+            for child in kids:
+                full = Decimal(rng.randint(1500, 2400))
+                parent = Decimal(rng.randint(300, 480))
+                invoices.append(Invoice(
+                    due_date=due, full_tuition=full, subsidy_amount=full - parent,
+                    parent_portion=parent, child_id=child.id, family_id=child.family_id,
+                ))
+                if rng.random() < 0.8:
+                    payments.append(Payment(
+                        family_id=child.family_id, child_id=child.id,
+                        payment_date=due + timedelta(days=rng.randint(0, 20)),
+                        amount_paid=parent, method=rng.choice(PAYMENT_METHODS),
+                    ))
+        create(Invoice, invoices)
+        create(Payment, payments)
+
+        create(GovernmentFunding, [
+            GovernmentFunding(
+                funding_source="Province",
+                stream="CWELCCA",
+                amount_received=Decimal(rng.randint(50000, 150000)),
+                date_received=date(start_year + year, month, 15),
+            )
+            for year in range(years)
+            for month in range(1, 13)
+        ])
+
+        # Bulk inserts bypass the signals that keep these current
+        rebuild_enrollment_spans([child.id for child in kids])
+        if ledger:
+            sync_ledger(family_ids)
+            allocate_payments(family_ids)
+
+    # Bulk writes bypass the Calendar signals
+    invalidate_calendar()
+    return counts
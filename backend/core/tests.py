@@ -1,6 +1,41 @@
+import csv
+import json
+import os
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from time import perf_counter
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
 from django.test import TestCase
-from core.models import Family, Child, Classroom
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from core.models import (
+    AlternativeCapacity, Attendance, Calendar, DailyOccupancy, Family, Child, Classroom,
+    Deposit, EnrollmentSpan, FamilyBalance, FundingReconciliation, GovernmentFunding, Invoice, LedgerEntry, LedgerSnapshot, Payment, PaymentAllocation,
+    SubsidyRate, Transition, WaitlistEntry, Withdrawal,
+)
+from core.admin import CalendarAdmin
+from core.billing import recalculate_invoices, run_billing
+from core.payments import reallocate_payments
+from core.rates import load_rates
+from core.reports import ar_aging
+from core.calendar_builder import build_calendar, stat_holidays
+from core.calendar_service import VERSION_KEY, get_calendar, invalidate_calendar
+from core.ledger import balance_as_of, family_aging, sync_ledger, take_snapshots
+from core.occupancy import (
+    classroom_roster, compute_daily_occupancy, effective_spans, occupancy_counts_on, refresh_daily_occupancy,
+)
 from core.serializers import ChildSerializer
+from core.synthetic import generate_centre
+from core.transitions import plan_age_outs, process_transitions, propose_age_outs
+from core.waitlist import match_waitlist
 
 class TestChildSerializer(TestCase):
     def setUp(self):
@@ -26,3 +61,1792 @@ class TestChildSerializer(TestCase):
         serializer = ChildSerializer(data=data)
         self.assertTrue(serializer.is_valid())
         self.assertEqual(serializer.validated_data["family"], self.family)
+
+
+class TestCalendarStats(TestCase):
+    def setUp(self):
+        self.family = Family.objects.create(parent_1_name="Test Parent")
+        self.classroom = Classroom.objects.create(classroom_name="Room A", max_capacity=10)
+        self.other_classroom = Classroom.objects.create(classroom_name="Room B", max_capacity=5)
+
+        # Two weeks of calendar rows
+        start = date(2025, 1, 1)
+        for offset in range(14):
+            day = start + timedelta(days=offset)
+            Calendar.objects.create(date=day, is_weekday=day.weekday() < 5)
+
+        Child.objects.create(
+            first_name="Ann", last_name="A", date_of_birth=date(2023, 1, 1),
+            enrollment_start_date=date(2025, 1, 3), enrollment_end_date=date(2025, 1, 10),
+            classroom=self.classroom, family=self.family,
+        )
+        Child.objects.create(
+            first_name="Ben", last_name="B", date_of_birth=date(2023, 1, 1),
+            enrollment_start_date=date(2024, 12, 1),
+            classroom=self.other_classroom, family=self.family,
+        )
+
+    def test_centre_wide_counts(self):
+        response = self.client.get("/api/enrollment/stats/")
+        self.assertEqual(response.status_code, 200)
+        by_date = {row["date"]: row for row in response.json()}
+        self.assertEqual(len(by_date), 14)
+        self.assertEqual(by_date["2025-01-02"]["total_enrolled"], 1)
+        self.assertEqual(by_date["2025-01-03"]["total_enrolled"], 2)
+        self.assertEqual(by_date["2025-01-10"]["total_enrolled"], 2)
+        self.assertEqual(by_date["2025-01-11"]["total_enrolled"], 1)
+        self.assertEqual(by_date["2025-01-11"]["total_capacity"], 15)
+
+    def test_classroom_counts(self):
+        response = self.client.get("/api/enrollment/stats/", {"classroom_id": self.classroom.id})
+        by_date = {row["date"]: row["total_enrolled"] for row in response.json()}
+        self.assertEqual(by_date["2025-01-02"], 0)
+        self.assertEqual(by_date["2025-01-03"], 1)
+        self.assertEqual(by_date["2025-01-11"], 0)
+
+    def test_query_count_does_not_grow_with_calendar(self):
+        with CaptureQueriesContext(connection) as short_range:
+            self.client.get("/api/enrollment/stats/", {"classroom_id": self.classroom.id})
+
+        # Extend the calendar to a full year
+        start = date(2025, 1, 15)
+        Calendar.objects.bulk_create(
+            Calendar(date=start + timedelta(days=offset)) for offset in range(351)
+        )
+        refresh_daily_occupancy(start)
+        invalidate_calendar()
+        with CaptureQueriesContext(connection) as full_year:
+            response = self.client.get("/api/enrollment/stats/", {"classroom_id": self.classroom.id})
+
+        self.assertEqual(len(response.json()), 365)
+        self.assertEqual(len(full_year), len(short_range))
+
+    def test_unknown_classroom(self):
+        response = self.client.get("/api/enrollment/stats/", {"classroom_id": 9999})
+        self.assertEqual(response.status_code, 404)
+
+
+class TestDailyOccupancy(TestCase):
+    def setUp(self):
+        self.family = Family.objects.create(parent_1_name="Test Parent")
+        self.infant_room = Classroom.objects.create(classroom_name="Infants", max_capacity=10)
+        self.toddler_room = Classroom.objects.create(classroom_name="Toddlers", max_capacity=15)
+        for offset in range(10):
+            Calendar.objects.create(date=date(2025, 3, 1) + timedelta(days=offset))
+        self.child = Child.objects.create(
+            first_name="Cal", last_name="C", date_of_birth=date(2024, 1, 1),
+            enrollment_start_date=date(2025, 3, 2),
+            classroom=self.infant_room, family=self.family,
+        )
+
+    def occupancy(self, day, classroom):
+        row = DailyOccupancy.objects.get(date=day, classroom=classroom)
+        return row.enrolled, row.transitioning_in, row.transitioning_out
+
+    def test_rows_follow_child_changes(self):
+        self.assertEqual(DailyOccupancy.objects.count(), 20)
+        self.assertEqual(self.occupancy(date(2025, 3, 1), self.infant_room), (0, 0, 0))
+        self.assertEqual(self.occupancy(date(2025, 3, 2), self.infant_room), (1, 0, 0))
+
+        self.child.enrollment_end_date = date(2025, 3, 5)
+        self.child.save()
+        self.assertEqual(self.occupancy(date(2025, 3, 5), self.infant_room), (1, 0, 0))
+        self.assertEqual(self.occupancy(date(2025, 3, 6), self.infant_room), (0, 0, 0))
+
+    def test_rows_follow_transitions(self):
+        transition = Transition.objects.create(
+            child=self.child, next_classroom=self.toddler_room,
+            transition_date=date(2025, 3, 7), status="Planned",
+        )
+        self.assertEqual(self.occupancy(date(2025, 3, 6), self.toddler_room), (0, 0, 0))
+        self.assertEqual(self.occupancy(date(2025, 3, 7), self.toddler_room), (1, 1, 0))
+        self.assertEqual(self.occupancy(date(2025, 3, 7), self.infant_room), (0, 0, 1))
+
+        transition.delete()
+        self.assertEqual(self.occupancy(date(2025, 3, 7), self.toddler_room), (0, 0, 0))
+
+    def test_capacity_and_calendar_changes(self):
+        self.infant_room.max_capacity = 8
+        self.infant_room.save()
+        self.assertEqual(DailyOccupancy.objects.get(date=date(2025, 3, 1), classroom=self.infant_room).capacity, 8)
+
+        Calendar.objects.get(date=date(2025, 3, 1)).delete()
+        self.assertFalse(DailyOccupancy.objects.filter(date=date(2025, 3, 1)).exists())
+
+    def test_views_read_from_table(self):
+        response = self.client.get("/api/classrooms-for-date", {"date": "2025-03-03"})
+        self.assertEqual(
+            response.json(),
+            [
+                {"id": self.infant_room.id, "classroom_name": "Infants", "total_enrolled": 1, "total_capacity": 10},
+                {"id": self.toddler_room.id, "classroom_name": "Toddlers", "total_enrolled": 0, "total_capacity": 15},
+            ],
+        )
+
+        # Dates outside the calendar are computed live
+        response = self.client.get("/api/classroom-attendance-stats", {"date": "2025-06-01"})
+        self.assertEqual([room["total_enrolled"] for room in response.json()], [1, 0])
+
+    def test_classroom_refresh_only_loads_its_children(self):
+        generate_centre(300, start_year=2025, years=1, today=date(2025, 3, 1))
+        process_transitions(date(2025, 3, 1))
+        first, last = date(2025, 1, 1), date(2025, 12, 31)
+        everything = effective_spans(first, last)
+        rooms = list(Classroom.objects.values_list("id", flat=True))
+        for room in rooms[:6]:
+            with CaptureQueriesContext(connection) as queries:
+                spans = effective_spans(first, last, [room])
+            self.assertEqual(spans, [span for span in everything if room in (span[1], span[2])])
+            # The room is restricted in SQL, not after loading every child
+            self.assertIn("next_classroom_id", queries[0]["sql"])
+
+    def test_rebuild_command_checks_live_counts(self):
+        Transition.objects.create(
+            child=self.child, next_classroom=self.toddler_room,
+            transition_date=date(2025, 3, 4), status="Planned",
+        )
+        DailyOccupancy.objects.all().delete()
+        call_command("rebuild_daily_occupancy", "--check", stdout=StringIO())
+        self.assertEqual(DailyOccupancy.objects.count(), 20)
+
+
+class TestClassroomRosterScaling(TestCase):
+    # Benchmark for classroom_attendance: the query count must stay constant
+    # and per-child latency flat as the centre grows from 50 to 5,000
+    # children. Latency is reported, and only enforced with
+    # BENCHMARK_STRICT=1 since wall-clock ratios are noisy on shared runners.
+    # The date is in the future so the live effective-classroom resolver is
+    # measured; past dates read EnrollmentSpan (see TestEnrollmentSpans).
+    DAY = date.today() + timedelta(days=30)
+
+    def setUp(self):
+        self.family = Family.objects.create(parent_1_name="Test Parent")
+        self.classroom = Classroom.objects.create(classroom_name="Room A", max_capacity=10)
+        self.other_classroom = Classroom.objects.create(classroom_name="Room B", max_capacity=10)
+        Calendar.objects.create(date=self.DAY, is_weekday=True)
+
+    def seed(self, count):
+        Child.objects.all().delete()
+        children = Child.objects.bulk_create(
+            Child(
+                first_name=f"Child{i}", last_name="Bench", date_of_birth=date(2023, 1, 1),
+                enrollment_start_date=date(2025, 1, 1),
+                classroom=self.classroom if i % 2 else self.other_classroom,
+                family=self.family,
+            )
+            for i in range(count)
+        )
+        # Every fifth child changes rooms before the attendance date
+        Transition.objects.bulk_create(
+            Transition(
+                child=child,
+                next_classroom=self.other_classroom if child.classroom_id == self.classroom.id else self.classroom,
+                transition_date=self.DAY - timedelta(days=30), status="Planned",
+            )
+            for child in children[::5]
+        )
+
+    def reference_roster(self):
+        # The original list-membership implementation
+        enrolled = Child.objects.filter(
+            classroom=self.classroom, enrollment_start_date__lte=self.DAY
+        ).exclude(enrollment_end_date__lt=self.DAY).order_by("id")
+        transitioning_in = Transition.objects.filter(
+            next_classroom=self.classroom, transition_date__lte=self.DAY
+        ).exclude(child__enrollment_end_date__lt=self.DAY).order_by("id").select_related("child")
+        transitioning_out = Transition.objects.filter(
+            child__classroom=self.classroom, transition_date__lte=self.DAY
+        ).exclude(next_classroom=self.classroom).select_related("child")
+        children = list(enrolled) + [t.child for t in transitioning_in]
+        return [child.id for child in children if child not in [t.child for t in transitioning_out]]
+
+    def fetch(self):
+        get_calendar()  # Measure with the calendar cache warm
+        start = perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/classroom-attendance", {"classroom_id": self.classroom.id, "date": self.DAY.isoformat()}
+            )
+        elapsed = perf_counter() - start
+        self.assertFalse(any("enrollmentspan" in query["sql"] for query in queries))
+        return response.json(), len(queries), elapsed
+
+    def test_roster_matches_reference(self):
+        self.seed(50)
+        roster, _, _ = self.fetch()
+        self.assertEqual([child["id"] for child in roster], sorted(self.reference_roster()))
+
+    def test_flat_scaling(self):
+        self.seed(50)
+        small_roster, small_queries, small_time = self.fetch()
+        self.seed(5000)
+        large_roster, large_queries, large_time = self.fetch()
+
+        self.assertEqual(len(small_roster), 25)
+        self.assertEqual(len(large_roster), 2500)
+        self.assertEqual(small_queries, large_queries)
+        small_per_child = small_time / len(small_roster) * 1000
+        large_per_child = large_time / len(large_roster) * 1000
+        sys.stdout.write(
+            f"\nclassroom_attendance: {small_per_child:.3f} ms/child at 50 children, "
+            f"{large_per_child:.3f} ms/child at 5000\n"
+        )
+        if os.environ.get("BENCHMARK_STRICT"):
+            # Per-child cost must not grow with the size of the centre
+            self.assertLess(large_per_child, 3 * small_per_child)
+
+
+class TestEffectiveClassroom(TestCase):
+    def setUp(self):
+        self.family = Family.objects.create(parent_1_name="Test Parent")
+        self.infant_room = Classroom.objects.create(classroom_name="Infants", max_capacity=10)
+        self.toddler_room = Classroom.objects.create(classroom_name="Toddlers", max_capacity=15)
+        for offset in range(7):
+            Calendar.objects.create(date=date(2025, 3, 3) + timedelta(days=offset))
+        self.child = Child.objects.create(
+            first_name="Dee", last_name="D", date_of_birth=date(2023, 9, 1),
+            enrollment_start_date=date(2025, 1, 1),
+            classroom=self.infant_room, family=self.family,
+        )
+        Transition.objects.create(
+            child=self.child, next_classroom=self.toddler_room,
+            transition_date=date(2025, 3, 5), status="Planned",
+        )
+
+    def test_effective_on(self):
+        before = Child.objects.effective_on(date(2025, 3, 4)).get()
+        after = Child.objects.effective_on(date(2025, 3, 5)).get()
+        self.assertEqual(before.effective_classroom_id, self.infant_room.id)
+        self.assertEqual(after.effective_classroom_id, self.toddler_room.id)
+        self.assertFalse(Child.objects.effective_on(date(2024, 12, 31)).exists())
+
+    def test_later_processed_transition_wins(self):
+        # A transition processed on 3/7 moved the child from Infants to
+        # Preschool, after the pending move to Toddlers dated 3/5
+        preschool = Classroom.objects.create(classroom_name="Preschool", max_capacity=20)
+        Transition.objects.create(
+            child=self.child, next_classroom=preschool, previous_classroom=self.infant_room,
+            transition_date=date(2025, 3, 7), status="Completed", processed=True,
+        )
+        Child.objects.filter(pk=self.child.pk).update(classroom=preschool)
+        spans = effective_spans(date(2025, 3, 3), date(2025, 3, 9))
+        expected = {
+            date(2025, 3, 4): (self.infant_room.id, self.infant_room.id),
+            date(2025, 3, 6): (self.toddler_room.id, self.infant_room.id),
+            date(2025, 3, 7): (preschool.id, preschool.id),
+            date(2025, 3, 9): (preschool.id, preschool.id),
+        }
+        for day, rooms in expected.items():
+            child = Child.objects.effective_on(day).get()
+            self.assertEqual((child.effective_classroom_id, child.home_classroom_id), rooms, day)
+            self.assertEqual(
+                [(span[1], span[2]) for span in spans if span[3] <= day and (span[4] is None or day <= span[4])],
+                [rooms], day,
+            )
+
+    def test_endpoints_agree(self):
+        for day, infants, toddlers in (("2025-03-04", 1, 0), ("2025-03-05", 0, 1)):
+            roster = {
+                room.id: len(self.client.get(
+                    "/api/classroom-attendance", {"classroom_id": room.id, "date": day}
+                ).json())
+                for room in (self.infant_room, self.toddler_room)
+            }
+            stats = {
+                row["classroom_id"]: row["total_enrolled"]
+                for row in self.client.get("/api/classroom-attendance-stats", {"date": day}).json()
+            }
+            for_date = {
+                row["id"]: row["total_enrolled"]
+                for row in self.client.get("/api/classrooms-for-date", {"date": day}).json()
+            }
+            calendar = {
+                room.id: next(
+                    row["total_enrolled"]
+                    for row in self.client.get("/api/enrollment/stats/", {"classroom_id": room.id}).json()
+                    if row["date"] == day
+                )
+                for room in (self.infant_room, self.toddler_room)
+            }
+            expected = {self.infant_room.id: infants, self.toddler_room.id: toddlers}
+            self.assertEqual(roster, expected)
+            self.assertEqual(stats, expected)
+            self.assertEqual(for_date, expected)
+            self.assertEqual(calendar, expected)
+
+
+class TestClassroomStatsQueryCount(TestCase):
+    def setUp(self):
+        self.family = Family.objects.create(parent_1_name="Test Parent")
+        self.classrooms = [Classroom.objects.create(classroom_name="Room 0", max_capacity=10)]
+
+    def add_classrooms(self, count):
+        for i in range(count):
+            classroom = Classroom.objects.create(classroom_name=f"Room {i + 1}", max_capacity=10)
+            Child.objects.create(
+                first_name="Eve", last_name=str(i), date_of_birth=date(2023, 1, 1),
+                enrollment_start_date=date(2025, 1, 1), classroom=classroom, family=self.family,
+            )
+            self.classrooms.append(classroom)
+
+    def count_queries(self, url):
+        # 2025-06-02 has no Calendar row, so the counts are computed live
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"date": "2025-06-02"})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+    def test_query_count_independent_of_classrooms(self):
+        for url in ("/api/classroom-attendance-stats", "/api/classrooms-for-date"):
+            with self.subTest(url=url):
+                Classroom.objects.exclude(id=self.classrooms[0].id).delete()
+                self.classrooms = self.classrooms[:1]
+                self.add_classrooms(2)
+                few, _ = self.count_queries(url)
+                self.add_classrooms(10)
+                many, rows = self.count_queries(url)
+                self.assertEqual(few, many)
+                self.assertEqual(len(rows), 13)
+                self.assertEqual([row["total_enrolled"] for row in rows], [0] + [1] * 12)
+
+
+class TestListEndpointQueryCounts(TestCase):
+    # Every list endpoint must issue the same number of queries for one row
+    # as for a full page of rows.
+    LIST_URLS = [
+        "/api/transitions/",
+        "/api/withdrawals/",
+        "/api/families/",
+        "/api/children/",
+        "/api/children-list/",
+        "/children/dropdown/",
+        "/api/classrooms/",
+        "/classrooms-list/",
+        "/families-list/",
+        "/api/attendance/",
+        "/api/payments/",
+        "/api/invoices/",
+        "/api/government-funding/",
+        "/upcoming_enrollments/",
+    ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office"))
+        self.seeded = 0
+
+    def seed(self, count):
+        future = date.today() + timedelta(days=30)
+        for i in range(self.seeded, count):
+            family = Family.objects.create(parent_1_name=f"Parent {i}")
+            classroom = Classroom.objects.create(classroom_name=f"Room {i}", max_capacity=10)
+            AlternativeCapacity.objects.create(classroom=classroom, program_type="Toddler", max_capacity=8)
+            child = Child.objects.create(
+                first_name="Child", last_name=str(i), date_of_birth=date(2023, 1, 1),
+                enrollment_start_date=future, classroom=classroom, family=family,
+            )
+            Transition.objects.create(
+                child=child, next_classroom=classroom, transition_date=future, status="Planned"
+            )
+            Withdrawal.objects.create(
+                child=child, withdrawal_date=future, withdrawal_reason="Moving", status="held"
+            )
+            Attendance.objects.create(classroom=classroom, date=future)
+            Payment.objects.create(family=family, child=child, payment_date=future, amount_paid=10, method="EFT")
+            Invoice.objects.create(
+                due_date=future, full_tuition=100, subsidy_amount=60, parent_portion=40,
+                child=child, family=family,
+            )
+            GovernmentFunding.objects.create(
+                funding_source="Province", stream="CWELCCA", amount_received=100, date_received=future
+            )
+        self.seeded = count
+
+    def query_count(self, url):
+        cache.clear()  # Reset throttling between requests
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_query_count_independent_of_page_size(self):
+        self.seed(1)
+        single = {url: self.query_count(url) for url in self.LIST_URLS}
+        self.seed(8)
+        for url in self.LIST_URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.query_count(url), single[url])
+
+    def test_transition_annotations(self):
+        self.seed(1)
+        transition = self.client.get("/api/transitions/").json()["results"][0]
+        child = Child.objects.get()
+        expected_age = (
+            (child.enrollment_start_date.year - 2023) * 12 + child.enrollment_start_date.month - 1
+        )
+        self.assertEqual(transition["child_name"], "Child 0")
+        self.assertEqual(transition["next_classroom_name"], "Room 0")
+        self.assertEqual(transition["age_at_transition"], expected_age)
+        self.assertEqual(self.client.get("/api/withdrawals/").json()["results"][0]["child_name"], "Child 0")
+
+
+class TestGenerateSyntheticCentre(TestCase):
+    def test_generates_consistent_centre(self):
+        call_command(
+            "generate_synthetic_centre", "--children", "60", "--start-year", "2025", "--years", "2",
+            "--billing-months", "2", "--seed", "7", "--rebuild-occupancy", stdout=StringIO(),
+        )
+        self.assertEqual(Child.objects.count(), 60)
+        self.assertEqual(Calendar.objects.count(), 730)
+        self.assertEqual(Invoice.objects.count(), 120)
+        self.assertTrue(Transition.objects.exists())
+        self.assertEqual(DailyOccupancy.objects.count(), 730 * Classroom.objects.count())
+        # The ledger is opt-in (--ledger)
+        self.assertFalse(LedgerEntry.objects.exists())
+        for invoice in Invoice.objects.all():
+            invoice.clean()
+
+    def test_builds_derived_tables(self):
+        generate_centre(60, start_year=2025, years=1, today=date(2025, 3, 1), billing_months=2, ledger=True)
+        # Past rosters read the enrollment history
+        day = date(2025, 6, 2)
+        for classroom_id in Classroom.objects.values_list("id", flat=True):
+            live = list(
+                Child.objects.effective_on(day).filter(effective_classroom_id=classroom_id)
+                .order_by("id").values_list("id", flat=True)
+            )
+            self.assertEqual([row["id"] for row in classroom_roster(classroom_id, day)], live)
+        self.assertTrue(EnrollmentSpan.objects.exists())
+        # Already posted and allocated: nothing left for a backfill to do
+        self.assertEqual(sync_ledger(), [])
+        self.assertTrue(PaymentAllocation.objects.exists())
+        self.assertEqual(
+            Invoice.objects.aggregate(total=Sum("paid_amount"))["total"],
+            PaymentAllocation.objects.aggregate(total=Sum("amount"))["total"],
+        )
+
+    def test_seed_is_repeatable(self):
+        def snapshot():
+            return list(Child.objects.order_by("id").values_list(
+                "date_of_birth", "enrollment_start_date", "enrollment_end_date"
+            ))
+
+        call_command("generate_synthetic_centre", "--children", "20", "--seed", "3", stdout=StringIO())
+        first = snapshot()
+        Child.objects.all().delete()
+        call_command("generate_synthetic_centre", "--children", "20", "--seed", "3", stdout=StringIO())
+        self.assertEqual(snapshot(), first)
+
+
+class TestCalendarBuilder(TestCase):
+    def test_holiday_rules(self):
+        holidays = stat_holidays(2026, 2027)
+        self.assertIn(date(2026, 5, 18), holidays)  # Victoria Day when May 25 is a Monday
+        self.assertIn(date(2026, 8, 3), holidays)  # Civic Holiday
+        self.assertIn(date(2026, 9, 7), holidays)  # Labour Day
+        self.assertIn(date(2026, 4, 3), holidays)  # Good Friday
+        # Christmas on a Saturday and Boxing Day on a Sunday
+        self.assertEqual(holidays[date(2027, 12, 25)], date(2027, 12, 27))
+        self.assertEqual(holidays[date(2027, 12, 26)], date(2027, 12, 28))
+
+    def test_build_calendar_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            call_command("build_calendar", "--start-year", "2025", "--end-year", "2034", stdout=StringIO())
+        self.assertEqual(Calendar.objects.count(), 3652)
+        # SQLite caps an INSERT at 999 parameters, so about 22 batches there
+        self.assertLess(len(queries), 35)
+
+        boxing_day = Calendar.objects.get(date=date(2027, 12, 26))
+        self.assertTrue(boxing_day.is_stat_holiday)
+        self.assertEqual(boxing_day.stat_substitution_date, date(2027, 12, 28))
+        substitute = Calendar.objects.get(date=date(2027, 12, 28))
+        self.assertTrue(substitute.is_weekday and substitute.is_stat_holiday and substitute.is_closed)
+        self.assertFalse(Calendar.objects.get(date=date(2027, 12, 29)).is_closed)
+        self.assertTrue(Calendar.objects.get(date=date(2027, 12, 4)).is_closed)  # Saturday
+
+    def test_rebuild_keeps_manual_closures(self):
+        build_calendar(2025, 2025)
+        Calendar.objects.filter(date=date(2025, 8, 15)).update(is_closed=True, manual=True)
+        # Only rows marked manual are kept; others are reset to the rules
+        Calendar.objects.filter(date=date(2025, 8, 14)).update(is_closed=True)
+        build_calendar(2025, 2025)
+        self.assertTrue(Calendar.objects.get(date=date(2025, 8, 15)).is_closed)
+        self.assertFalse(Calendar.objects.get(date=date(2025, 8, 14)).is_closed)
+        self.assertEqual(Calendar.objects.count(), 365)
+
+    def test_rebuild_corrects_old_rule_rows(self):
+        # The old Victoria Day rule closed Monday May 25 2026, a week late
+        build_calendar(2026, 2026)
+        Calendar.objects.filter(date=date(2026, 5, 25)).update(is_stat_holiday=True, is_closed=True)
+        build_calendar(2026, 2026)
+        self.assertFalse(Calendar.objects.get(date=date(2026, 5, 25)).is_closed)
+        self.assertTrue(Calendar.objects.get(date=date(2026, 5, 18)).is_stat_holiday)
+
+    def test_rebuild_keeps_manual_holidays(self):
+        build_calendar(2025, 2025)
+        # Remembrance Day, a Tuesday, marked as a holiday in CalendarAdmin
+        remembrance = Calendar.objects.get(date=date(2025, 11, 11))
+        remembrance.is_stat_holiday = True
+        remembrance.is_closed = True
+        CalendarAdmin(Calendar, admin.site).save_model(None, remembrance, None, True)
+        self.assertTrue(remembrance.manual)
+        call_command("populate_stat_holidays", "--year", "2025", stdout=StringIO())
+        call_command("populate_calendar", "--year", "2025", stdout=StringIO())
+        remembrance.refresh_from_db()
+        self.assertTrue(remembrance.is_stat_holiday and remembrance.is_closed)
+        self.assertFalse(Calendar.objects.get(date=date(2025, 11, 12)).is_stat_holiday)
+        self.assertEqual(Calendar.objects.filter(is_stat_holiday=True, is_weekday=True).count(), 11)
+
+
+class TestCalendarService(TestCase):
+    def setUp(self):
+        build_calendar(2025, 2026)
+        Calendar.objects.filter(date=date(2025, 3, 14)).update(is_closed=True, manual=True)  # PD day
+        invalidate_calendar()
+
+    def test_lookups(self):
+        calendar = get_calendar()
+        self.assertEqual(len(calendar), 730)
+        self.assertTrue(calendar.is_open(date(2025, 3, 13)))
+        self.assertFalse(calendar.is_open(date(2025, 3, 14)))
+        self.assertFalse(calendar.is_open(date(2025, 3, 15)))  # Saturday
+        self.assertFalse(calendar.is_open(date(2025, 12, 25)))
+        self.assertIsNone(calendar.flags_for(date(2030, 1, 1)))
+
+        # March 2025 has 21 weekdays, less the PD day
+        self.assertEqual(calendar.open_days_between(date(2025, 3, 1), date(2025, 3, 31)), 20)
+        self.assertEqual(len(calendar.open_days(date(2025, 3, 1), date(2025, 3, 31))), 20)
+        self.assertEqual(calendar.open_days_between(date(2025, 3, 31), date(2025, 3, 1)), 0)
+        # January 1st is a holiday, so the first business day is the 2nd
+        self.assertEqual(calendar.nth_business_day(2025, 1, 1), date(2025, 1, 2))
+        self.assertEqual(calendar.nth_business_day(2025, 3, 9), date(2025, 3, 13))
+        self.assertEqual(calendar.nth_business_day(2025, 3, 10), date(2025, 3, 17))
+        self.assertIsNone(calendar.nth_business_day(2025, 3, 21))
+        self.assertIsNone(calendar.nth_open_day(date(2026, 12, 31), 5))
+
+    def test_cache_invalidated_by_signals(self):
+        calendar = get_calendar()
+        with self.assertNumQueries(0):
+            self.assertIs(get_calendar(), calendar)
+
+        entry = Calendar.objects.get(date=date(2025, 3, 13))
+        entry.is_closed = True
+        entry.save()
+        self.assertFalse(get_calendar().is_open(date(2025, 3, 13)))
+
+        Calendar.objects.get(date=date(2025, 3, 12)).delete()
+        self.assertIsNone(get_calendar().flags_for(date(2025, 3, 12)))
+
+    def test_cache_reloaded_when_another_process_changes_it(self):
+        calendar = get_calendar()
+        # A write in another process only reaches this one through the shared version
+        Calendar.objects.filter(date=date(2025, 3, 13)).update(is_closed=True)
+        self.assertIs(get_calendar(), calendar)
+        cache.set(VERSION_KEY, "other-process")
+        self.assertFalse(get_calendar().is_open(date(2025, 3, 13)))
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_calendar()
+        self.assertNotEqual(cache.get(VERSION_KEY), "other-process")
+
+    def test_classroom_attendance_uses_cache(self):
+        classroom = Classroom.objects.create(classroom_name="Room A", max_capacity=10)
+        get_calendar()
+        response = self.client.get("/api/classroom-attendance", {"classroom_id": classroom.id, "date": "2025-12-25"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/classroom-attendance", {"classroom_id": classroom.id, "date": "2025-12-27"})
+        self.assertEqual(response.json(), {"error": "Attendance is not calculated for weekends."})
+        response = self.client.get("/api/classroom-attendance", {"classroom_id": classroom.id, "date": "2031-01-06"})
+        self.assertEqual(response.status_code, 404)
+
+
+class TestBillingRun(TestCase):
+    # March 2025 has 21 open days and no stat holidays
+    def setUp(self):
+        build_calendar(2025, 2025)
+        call_command("populate_subsidy_rates", stdout=StringIO())
+        self.family = Family.objects.create(parent_1_name="Test Parent")
+        self.infant = Classroom.objects.create(classroom_name="Infant", program_type="Infant", max_capacity=10)
+        self.toddler = Classroom.objects.create(classroom_name="Toddler", program_type="Toddler", max_capacity=15)
+
+    def add_child(self, name, start=date(2024, 9, 1), end=None):
+        return Child.objects.create(
+            first_name=name, last_name="Billing", date_of_birth=date(2024, 1, 1),
+            enrollment_start_date=start, enrollment_end_date=end, classroom=self.infant, family=self.family,
+        )
+
+    def test_billable_days_and_amounts(self):
+        full_month = self.add_child("Full")
+        moving = self.add_child("Moving")
+        Transition.objects.create(
+            child=moving, next_classroom=self.toddler, transition_date=date(2025, 3, 17), status="Planned"
+        )
+        starting = self.add_child("Starting", start=date(2025, 3, 10))
+        leaving = self.add_child("Leaving")
+        Withdrawal.objects.create(
+            child=leaving, withdrawal_date=date(2025, 3, 7), withdrawal_reason="Moving", status="held"
+        )
+        self.add_child("Gone", end=date(2025, 2, 28))
+
+        invoices = {invoice.child_id: invoice for invoice in run_billing(2025, 3)}
+        self.assertEqual(set(invoices), {full_month.id, moving.id, starting.id, leaving.id})
+
+        self.assertEqual(invoices[full_month.id].full_tuition, Decimal("2313.99"))
+        self.assertEqual(invoices[full_month.id].parent_portion, Decimal("462.00"))
+        # 10 days as an infant, then 11 as a toddler
+        self.assertEqual(invoices[moving.id].full_tuition, Decimal("2117.31"))
+        self.assertEqual(invoices[starting.id].notes, "16 billable days")
+        self.assertEqual(invoices[leaving.id].notes, "5 billable days")
+        for invoice in Invoice.objects.all():
+            invoice.clean()
+            self.assertEqual(invoice.due_date, date(2025, 3, 3))
+            self.assertEqual((invoice.billing_period_start, invoice.billing_period_end), (date(2025, 3, 1), date(2025, 3, 31)))
+
+    def test_rates_in_effect_on_each_day(self):
+        child = self.add_child("Full")
+        SubsidyRate.objects.create(
+            program_type="Infant", daily_tuition_rate=Decimal("120.00"), daily_parent_rate=Decimal("12.00"),
+            effective_date=date(2025, 3, 17),
+        )
+        SubsidyRate.objects.create(
+            program_type="Infant", daily_tuition_rate=Decimal("999.00"), daily_parent_rate=Decimal("99.00"),
+            effective_date=date(2025, 4, 1),
+        )
+        invoice = run_billing(2025, 3)[0]
+        # 10 days at $110.19/$22, then 11 at $120/$12; April's rate is not used
+        self.assertEqual(invoice.full_tuition, Decimal("2421.90"))
+        self.assertEqual(invoice.parent_portion, Decimal("352.00"))
+        self.assertEqual(invoice.child_id, child.id)
+
+    def test_rate_table(self):
+        rates = load_rates()
+        self.assertIsNone(rates.rate_for("Unknown", date(2025, 1, 1)))
+        self.assertEqual(rates.rate_for("Toddler", date(1990, 1, 1)).daily_tuition_rate, Decimal("92.31"))
+        call_command("populate_subsidy_rates", "--effective-date", "2025-06-01", stdout=StringIO())
+        self.assertEqual(SubsidyRate.objects.filter(program_type="Toddler").count(), 2)
+        call_command("populate_subsidy_rates", stdout=StringIO())
+        self.assertEqual(SubsidyRate.objects.filter(program_type="Toddler").count(), 2)
+        # Only one undated version per program
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SubsidyRate.objects.create(
+                program_type="Toddler", daily_tuition_rate=Decimal("1.00"), daily_parent_rate=Decimal("1.00"),
+            )
+
+        SubsidyRate.objects.filter(effective_date__isnull=True).delete()
+        rates = load_rates()
+        self.assertIsNone(rates.rate_for("Toddler", date(2025, 5, 31)))
+        segments = list(rates.segments("Toddler", date(2025, 5, 20), date(2025, 6, 10)))
+        self.assertEqual([(start, end) for start, end, _ in segments], [(date(2025, 6, 1), date(2025, 6, 10))])
+
+    def test_rerun_skips_invoiced_children(self):
+        self.add_child("Full")
+        self.assertEqual(len(run_billing(2025, 3)), 1)
+        self.add_child("Late", start=date(2025, 3, 20))
+        self.assertEqual(len(run_billing(2025, 3)), 1)
+        self.assertEqual(Invoice.objects.count(), 2)
+
+    def test_one_billing_run_invoice_per_child_and_month(self):
+        self.add_child("Full")
+        invoice = run_billing(2025, 3)[0]
+        fields = dict(
+            family=self.family, child=invoice.child, billing_period_start=date(2025, 3, 1),
+            due_date=date(2025, 3, 3), full_tuition=0, subsidy_amount=0, parent_portion=0,
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Invoice.objects.create(**fields)
+        # Adjustments to the invoice share its period
+        Invoice.objects.create(adjusts=invoice, **fields)
+
+    def test_only_billed_families_are_allocated(self):
+        self.add_child("Full")
+        other = Family.objects.create(parent_1_name="Not Billed")
+        run_billing(2025, 3)
+        self.assertTrue(FamilyBalance.objects.filter(family=self.family).exists())
+        self.assertFalse(FamilyBalance.objects.filter(family=other).exists())
+
+    def test_command(self):
+        self.add_child("Full")
+        out = StringIO()
+        call_command("run_billing", "--year", "2025", "--month", "3", stdout=out)
+        self.assertIn("Created 1 invoices for 2025-03", out.getvalue())
+
+    def billed(self, child):
+        invoices = Invoice.objects.filter(child=child, billing_period_start=date(2025, 3, 1))
+        return invoices.aggregate(full=Sum("full_tuition"), parent=Sum("parent_portion"))
+
+    def test_changes_issue_adjustments(self):
+        child = self.add_child("Leaving")
+        other = self.add_child("Staying")
+        run_billing(2025, 2)
+        run_billing(2025, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            withdrawal = Withdrawal.objects.create(
+                child=child, withdrawal_date=date(2025, 3, 7), withdrawal_reason="Moving", status="held"
+            )
+        credit = Invoice.objects.get(adjusts__isnull=False)
+        self.assertEqual(credit.adjusts.billing_period_start, date(2025, 3, 1))
+        self.assertEqual(credit.full_tuition, Decimal("-1763.04"))  # 16 days of infant tuition
+        self.assertEqual(credit.parent_portion, Decimal("-352.00"))
+        credit.clean()
+
+        # Moving the withdrawal adjusts against everything billed so far
+        with self.captureOnCommitCallbacks(execute=True):
+            withdrawal.withdrawal_date = date(2025, 3, 14)
+            withdrawal.save()
+        self.assertEqual(self.billed(child), {"full": Decimal("1101.90"), "parent": Decimal("220.00")})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transition.objects.create(
+                child=other, next_classroom=self.toddler, transition_date=date(2025, 3, 17), status="Planned"
+            )
+        self.assertEqual(self.billed(other)["full"], Decimal("2117.31"))
+        # February was not touched by either change
+        self.assertFalse(Invoice.objects.filter(adjusts__billing_period_start=date(2025, 2, 1)).exists())
+        self.assertEqual(Invoice.objects.filter(adjusts__isnull=False).count(), 3)
+
+    def test_unchanged_amounts_need_no_adjustment(self):
+        child = self.add_child("Full")
+        run_billing(2025, 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            child.notes = "No billing change"
+            child.save()
+            child.enrollment_end_date = date(2025, 6, 30)
+            child.save()
+        self.assertEqual(recalculate_invoices([child.id]), [])
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_month_for_5000_children(self):
+        generate_centre(5000, start_year=2024, years=2, today=date(2025, 3, 1), billing_months=0)
+        get_calendar()
+        start = perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            invoices = run_billing(2025, 3)
+        elapsed = perf_counter() - start
+
+        self.assertGreater(len(invoices), 1000)
+        # A fixed number of reads however many children; the rest are INSERT batches
+        reads = [query for query in queries if query["sql"].startswith("SELECT")]
+        # 7 to bill, 5 to post to the ledger, 5 to allocate payments, 6 to reconcile funding
+        self.assertEqual(len(reads), 23)
+        self.assertLess(elapsed, 10)
+
+
+class TestPaymentAllocation(TestCase):
+    def setUp(self):
+        self.family = Family.objects.create(parent_1_name="Test Parent")
+        self.child = Child.objects.create(
+            first_name="Pay", last_name="Ment", date_of_birth=date(2023, 1, 1),
+            enrollment_start_date=date(2025, 1, 1), family=self.family,
+        )
+        # Created out of order to check that the oldest invoice is paid first
+        self.invoices = {
+            month: Invoice.objects.create(
+                due_date=date(2025, month, 1), full_tuition=Decimal("1000"), subsidy_amount=Decimal("600"),
+                parent_portion=Decimal("400"), child=self.child, family=self.family,
+            )
+            for month in (2, 1, 3)
+        }
+
+    def statuses(self):
+        return [
+            (invoice.paid_amount, invoice.payment_status)
+            for invoice in Invoice.objects.filter(family=self.family).order_by("due_date")
+        ]
+
+    def pay(self, amount, day=date(2025, 1, 15)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(
+                family=self.family, child=self.child, payment_date=day, amount_paid=Decimal(amount), method="EFT"
+            )
+
+    def test_payments_fill_oldest_invoices_first(self):
+        self.pay("600")
+        self.assertEqual(self.statuses(), [
+            (Decimal("400"), "Paid"), (Decimal("200"), "Partially Paid"), (Decimal("0"), "Unpaid"),
+        ])
+        self.pay("500", day=date(2025, 2, 15))
+        self.assertEqual(self.statuses(), [
+            (Decimal("400"), "Paid"), (Decimal("400"), "Paid"), (Decimal("300"), "Partially Paid"),
+        ])
+        self.assertEqual(PaymentAllocation.objects.count(), 4)
+        self.assertEqual(FamilyBalance.objects.get(family=self.family).balance, Decimal("100"))
+
+    def test_edits_and_deletions_reallocate(self):
+        payment = self.pay("600")
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.amount_paid = Decimal("1200")
+            payment.save()
+        self.assertEqual([status for _, status in self.statuses()], ["Paid"] * 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoices[1].delete()
+        self.assertEqual(FamilyBalance.objects.get(family=self.family).balance, Decimal("-400"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+        self.assertEqual([status for _, status in self.statuses()], ["Unpaid"] * 2)
+        self.assertFalse(PaymentAllocation.objects.exists())
+        self.assertEqual(FamilyBalance.objects.get(family=self.family).balance, Decimal("800"))
+
+    def test_balance_endpoint_is_one_read(self):
+        self.pay("600")
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = client.get(f"/api/families/{self.family.id}/balance/")
+        self.assertEqual(response.json()["balance"], "600.00")
+
+    def test_reallocate_command_backfills_history(self):
+        # Bulk inserts bypass the signals, as in a data import
+        Payment.objects.bulk_create([
+            Payment(family=self.family, payment_date=date(2025, 1, 10), amount_paid=Decimal("500"), method="Cash"),
+            Payment(family=self.family, payment_date=date(2025, 2, 10), amount_paid=Decimal("500"), method="Cash"),
+        ])
+        call_command("reallocate_payments", stdout=StringIO())
+        self.assertEqual(self.statuses(), [
+            (Decimal("400"), "Paid"), (Decimal("400"), "Paid"), (Decimal("200"), "Partially Paid"),
+        ])
+        self.assertEqual(FamilyBalance.objects.get(family=self.family).paid, Decimal("1000"))
+        # Running it again gives the same result
+        call_command("reallocate_payments", "--family", str(self.family.id), stdout=StringIO())
+        self.assertEqual(PaymentAllocation.objects.count(), 4)
+
+    def test_credits_are_applied_like_payments(self):
+        self.pay("300")
+        with self.captureOnCommitCallbacks(execute=True):
+            credit = Invoice.objects.create(
+                due_date=date(2025, 1, 20), full_tuition=Decimal("-500"), subsidy_amount=Decimal("-300"),
+                parent_portion=Decimal("-200"), child=self.child, family=self.family, adjusts=self.invoices[1],
+            )
+        # The payment pays $300 of January; the credit pays the rest and $100 of February
+        self.assertEqual(self.statuses(), [
+            (Decimal("400"), "Paid"), (Decimal("-200"), "Paid"), (Decimal("100"), "Partially Paid"),
+            (Decimal("0"), "Unpaid"),
+        ])
+        self.assertEqual(
+            list(PaymentAllocation.objects.filter(credit=credit).values_list("amount", flat=True).order_by("id")),
+            [Decimal("100"), Decimal("100")],
+        )
+        for invoice in Invoice.objects.all():
+            invoice.clean()
+        # Paid amounts agree with the balance
+        outstanding = sum(paid - portion for paid, portion in Invoice.objects.values_list("paid_amount", "parent_portion"))
+        self.assertEqual(-outstanding, FamilyBalance.objects.get(family=self.family).balance)
+
+        call_command("reallocate_payments", stdout=StringIO())
+        self.assertEqual(PaymentAllocation.objects.count(), 3)
+        self.assertEqual(Invoice.objects.get(pk=credit.pk).paid_amount, Decimal("-200"))
+
+    def test_api_cannot_set_allocated_fields(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("office"))
+        invoice = self.invoices[1]
+        response = client.patch(
+            f"/api/invoices/{invoice.id}/", {"paid_amount": "400.00", "payment_status": "Paid"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.paid_amount, invoice.payment_status), (Decimal("0"), "Unpaid"))
+
+
+class TestFamilyLedger(TestCase):
+    def setUp(self):
+        self.family = Family.objects.create(parent_1_name="Test Parent")
+        self.child = Child.objects.create(
+            first_name="Led", last_name="Ger", date_of_birth=date(2023, 1, 1),
+            enrollment_start_date=date(2025, 1, 1), family=self.family,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+
+    def invoice(self, due, parent="400"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Invoice.objects.create(
+                due_date=due, full_tuition=Decimal("1000"), subsidy_amount=Decimal("1000") - Decimal(parent),
+                parent_portion=Decimal(parent), child=self.child, family=self.family,
+            )
+
+    def pay(self, day, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(
+                family=self.family, payment_date=day, amount_paid=Decimal(amount), method="EFT"
+            )
+
+    def balance(self, day):
+        return balance_as_of(self.family.id, day)
+
+    def test_entries_are_appended_for_every_source(self):
+        invoice = self.invoice(date(2025, 1, 1))
+        payment = self.pay(date(2025, 1, 10), "300")
+        with self.captureOnCommitCallbacks(execute=True):
+            Deposit.objects.create(
+                child=self.child, deposit_type="FOB", amount=Decimal("50"), status="Paid",
+                date_collected=date(2025, 1, 2),
+            )
+        self.assertEqual(
+            sorted(LedgerEntry.objects.values_list("entry_type", "amount")),
+            sorted([
+                ("charge", Decimal("1000")), ("subsidy_credit", Decimal("-600")),
+                ("payment", Decimal("-300")), ("deposit_hold", Decimal("-50")),
+            ]),
+        )
+        self.assertEqual(self.balance(date(2025, 1, 31)), Decimal("50"))
+
+        take_snapshots(date(2025, 1, 31))
+
+        # Edits and deletions add corrections instead of changing history
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.amount_paid = Decimal("400")
+            payment.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.delete()
+        correction = LedgerEntry.objects.get(description__startswith="Correction")
+        self.assertEqual(correction.amount, Decimal("-100"))
+        self.assertEqual(correction.description, "Correction: Payment %d (EFT) of 2025-01-10" % payment.id)
+        self.assertEqual(LedgerEntry.objects.count(), 7)
+        # Both are posted on the day they are recorded, so January is unchanged
+        self.assertEqual(
+            set(LedgerEntry.objects.filter(date__gt=date(2025, 1, 31)).values_list("date", flat=True)), {date.today()}
+        )
+        self.assertEqual(self.balance(date(2025, 1, 31)), Decimal("50"))
+        self.assertTrue(LedgerSnapshot.objects.filter(date=date(2025, 1, 31)).exists())
+        self.assertEqual(self.balance(date.today()), Decimal("-450"))
+        self.assertEqual(sync_ledger(), [])
+
+    def test_snapshots_bound_the_tail_scan(self):
+        for month in range(1, 7):
+            self.invoice(date(2025, month, 1))
+            self.pay(date(2025, month, 20), "350")
+        expected = {day: self.balance(day) for day in (date(2025, 3, 31), date(2025, 6, 30))}
+        self.assertEqual(expected[date(2025, 6, 30)], Decimal("300"))
+
+        take_snapshots(date(2025, 3, 31))
+        with self.assertNumQueries(2):
+            self.assertEqual(self.balance(date(2025, 6, 30)), expected[date(2025, 6, 30)])
+        self.assertEqual(self.balance(date(2025, 3, 31)), expected[date(2025, 3, 31)])
+
+        # A back-dated payment drops the snapshots it would make stale
+        self.pay(date(2025, 2, 1), "100")
+        self.assertFalse(LedgerSnapshot.objects.exists())
+        self.assertEqual(self.balance(date(2025, 6, 30)), Decimal("200"))
+
+    def test_statement_endpoint(self):
+        self.invoice(date(2025, 1, 1))
+        self.invoice(date(2025, 2, 1))
+        self.pay(date(2025, 2, 5), "500")
+        response = self.client.get(
+            f"/api/families/{self.family.id}/statement/", {"start": "2025-02-01", "end": "2025-02-28"}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["opening_balance"], "400.00")
+        self.assertEqual([line["balance"] for line in data["entries"]], ["1400.00", "800.00", "300.00"])
+        self.assertEqual(data["closing_balance"], "300.00")
+        response = self.client.get(f"/api/families/{self.family.id}/statement/", {"start": "Feb"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_aging_endpoint(self):
+        for month in (1, 2, 3, 4):
+            self.invoice(date(2025, month, 1))
+        self.pay(date(2025, 4, 10), "500")  # Settles January and a quarter of February
+        with self.captureOnCommitCallbacks(execute=True):
+            Deposit.objects.create(
+                child=self.child, deposit_type="Security", amount=Decimal("300"), status="Paid",
+                date_collected=date(2025, 1, 2),
+            )
+        response = self.client.get(f"/api/families/{self.family.id}/aging/", {"date": "2025-04-15"})
+        data = response.json()
+        self.assertEqual(data["balance"], "800.00")
+        self.assertEqual(data["aging"], {"current": "400.00", "30": "400.00", "60": "300.00", "90+": "0.00"})
+
+    def test_sync_command_backfills(self):
+        Invoice.objects.bulk_create([Invoice(
+            due_date=date(2025, 1, 1), full_tuition=Decimal("1000"), subsidy_amount=Decimal("600"),
+            parent_portion=Decimal("400"), child=self.child, family=self.family,
+        )])
+        call_command("sync_ledger", "--snapshot-date", "2025-01-31", stdout=StringIO())
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+        self.assertEqual(LedgerSnapshot.objects.get(family=self.family).balance, Decimal("400"))
+
+
+class TestArAgingReport(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+
+    def test_buckets_per_family_and_centre(self):
+        day = date(2025, 6, 30)
+        families = []
+        for name in ("Ann", "Ben"):
+            family = Family.objects.create(parent_1_name=name)
+            child = Child.objects.create(
+                first_name=name, last_name="Aging", date_of_birth=date(2023, 1, 1),
+                enrollment_start_date=date(2025, 1, 1), family=family,
+            )
+            families.append((family, child))
+
+        def invoice(family, child, days_past_due, parent="400"):
+            return Invoice(
+                due_date=day - timedelta(days=days_past_due), full_tuition=Decimal(parent) + 600,
+                subsidy_amount=Decimal("600"), parent_portion=Decimal(parent), child=child, family=family,
+            )
+
+        (ann, ann_child), (ben, ben_child) = families
+        # Bulk inserts bypass the allocator, the ledger and date_issued's auto_now_add
+        issued_later = Invoice.objects.bulk_create([invoice(ann, ann_child, -1)])[0]
+        Invoice.objects.bulk_create([
+            invoice(ann, ann_child, -5),
+            invoice(ann, ann_child, 29),
+            invoice(ann, ann_child, 30),
+            invoice(ann, ann_child, 75),
+            invoice(ann, ann_child, 200),
+            invoice(ann, ann_child, 20, parent="-100"),  # A credit
+            invoice(ben, ben_child, 90),
+        ])
+        Invoice.objects.update(date_issued=date(2025, 1, 1))
+        Invoice.objects.filter(pk=issued_later.pk).update(date_issued=date(2025, 7, 1))
+        Payment.objects.bulk_create([
+            Payment(family=ann, payment_date=date(2025, 6, 1), amount_paid=Decimal("500"), method="EFT"),
+            Payment(family=ann, payment_date=date(2025, 7, 15), amount_paid=Decimal("300"), method="EFT"),
+            Payment(family=ben, payment_date=date(2025, 5, 1), amount_paid=Decimal("150"), method="EFT"),
+        ])
+        reallocate_payments()
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/reports/ar-aging/", {"date": day.isoformat()})
+        data = response.json()
+        # Ann's $500 paid on 2025-06-01 and $100 credit settle the 200-day
+        # invoice and half the 75-day one; the July payment and invoice
+        # come after the date
+        self.assertEqual(data["families"], [
+            {"family_id": ann.id, "family_name": "Ann", "total": "1400.00",
+             "aging": {"current": "800.00", "30": "400.00", "60": "200.00", "90+": "0.00"}},
+            {"family_id": ben.id, "family_name": "Ben", "total": "250.00",
+             "aging": {"current": "0.00", "30": "0.00", "60": "0.00", "90+": "250.00"}},
+        ])
+        self.assertEqual(data["totals"], {"current": "800.00", "30": "400.00", "60": "200.00", "90+": "250.00"})
+        self.assertEqual(data["total"], "1650.00")
+
+        # Matches the ledger aging, which only charges invoices once due
+        sync_ledger()
+        ann_ledger = family_aging(ann.id, day)
+        self.assertEqual({**ann_ledger, "current": ann_ledger["current"] + 400}, {
+            bucket: Decimal(amount) for bucket, amount in data["families"][0]["aging"].items()
+        })
+        self.assertEqual(family_aging(ben.id, day)["90+"], Decimal("250"))
+
+        # Today's aging reads the allocator's paid amounts and adds up to the balances
+        families, _ = ar_aging(date.today())
+        self.assertEqual(
+            {family["family_id"]: family["total"] for family in families},
+            dict(FamilyBalance.objects.values_list("family_id", "balance")),
+        )
+
+    def test_invalid_date(self):
+        self.assertEqual(self.client.get("/api/reports/ar-aging/", {"date": "June"}).status_code, 400)
+
+
+class TestCapacityForecast(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+
+    def test_change_points_and_first_overflow(self):
+        family = Family.objects.create(parent_1_name="Forecast")
+        room = Classroom.objects.create(classroom_name="Room 1", program_type="Toddler", max_capacity=2)
+        other = Classroom.objects.create(classroom_name="Room 2", program_type="Infant", max_capacity=5)
+        AlternativeCapacity.objects.create(classroom=room, program_type="Preschool", max_capacity=4)
+
+        def child(name, classroom, start, end=None):
+            return Child.objects.create(
+                first_name=name, last_name="Forecast", date_of_birth=date(2023, 1, 1), family=family,
+                classroom=classroom, enrollment_start_date=start, enrollment_end_date=end,
+            )
+
+        child("A", room, date(2024, 9, 1))
+        child("B", room, date(2025, 2, 1), date(2025, 4, 30))
+        withdrawn = child("C", room, date(2025, 3, 1))
+        Withdrawal.objects.create(child=withdrawn, withdrawal_date=date(2025, 3, 20), withdrawal_reason="Moving", status="held")
+        moving = child("D", other, date(2024, 9, 1))
+        Transition.objects.create(child=moving, next_classroom=room, transition_date=date(2025, 3, 10), status="Planned")
+
+        with self.assertNumQueries(5):
+            data = self.client.get("/api/reports/capacity-forecast/", {"start": "2025-01-01", "months": 6}).json()
+        self.assertEqual(data["end"], "2025-06-30")
+        first, second = data["classrooms"]
+        self.assertEqual(first["changes"], [
+            {"date": "2025-01-01", "enrolled": 1},
+            {"date": "2025-02-01", "enrolled": 2},
+            {"date": "2025-03-01", "enrolled": 3},
+            {"date": "2025-03-10", "enrolled": 4},
+            {"date": "2025-03-21", "enrolled": 3},
+            {"date": "2025-05-01", "enrolled": 2},
+        ])
+        self.assertEqual(first["first_over_capacity"], "2025-03-01")
+        self.assertEqual(first["peak_enrolled"], 4)
+        self.assertEqual(first["alternative_capacities"][0]["max_capacity"], 4)
+        self.assertEqual(second["changes"], [
+            {"date": "2025-01-01", "enrolled": 1}, {"date": "2025-03-10", "enrolled": 0},
+        ])
+        self.assertIsNone(second["first_over_capacity"])
+
+    def test_horizon_is_bounded(self):
+        self.assertEqual(self.client.get("/api/reports/capacity-forecast/", {"months": 36}).status_code, 400)
+        self.assertEqual(self.client.get("/api/reports/capacity-forecast/", {"start": "soon"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/reports/capacity-forecast/").json()["classrooms"], [])
+
+
+class TestAgeOutPlanner(TestCase):
+    TODAY = date(2025, 3, 1)
+
+    def setUp(self):
+        build_calendar(2025, 2026)
+        self.family = Family.objects.create(parent_1_name="Planner")
+        self.infant = Classroom.objects.create(classroom_name="Infant", program_type="Infant", max_capacity=5)
+        self.toddler_a = Classroom.objects.create(classroom_name="Toddler A", program_type="Toddler", max_capacity=1)
+        self.toddler_b = Classroom.objects.create(classroom_name="Toddler B", program_type="Toddler", max_capacity=1)
+        self.preschool = Classroom.objects.create(classroom_name="Preschool", program_type="Preschool", max_capacity=5)
+
+    def add_child(self, name, born, classroom, end=None):
+        return Child.objects.create(
+            first_name=name, last_name="Planner", date_of_birth=born, family=self.family, classroom=classroom,
+            enrollment_start_date=date(2024, 9, 1), enrollment_end_date=end,
+        )
+
+    def test_moves_children_when_a_seat_frees_up(self):
+        older = self.add_child("Older", date(2023, 1, 1), self.toddler_a)  # 30 months on 2025-07-01
+        self.add_child("Leaving", date(2024, 6, 1), self.toddler_b, end=date(2025, 9, 30))
+        first = self.add_child("First", date(2024, 1, 15), self.infant)  # 18 months on 2025-07-15
+        second = self.add_child("Second", date(2024, 2, 1), self.infant)  # 18 months on 2025-08-01
+        pending = self.add_child("Pending", date(2023, 12, 1), self.infant)
+        Transition.objects.create(
+            child=pending, next_classroom=self.preschool, transition_date=date(2025, 12, 1), status="Planned"
+        )
+
+        waiting = WaitlistEntry.objects.create(
+            first_name="Waiting", last_name="Planner", date_of_birth=date(2024, 3, 1), program_type="Toddler",
+            desired_start_date=self.TODAY,
+        )
+        match_waitlist(today=self.TODAY)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.matched_start_date, date(2025, 10, 1))
+
+        planned = plan_age_outs(today=self.TODAY, months=12)
+        # Second takes the Toddler B seat the waitlist was matched to
+        waiting.refresh_from_db()
+        self.assertIsNone(waiting.matched_start_date)
+        moves = {
+            transition.child_id: (transition.next_classroom_id, transition.transition_date, transition.age_at_transition)
+            for transition in Transition.objects.filter(id__in=[transition.id for transition in planned])
+        }
+        self.assertEqual(moves, {
+            older.id: (self.preschool.id, date(2025, 7, 1), 30),
+            # Toddler A's seat is free once Older moves up
+            first.id: (self.toddler_a.id, date(2025, 7, 15), 18),
+            # Toddler B has a seat once Leaving's enrollment ends
+            second.id: (self.toddler_b.id, date(2025, 10, 1), 20),
+        })
+        self.assertTrue(all(transition.status == "Planned" for transition in planned))
+        # Bulk-created rows still reach the stored occupancy
+        self.assertEqual(
+            DailyOccupancy.objects.filter(classroom=self.toddler_b, date=date(2025, 10, 1))
+            .values("enrolled", "transitioning_in").get(),
+            {"enrolled": 1, "transitioning_in": 1},
+        )
+        self.assertEqual(
+            DailyOccupancy.objects.filter(classroom=self.toddler_b, date=date(2025, 9, 30))
+            .values("enrolled", "transitioning_in").get(),
+            {"enrolled": 1, "transitioning_in": 0},
+        )
+        # Past the planning window too: Second's enrollment is open-ended
+        self.assertEqual(
+            DailyOccupancy.objects.get(classroom=self.toddler_b, date=date(2026, 12, 1)).transitioning_in, 1
+        )
+        self.assertEqual(plan_age_outs(today=self.TODAY, months=12), [])
+
+    def test_no_seat_no_transition(self):
+        self.add_child("Staying", date(2024, 12, 1), self.toddler_a)
+        self.add_child("Staying too", date(2024, 12, 1), self.toddler_b)
+        self.add_child("Waiting", date(2023, 6, 1), self.infant)
+        self.assertEqual(plan_age_outs(today=self.TODAY, months=12), [])
+
+    def test_large_centre_under_a_second(self):
+        generate_centre(5000, start_year=2025, years=1, today=self.TODAY, billing_months=0)
+        start = perf_counter()
+        with self.assertNumQueries(6):
+            planned = propose_age_outs(today=self.TODAY)
+        elapsed = perf_counter() - start
+        self.assertGreater(len(planned), 0)
+        self.assertEqual(len({transition.child_id for transition in planned}), len(planned))
+        self.assertLess(elapsed, 1)
+
+
+class TestTransitionProcessing(TestCase):
+    def setUp(self):
+        self.family = Family.objects.create(parent_1_name="Processing")
+        self.infant = Classroom.objects.create(classroom_name="Infant", program_type="Infant", max_capacity=10)
+        self.toddler = Classroom.objects.create(classroom_name="Toddler", program_type="Toddler", max_capacity=15)
+
+    def test_moves_child_and_keeps_history(self):
+        child = Child.objects.create(
+            first_name="Moving", last_name="Up", date_of_birth=date(2023, 9, 1), family=self.family,
+            classroom=self.infant, enrollment_start_date=date(2024, 9, 1),
+        )
+        transition = Transition.objects.create(
+            child=child, next_classroom=self.toddler, transition_date=date(2025, 3, 10), status="Planned"
+        )
+        self.assertEqual(process_transitions(date(2025, 3, 9)), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_transitions(date(2025, 3, 15)), 1)
+        self.assertEqual(len([query for query in queries if query["sql"].startswith("UPDATE")]), 3)
+
+        child.refresh_from_db()
+        transition.refresh_from_db()
+        self.assertEqual(child.classroom, self.toddler)
+        self.assertEqual((transition.processed, transition.status), (True, "Completed"))
+        self.assertEqual(transition.previous_classroom, self.infant)
+        # Past rosters still place the child in the room they were in then
+        self.assertEqual([row["id"] for row in classroom_roster(self.infant.id, date(2025, 3, 7))], [child.id])
+        self.assertEqual(classroom_roster(self.toddler.id, date(2025, 3, 7)), [])
+        self.assertEqual([row["id"] for row in classroom_roster(self.toddler.id, date(2025, 3, 10))], [child.id])
+        self.assertEqual(occupancy_counts_on(date(2025, 3, 12))[self.toddler.id]["transitioning_in"], 0)
+        self.assertEqual(process_transitions(date(2025, 3, 15)), 0)
+        # The child may be given their next transition
+        Transition.objects.create(
+            child=child, next_classroom=self.infant, transition_date=date(2025, 9, 1), status="Planned"
+        )
+
+    def test_processing_leaves_occupancy_unchanged(self):
+        generate_centre(300, start_year=2025, years=1, today=date(2025, 3, 1))
+        dates = [date(2024, 12, 2), date(2025, 1, 15), date(2025, 3, 3), date(2025, 6, 2), date(2025, 9, 1)]
+
+        def enrolled():
+            return {key: values["enrolled"] for key, values in compute_daily_occupancy(dates).items()}
+
+        def rosters():
+            return {
+                (classroom_id, day): classroom_roster(classroom_id, day)
+                for classroom_id in Classroom.objects.values_list("id", flat=True)[:5] for day in dates
+            }
+
+        before, before_rosters = enrolled(), rosters()
+        self.assertGreater(process_transitions(date(2025, 6, 1)), 0)
+        self.assertEqual(enrolled(), before)
+        self.assertEqual(rosters(), before_rosters)
+        self.assertFalse(Transition.objects.filter(processed=False, transition_date__lte=date(2025, 6, 1)).exists())
+
+
+class TestEnrollmentSpans(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+        self.family = Family.objects.create(parent_1_name="History")
+        self.infant = Classroom.objects.create(classroom_name="Infant", program_type="Infant", max_capacity=10)
+        self.toddler = Classroom.objects.create(classroom_name="Toddler", program_type="Toddler", max_capacity=15)
+
+    def spans(self, child):
+        return list(
+            EnrollmentSpan.objects.filter(child=child).order_by("start_date")
+            .values_list("classroom_id", "start_date", "end_date")
+        )
+
+    def test_flows_keep_history_current(self):
+        child = Child.objects.create(
+            first_name="Hist", last_name="Ory", date_of_birth=date(2023, 9, 1), family=self.family,
+            classroom=self.infant, enrollment_start_date=date(2024, 9, 1),
+        )
+        self.assertEqual(self.spans(child), [(self.infant.id, date(2024, 9, 1), None)])
+
+        transition = Transition.objects.create(
+            child=child, next_classroom=self.toddler, transition_date=date(2025, 3, 10), status="Planned"
+        )
+        self.assertEqual(self.spans(child), [
+            (self.infant.id, date(2024, 9, 1), date(2025, 3, 9)),
+            (self.toddler.id, date(2025, 3, 10), None),
+        ])
+
+        response = self.client.post("/api/withdrawals/", {
+            "child": child.id, "withdrawal_date": "2025-06-30", "withdrawal_reason": "Moving", "status": "held",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.spans(child)[-1], (self.toddler.id, date(2025, 3, 10), date(2025, 6, 30)))
+
+        # Processing changes where the child is assigned, not where they were
+        process_transitions(date(2025, 3, 15))
+        self.assertEqual(len(self.spans(child)), 2)
+        self.assertEqual(self.spans(child)[0], (self.infant.id, date(2024, 9, 1), date(2025, 3, 9)))
+        self.assertEqual(
+            list(EnrollmentSpan.objects.on(date(2025, 3, 7)).values_list("classroom_id", flat=True)), [self.infant.id]
+        )
+        self.assertEqual(
+            EnrollmentSpan.objects.overlapping(date(2025, 3, 1), date(2025, 3, 31)).filter(classroom=self.toddler).count(), 1
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition.delete()
+        # Without the processed transition the child was always in their assigned room
+        self.assertEqual(self.spans(child), [(self.toddler.id, date(2024, 9, 1), date(2025, 6, 30))])
+
+    def test_backfill_matches_live_rosters(self):
+        generate_centre(300, start_year=2025, years=1, today=date(2025, 3, 1))
+        call_command("backfill_enrollment_spans", stdout=StringIO())
+        day = date(2025, 4, 1)
+        for classroom_id in Classroom.objects.values_list("id", flat=True):
+            live = list(
+                Child.objects.effective_on(day).filter(effective_classroom_id=classroom_id)
+                .order_by("id").values_list("id", flat=True)
+            )
+            self.assertEqual([row["id"] for row in classroom_roster(classroom_id, day)], live)
+        plan = EnrollmentSpan.objects.on(day).filter(classroom_id=1).explain()
+        self.assertIn("span_classroom_dates", plan)
+
+
+class TestWaitlist(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+        # The signals match against the real date
+        self.today = date.today()
+        self.family = Family.objects.create(parent_1_name="Waiting")
+        self.infant = Classroom.objects.create(classroom_name="Infant", program_type="Infant", max_capacity=1)
+        self.toddler = Classroom.objects.create(classroom_name="Toddler", program_type="Toddler", max_capacity=1)
+        self.leaving = Child.objects.create(
+            first_name="Leaving", last_name="Soon", date_of_birth=date(2024, 6, 1), family=self.family,
+            classroom=self.infant, enrollment_start_date=date(2024, 9, 1), enrollment_end_date=self.today + timedelta(days=60),
+        )
+
+    def entry(self, name, program="Infant", desired=None, priority=0):
+        return WaitlistEntry.objects.create(
+            first_name=name, last_name="Waitlist", date_of_birth=date(2024, 10, 1),
+            program_type=program, desired_start_date=desired or self.today + timedelta(days=10), priority=priority,
+        )
+
+    def test_matches_by_priority(self):
+        first = self.entry("Later", priority=0)
+        second = self.entry("Urgent", priority=5)
+        toddler = self.entry("Toddler", program="Toddler", desired=self.today - timedelta(days=30))
+        self.assertEqual(match_waitlist(today=self.today), 3)
+
+        second.refresh_from_db()
+        first.refresh_from_db()
+        toddler.refresh_from_db()
+        # The only infant seat frees the day after Leaving's enrollment ends
+        self.assertEqual((second.matched_classroom, second.matched_start_date), (self.infant, self.today + timedelta(days=61)))
+        self.assertEqual((first.matched_classroom, first.matched_start_date), (None, None))
+        self.assertIsNotNone(first.matched_at)
+        # Never before today, even if wanted earlier
+        self.assertEqual((toddler.matched_classroom, toddler.matched_start_date), (self.toddler, self.today))
+
+        # An offered seat stays taken when the list is matched again
+        second.status = "Offered"
+        second.save()
+        match_waitlist(today=self.today)
+        first.refresh_from_db()
+        self.assertIsNone(first.matched_classroom)
+
+    def test_changes_rematch_affected_programs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            infant = self.entry("Infant")
+            toddler = self.entry("Toddler", program="Toddler")
+        self.assertEqual(WaitlistEntry.objects.get(pk=infant.pk).matched_start_date, self.today + timedelta(days=61))
+        toddler_matched_at = WaitlistEntry.objects.get(pk=toddler.pk).matched_at
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leaving.enrollment_end_date = self.today + timedelta(days=30)
+            self.leaving.save()
+        self.assertEqual(WaitlistEntry.objects.get(pk=infant.pk).matched_start_date, self.today + timedelta(days=31))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.infant.max_capacity = 2
+            self.infant.save()
+        infant.refresh_from_db()
+        self.assertEqual(infant.matched_start_date, infant.desired_start_date)
+        # The toddler program was never touched
+        self.assertEqual(WaitlistEntry.objects.get(pk=toddler.pk).matched_at, toddler_matched_at)
+
+    def test_list_reads_stored_matches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(3):
+                self.entry(f"Entry{n}", priority=n)
+        matched_at = set(WaitlistEntry.objects.values_list("matched_at", flat=True))
+        counts = []
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/waitlist/?program_type=Infant")
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.entry("More", program="Toddler")
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual([row["first_name"] for row in response.data["results"]], ["Entry2", "Entry1", "Entry0"])
+        self.assertEqual(response.data["results"][0]["matched_classroom_name"], "Infant")
+        self.assertEqual(
+            set(WaitlistEntry.objects.filter(program_type="Infant").values_list("matched_at", flat=True)), matched_at
+        )
+
+    def test_command(self):
+        self.entry("Command")
+        out = StringIO()
+        call_command("match_waitlist", "--program", "Infant", stdout=out)
+        self.assertIn("Matched 1 waitlist entries", out.getvalue())
+
+
+class TestFundingReconciliation(TestCase):
+    def setUp(self):
+        build_calendar(2025, 2025)
+        call_command("populate_subsidy_rates", stdout=StringIO())
+        family = Family.objects.create(parent_1_name="Test Parent")
+        infant = Classroom.objects.create(classroom_name="Infant", program_type="Infant", max_capacity=10)
+        for name in ("Ann", "Ben"):
+            Child.objects.create(
+                first_name=name, last_name="Funding", date_of_birth=date(2024, 1, 1),
+                enrollment_start_date=date(2025, 3, 1), enrollment_end_date=date(2025, 3, 31),
+                classroom=infant, family=family,
+            )
+        run_billing(2025, 3)
+        GovernmentFunding.objects.bulk_create([
+            GovernmentFunding(funding_source="Province", stream="CWELCCA", amount_received=Decimal("3000"),
+                              date_received=date(2025, 3, 15)),
+            GovernmentFunding(funding_source="City", stream="Wage Enhancement", amount_received=Decimal("500"),
+                              date_received=date(2025, 3, 20)),
+        ])
+
+    def test_variances_are_stored(self):
+        call_command("reconcile_funding", stdout=StringIO())
+        subsidy = FundingReconciliation.objects.get(stream="CWELCCA", period_start=date(2025, 3, 1))
+        # 2 children x 21 open days x $88.19
+        self.assertEqual(subsidy.subsidy_invoiced, Decimal("3703.98"))
+        self.assertEqual(subsidy.subsidy_from_occupancy, Decimal("3703.98"))
+        self.assertEqual(subsidy.variance, Decimal("-703.98"))
+        self.assertEqual(subsidy.period_end, date(2025, 3, 31))
+        other = FundingReconciliation.objects.get(stream="Wage Enhancement")
+        self.assertEqual((other.subsidy_invoiced, other.variance), (Decimal("0"), Decimal("500")))
+        self.assertEqual(GovernmentFunding.objects.get(stream="CWELCCA").remaining_amount, Decimal("0"))
+
+    def test_endpoint_reads_stored_rows(self):
+        call_command("reconcile_funding", stdout=StringIO())
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+        with self.assertNumQueries(2):  # Page count and page
+            response = client.get("/api/reports/funding-reconciliation/", {"stream": "CWELCCA"})
+        rows = response.json()["results"]
+        self.assertEqual([row["variance"] for row in rows], ["-703.98"])
+
+    def test_new_receipt_reconciles_its_month(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            GovernmentFunding.objects.create(
+                funding_source="Province", stream="CWELCCA", amount_received=Decimal("4000"),
+                date_received=date(2025, 4, 10),
+            )
+        april = FundingReconciliation.objects.get(period_start=date(2025, 4, 1))
+        self.assertEqual((april.funding_received, april.variance), (Decimal("4000"), Decimal("4000")))
+        # March was reconciled by the billing run, before its receipts
+        march = FundingReconciliation.objects.get(period_start=date(2025, 3, 1))
+        self.assertEqual((march.funding_received, march.subsidy_invoiced), (Decimal("0"), Decimal("3703.98")))
+        # Older receipts are drawn down first
+        self.assertEqual(
+            GovernmentFunding.objects.get(date_received=date(2025, 4, 10)).remaining_amount, Decimal("3296.02")
+        )
+
+    def test_adjustments_reconcile_their_month(self):
+        ann = Child.objects.get(first_name="Ann")
+        Child.objects.filter(pk=ann.pk).update(enrollment_end_date=date(2025, 3, 14))
+        recalculate_invoices([ann.pk], date(2025, 3, 15), date(2025, 3, 31), today=date(2025, 4, 1))
+        march = FundingReconciliation.objects.get(stream="CWELCCA", period_start=date(2025, 3, 1))
+        # Ann is billed 10 open days instead of 21
+        self.assertEqual(march.subsidy_invoiced, Decimal("2733.89"))
+
+
+class TestCsvExports(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+        generate_centre(300, start_year=2025, years=1, today=date(2025, 3, 1), billing_months=3)
+
+    def export(self, path, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        return response, lines, len(queries)
+
+    def test_invoices_stream_every_row(self):
+        response, lines, queries = self.export("/api/invoices/export/")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(lines[0].split(",")[:3], ["id", "date_issued", "due_date"])
+        self.assertEqual(len(lines) - 1, Invoice.objects.count())
+        self.assertEqual(queries, 1)
+
+    def test_filters_match_list_views(self):
+        listed = self.client.get("/api/payments/", {"search": "Cheque", "count": "true"}).json()["count"]
+        _, lines, _ = self.export("/api/payments/export/", {"search": "Cheque"})
+        self.assertEqual(len(lines) - 1, listed)
+        self.assertLess(listed, Payment.objects.count())
+
+        _, lines, _ = self.export("/api/attendance/export/")
+        self.assertEqual(lines, ["id,date,classroom_id,classroom__classroom_name,notes"])
+
+    def test_exports_are_read_only(self):
+        self.assertEqual(self.client.post("/api/invoices/export/", {}).status_code, 405)
+
+    def test_formulas_are_exported_as_text(self):
+        payment = Payment.objects.order_by("id").first()
+        for notes in ("=HYPERLINK(\"http://x\")", "+1", "-1", "@SUM(A1)", "\tcmd", "\rcmd"):
+            Payment.objects.filter(pk=payment.pk).update(notes=notes, amount_paid=Decimal("-5.00"))
+            response = self.client.get("/api/payments/export/", {"search": payment.method})
+            content = b"".join(response.streaming_content).decode()
+            row = next(row for row in csv.reader(StringIO(content, newline="")) if row[0] == str(payment.id))
+            self.assertEqual(row[-1], "'" + notes)
+            # Numbers are not text cells and keep their sign
+            self.assertEqual(row[4], "-5.00")
+
+
+class TestKeysetPagination(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office"))
+        cache.clear()
+        generate_centre(1200, start_year=2025, years=1, today=date(2025, 3, 1))
+
+    def walk(self, url, direction="next"):
+        ids, queries_per_page = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            queries_per_page.append(len(queries))
+            self.assertNotIn("count", data)
+            page = [row["id"] for row in data["results"]]
+            ids = ids + page if direction == "next" else page + ids
+            url = data[direction]
+            self.last = data
+        return ids, queries_per_page
+
+    def test_walks_every_row_once(self):
+        ids, queries_per_page = self.walk("/api/children/?page_size=500")
+        self.assertEqual(ids, sorted(Child.objects.values_list("id", flat=True)))
+        self.assertEqual(len(queries_per_page), 3)
+        # The last page costs the same as the first: no OFFSET and no COUNT
+        self.assertEqual(len(set(queries_per_page)), 1)
+
+        # Families share names: pages are keyed on (parent_1_name, id), so no
+        # family is skipped or repeated, in either direction
+        Family.objects.bulk_create(Family(parent_1_name="Smith") for _ in range(150))
+        by_name = list(Family.objects.order_by("parent_1_name", "id").values_list("id", flat=True))
+        ids, queries_per_page = self.walk("/api/families/?ordering=parent_1_name&page_size=40")
+        self.assertEqual(ids, by_name)
+        self.assertEqual(len(set(queries_per_page)), 1)
+        last_page = len(self.last["results"])
+        self.assertEqual(self.walk(self.last["previous"], "previous")[0], by_name[:-last_page])
+        ids, _ = self.walk("/api/families/?ordering=-parent_1_name&page_size=40")
+        self.assertEqual(ids, by_name[::-1])
+        # The default ordering is the name too
+        self.assertEqual(self.walk("/api/families/")[0], by_name)
+
+    def test_page_size_is_bounded_and_count_optional(self):
+        data = self.client.get("/api/invoices/", {"page_size": 5000, "count": "true"}).json()
+        self.assertEqual(len(data["results"]), 1000)
+        self.assertEqual(data["count"], Invoice.objects.count())
+        self.assertEqual(len(self.client.get("/api/families/").json()["results"]), 100)
+        for path in ("/api/payments/", "/api/attendance/", "/api/transitions/"):
+            self.assertIn("next", self.client.get(path).json())
+
+
+class TestHotPathIndexes(TestCase):
+    # PostgreSQL only picks an index when it beats scanning the table, which a
+    # small test table rarely does, so sequential scans are turned off there
+    def setUp(self):
+        generate_centre(300, start_year=2025, years=1, today=date(2025, 3, 1))
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f"{index} not used:\n{plan}")
+
+    def test_occupancy_queries(self):
+        # The querysets the roster, occupancy and transition code build on
+        day = date(2025, 3, 3)
+        self.assertUsesIndex(Child.objects.active_on(day), "child_enrollment_dates")
+        # The effective classroom's correlated transition lookups
+        self.assertUsesIndex(Child.objects.effective_on(day), "transition_child_date")
+        self.assertUsesIndex(
+            Transition.objects.filter(processed=False, transition_date__lte=day), "transition_pending_date"
+        )
+
+    def test_billing_queries(self):
+        family = Family.objects.order_by("id").first()
+        self.assertUsesIndex(Invoice.objects.filter(family=family).order_by("due_date"), "invoice_family_due")
+        self.assertUsesIndex(
+            Invoice.objects.filter(payment_status="Unpaid", due_date__lt=date(2025, 3, 1)), "invoice_status_due"
+        )
+        self.assertUsesIndex(
+            Invoice.objects.filter(billing_period_start=date(2025, 3, 1), adjusts__isnull=True)
+            .values_list("child_id", flat=True),
+            "invoice_billing_run",
+        )
+        self.assertUsesIndex(Payment.objects.filter(payment_date__gte=date(2025, 3, 1)), "payment_date")
+
+
+# Benchmark and regression suite for the API: every route in core/urls.py is
+# requested against synthetic centres of increasing size, and the number of
+# queries must not grow with the data. Runs offline with
+#
+#     DB_ENGINE=sqlite python -m pytest core/tests.py -k QueryCountRegression -s
+#
+# Set BENCHMARK_REPORT=<path> to also write the measurements as JSON.
+
+CENTRE_SIZES = (10, 100, 1000)
+CALENDAR_START = date(2025, 1, 1)
+TODAY = date.today()
+PASSWORD = "benchmark-password"
+
+
+def seed_centre(children):
+    """Bulk-create a centre with ``children`` children and a year of Calendar rows."""
+    generate_centre(children, start_year=CALENDAR_START.year, years=1, seed=children, today=TODAY, ledger=True)
+    # The withdrawal routes only list upcoming withdrawals
+    child = Child.objects.filter(withdrawal__isnull=True).order_by("id").first()
+    Withdrawal.objects.bulk_create([
+        Withdrawal(child=child, withdrawal_date=TODAY + timedelta(days=30), withdrawal_reason="Moving", status="held")
+    ])
+    Attendance.objects.bulk_create(
+        Attendance(classroom=classroom, date=CALENDAR_START) for classroom in Classroom.objects.all()
+    )
+    refresh_daily_occupancy()
+    WaitlistEntry.objects.bulk_create(
+        WaitlistEntry(
+            first_name=f"Waiting{n}", last_name="Child", date_of_birth=date(2024, 1, 1),
+            program_type=("Infant", "Toddler", "Preschool")[n % 3], desired_start_date=TODAY, priority=n % 4,
+        )
+        for n in range(max(children // 10, 1))
+    )
+    match_waitlist()
+
+
+def centre_requests():
+    """Yield (name, method, path, payload) for every route in core/urls.py."""
+    classroom = Classroom.objects.order_by("id").first()
+    family = Family.objects.order_by("id").first()
+    child = Child.objects.order_by("id").first()
+    day = (CALENDAR_START + timedelta(days=61)).isoformat()  # Monday 2025-03-03
+
+    yield "upcoming_enrollments", "get", "/upcoming_enrollments/", None
+    yield "classroom-attendance-stats", "get", f"/api/classroom-attendance-stats?date={day}", None
+    yield "classrooms_for_date", "get", f"/api/classrooms-for-date?date={day}", None
+    yield "classroom_attendance", "get", f"/api/classroom-attendance?classroom_id={classroom.id}&date={day}", None
+    yield "get_classrooms", "get", "/api/classrooms", None
+    yield "calendar_stats", "get", "/api/enrollment/stats/", None
+    yield "calendar_stats (classroom)", "get", f"/api/enrollment/stats/?classroom_id={classroom.id}", None
+    yield "router root", "get", "/api/", None
+    yield "transition-list", "get", "/api/transitions/", None
+    yield "transition-list (future)", "get", "/api/transitions/?future_only=true", None
+    yield "transition-detail", "get", f"/api/transitions/{Transition.objects.order_by('id').first().id}/", None
+    yield "withdrawal-list", "get", "/api/withdrawals/", None
+    yield "withdrawal-detail", "get", (
+        f"/api/withdrawals/{Withdrawal.objects.filter(withdrawal_date__gte=TODAY).order_by('id').first().id}/"
+    ), None
+    yield "family-list-create", "get", "/api/families/", None
+    yield "family-detail", "get", f"/api/families/{family.id}/", None
+    yield "family-balance", "get", f"/api/families/{family.id}/balance/", None
+    yield "family-statement", "get", f"/api/families/{family.id}/statement/?start=2025-01-01&end=2025-12-31", None
+    yield "family-aging", "get", f"/api/families/{family.id}/aging/", None
+    yield "ar-aging-report", "get", "/api/reports/ar-aging/", None
+    yield "capacity-forecast", "get", f"/api/reports/capacity-forecast/?start={day}&months=24", None
+    yield "funding-reconciliation", "get", "/api/reports/funding-reconciliation/", None
+    yield "waitlist-list", "get", "/api/waitlist/", None
+    yield "waitlist-detail", "get", f"/api/waitlist/{WaitlistEntry.objects.order_by('id').first().id}/", None
+    yield "child-list-create", "get", "/api/children/", None
+    yield "child-detail", "get", f"/api/children/{child.id}/", None
+    yield "classroom-list-create", "get", "/api/classrooms/", None
+    yield "classroom-detail", "get", f"/api/classrooms/{classroom.id}/", None
+    yield "children-list", "get", "/api/children-list/", None
+    yield "children-dropdown-list", "get", "/children/dropdown/", None
+    yield "classrooms_list", "get", "/classrooms-list/", None
+    yield "families_list", "get", "/families-list/", None
+    yield "attendance-list-create", "get", "/api/attendance/", None
+    yield "attendance-detail", "get", f"/api/attendance/{Attendance.objects.order_by('id').first().id}/", None
+    yield "payment-list-create", "get", "/api/payments/", None
+    yield "payment-detail", "get", f"/api/payments/{Payment.objects.order_by('id').first().id}/", None
+    yield "invoice-list-create", "get", "/api/invoices/", None
+    yield "invoice-detail", "get", f"/api/invoices/{Invoice.objects.order_by('id').first().id}/", None
+    yield "attendance-export", "get", "/api/attendance/export/", None
+    yield "payment-export", "get", "/api/payments/export/", None
+    yield "invoice-export", "get", "/api/invoices/export/", None
+    yield "government-funding-list-create", "get", "/api/government-funding/", None
+    yield "government-funding-detail", "get", (
+        f"/api/government-funding/{GovernmentFunding.objects.order_by('id').first().id}/"
+    ), None
+    yield "add_child", "post", "/api/add-child/", {
+        "first_name": "New", "last_name": "Child", "date_of_birth": "2024-01-01",
+        "enrollment_start_date": day, "classroom": classroom.id, "family": family.id,
+    }
+    yield "token_obtain_pair", "post", "/api/token/", {"username": "office", "password": PASSWORD}
+    yield "token_refresh", "post", "/api/token/refresh/", "refresh"
+    yield "schema-swagger-ui", "get", "/api/docs/?format=openapi", None
+
+
+class TestQueryCountRegression(TestCase):
+    results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if not cls.results:
+            return
+        sizes = sorted(cls.results)
+        lines = ["", "Route".ljust(34) + "".join(f"{size:>10} q {'ms':>7}" for size in sizes)]
+        for name in cls.results[sizes[0]]:
+            lines.append(name.ljust(34) + "".join(
+                f"{cls.results[size][name]['queries']:>12} {cls.results[size][name]['ms']:>7.1f}" for size in sizes
+            ))
+        sys.stdout.write("\n".join(lines) + "\n")
+        report = os.environ.get("BENCHMARK_REPORT")
+        if report:
+            with open(report, "w") as handle:
+                json.dump(cls.results, handle, indent=2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("office", password=PASSWORD))
+
+    def measure(self, size):
+        measurements = {}
+        refresh_token = None
+        for name, method, path, payload in centre_requests():
+            if payload == "refresh":
+                payload = {"refresh": refresh_token}
+            cache.clear()  # Keep the throttles out of the measurements
+            start = perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(path, payload, format="json")
+                # Exports run their query while the body streams
+                body = b"".join(response.streaming_content) if response.streaming else response.content
+            elapsed = perf_counter() - start
+            self.assertLess(response.status_code, 400, f"{name} at {size} children: {body[:200]}")
+            if name == "token_obtain_pair":
+                refresh_token = response.json()["refresh"]
+            measurements[name] = {"queries": len(queries), "ms": elapsed * 1000}
+        return measurements
+
+    def test_query_counts_do_not_grow_with_centre_size(self):
+        for size in CENTRE_SIZES:
+            # Each centre is built in a savepoint and rolled back afterwards
+            with transaction.atomic():
+                seed_centre(size)
+                self.results[size] = self.measure(size)
+                transaction.set_rollback(True)
+
+        baseline = self.results[CENTRE_SIZES[0]]
+        for size in CENTRE_SIZES[1:]:
+            for name, measurement in self.results[size].items():
+                with self.subTest(route=name, children=size):
+                    self.assertEqual(measurement["queries"], baseline[name]["queries"])
@@ -0,0 +1,152 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Min, OuterRef, Subquery
+
+from core.billing import recalculate_invoices
+from core.forecast import ClassroomSeats, add_months
+from core.models import Child, Classroom, Transition, Withdrawal
+from core.occupancy import rebuild_enrollment_spans, refresh_daily_occupancy
+from core.waitlist import match_waitlist
+
+# Program a child ages out of: (next program, age in months at which they move)
+AGE_OUT = {
+    'Infant': ('Toddler', 18),
+    'Toddler': ('Preschool', 30),
+}
+
+
+def age_in_months(date_of_birth, day):
+    # Same arithmetic as the transition serializer and roster
+    return (day.year - date_of_birth.year) * 12 + day.month - date_of_birth.month
+
+
+def _programs(classroom_ids):
+    # Program types whose waitlist matches a change to these rooms affects
+    return set(Classroom.objects.filter(id__in=classroom_ids).values_list('program_type', flat=True))
+
+
+def propose_age_outs(today=None, months=24):
+    """Unsaved Planned transitions for every child due to age out of their program.
+
+    Looks ``months`` months ahead of ``today``. A child is due on the day
+    they reach the AGE_OUT age for their current program and moves on the
+    first day from then on that a room of the next program has a seat free
+    for the rest of their enrollment. Children are placed oldest first
+    against one seat timeline per room, which is updated as each move frees
+    a seat in one room and takes one in another. Children who already have
+    an unprocessed transition, or who leave before a seat opens, are
+    skipped.
+    """
+    today = today or date.today()
+    last = add_months(today, months) - timedelta(days=1)
+    seats = ClassroomSeats(today, last)
+    withdrawn = dict(
+        Withdrawal.objects.filter(withdrawal_date__lte=last).values('child_id')
+        .annotate(first_withdrawal=Min('withdrawal_date')).values_list('child_id', 'first_withdrawal')
+    )
+
+    children = (
+        Child.objects.filter(enrollment_start_date__lte=last)
+        .exclude(enrollment_end_date__lt=today)
+        .exclude(transitions__processed=False)
+        .with_effective_classroom(today)
+    )
+    due = []
+    for child_id, date_of_birth, start, end, classroom_id in children.values_list(
+        'id', 'date_of_birth', 'enrollment_start_date', 'enrollment_end_date', 'effective_classroom_id'
+    ):
+        program = seats.programs.get(classroom_id)
+        if program not in AGE_OUT:
+            continue
+        next_program, age = AGE_OUT[program]
+        leaves = min(end or last, withdrawn.get(child_id, last), last)
+        due_on = max(add_months(date_of_birth, age), start, today)
+        if due_on <= leaves:
+            due.append((due_on, date_of_birth, child_id, classroom_id, next_program, leaves))
+    due.sort()
+
+    planned = []
+    for due_on, date_of_birth, child_id, classroom_id, next_program, leaves in due:
+        best = seats.earliest(next_program, due_on, leaves)
+        if best is None:
+            continue
+        day, room = best
+        seats.add(room, day, leaves, -1)
+        seats.add(classroom_id, day, leaves, 1)
+        planned.append(Transition(
+            child_id=child_id,
+            next_classroom_id=room,
+            transition_date=day,
+            age_at_transition=age_in_months(date_of_birth, day),
+            status='Planned',
+            notes=f"Age-out: {seats.programs[classroom_id]} to {next_program}",
+        ))
+
+    return planned
+
+
+def plan_age_outs(today=None, months=24):
+    """Create the transitions proposed by propose_age_outs(). Returns them."""
+    planned = propose_age_outs(today, months)
+    if not planned:
+        return []
+    with transaction.atomic():
+        planned = Transition.objects.bulk_create(planned, batch_size=1000)
+        # Bulk inserts bypass the signals: refresh occupancy for the rooms
+        # children leave and join, the children's enrollment history, and
+        # re-price invoices already issued. A move lasts until the child's
+        # enrollment ends, so occupancy is refreshed up to the latest end
+        # (open-ended enrollments to the end of the calendar).
+        first = min(transition.transition_date for transition in planned)
+        rooms = {transition.next_classroom_id for transition in planned}
+        ends = set()
+        for classroom_id, end in Child.objects.filter(
+            id__in=[transition.child_id for transition in planned]
+        ).values_list('classroom_id', 'enrollment_end_date'):
+            rooms.add(classroom_id)
+            ends.add(end)
+        refresh_daily_occupancy(first, None if None in ends else max(ends), rooms)
+        rebuild_enrollment_spans([transition.child_id for transition in planned])
+        recalculate_invoices([transition.child_id for transition in planned], first)
+        match_waitlist(_programs(rooms), today)
+    return planned
+
+
+def process_transitions(today=None):
+    """Apply every unprocessed transition dated on or before ``today``.
+
+    Each child moves to the transition's next classroom, and the transition
+    records the room they left and is marked processed and Completed. It is
+    three bulk UPDATEs in one transaction, however many transitions are due.
+    Rosters then only consult unprocessed transitions, and past dates are
+    resolved through previous_classroom. Returns the number processed.
+    """
+    today = today or date.today()
+    with transaction.atomic():
+        ids = list(
+            Transition.objects.filter(processed=False, transition_date__lte=today)
+            .select_for_update().values_list('id', flat=True)
+        )
+        if not ids:
+            return 0
+        due = Transition.objects.filter(id__in=ids)
+        due.update(previous_classroom_id=Subquery(
+            Child.objects.filter(pk=OuterRef('child_id')).values('classroom_id')[:1]
+        ))
+        Child.objects.filter(id__in=due.values('child_id')).update(classroom_id=Subquery(
+            due.filter(child_id=OuterRef('pk')).values('next_classroom_id')[:1]
+        ))
+        due.update(processed=True, status='Completed')
+
+        # Bulk updates bypass the signals. Occupancy from the first move on
+        # no longer counts these children as transitioning.
+        rooms, first = set(), today
+        for previous_id, next_id, transition_date in due.values_list(
+            'previous_classroom_id', 'next_classroom_id', 'transition_date'
+        ):
+            rooms.update((previous_id, next_id))
+            first = min(first, transition_date)
+        refresh_daily_occupancy(first, None, rooms - {None})
+        match_waitlist(_programs(rooms - {None}), today)
+    return len(ids)
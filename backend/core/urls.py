@@ -15,9 +15,15 @@ from core.views import (
     WithdrawalViewSet,
     ChildrenDropdownListView,
     TransitionViewSet,
+    WaitlistEntryViewSet,
     AddChildView,
     FamilyListCreateView,
     FamilyRetrieveUpdateDestroyView,
+    family_balance,
+    family_statement,
+    family_aging,
+    ar_aging_report,
+    capacity_forecast_report,
     ChildListCreateView,
     ChildRetrieveUpdateDestroyView,
     ClassroomListCreateView,
@@ -28,8 +34,12 @@ from core.views import (
     PaymentRetrieveUpdateDestroyView,
     InvoiceListCreateView,
     InvoiceRetrieveUpdateDestroyView,
+    AttendanceExportView,
+    PaymentExportView,
+    InvoiceExportView,
     GovernmentFundingListCreateView,
     GovernmentFundingRetrieveUpdateDestroyView,
+    FundingReconciliationListView,
 )
 
 schema_view = get_schema_view(
@@ -45,6 +55,7 @@ schema_view = get_schema_view(
 router = DefaultRouter()
 router.register(r'transitions', TransitionViewSet, basename='transition')
 router.register(r'withdrawals', WithdrawalViewSet)
+router.register(r'waitlist', WaitlistEntryViewSet, basename='waitlist')
 
 urlpatterns = [
     path('upcoming_enrollments/', upcoming_enrollments, name='upcoming_enrollments'),    
@@ -57,6 +68,12 @@ urlpatterns = [
     path('api/add-child/', AddChildView.as_view(), name='add_child'),
     path('api/families/', FamilyListCreateView.as_view(), name='family-list-create'),
     path('api/families/<int:pk>/', FamilyRetrieveUpdateDestroyView.as_view(), name='family-detail'),
+    path('api/families/<int:pk>/balance/', family_balance, name='family-balance'),
+    path('api/families/<int:pk>/statement/', family_statement, name='family-statement'),
+    path('api/families/<int:pk>/aging/', family_aging, name='family-aging'),
+    path('api/reports/ar-aging/', ar_aging_report, name='ar-aging-report'),
+    path('api/reports/capacity-forecast/', capacity_forecast_report, name='capacity-forecast'),
+    path('api/reports/funding-reconciliation/', FundingReconciliationListView.as_view(), name='funding-reconciliation'),
     path('api/children/', ChildListCreateView.as_view(), name='child-list-create'),
     path('api/children/<int:pk>/', ChildRetrieveUpdateDestroyView.as_view(), name='child-detail'),
     path('api/children/', AddChildView.as_view(), name='add_child'),
@@ -68,10 +85,13 @@ urlpatterns = [
     path('families-list/', FamiliesListView.as_view(), name='families_list'),
     path('api/attendance/', AttendanceListCreateView.as_view(), name='attendance-list-create'),
     path('api/attendance/<int:pk>/', AttendanceRetrieveUpdateDestroyView.as_view(), name='attendance-detail'),
+    path('api/attendance/export/', AttendanceExportView.as_view(), name='attendance-export'),
     path('api/payments/', PaymentListCreateView.as_view(), name='payment-list-create'),
     path('api/payments/<int:pk>/', PaymentRetrieveUpdateDestroyView.as_view(), name='payment-detail'),
+    path('api/payments/export/', PaymentExportView.as_view(), name='payment-export'),
     path('api/invoices/', InvoiceListCreateView.as_view(), name='invoice-list-create'),
     path('api/invoices/<int:pk>/', InvoiceRetrieveUpdateDestroyView.as_view(), name='invoice-detail'),
+    path('api/invoices/export/', InvoiceExportView.as_view(), name='invoice-export'),
     path('api/government-funding/', GovernmentFundingListCreateView.as_view(), name='government-funding-list-create'),
     path('api/government-funding/<int:pk>/', GovernmentFundingRetrieveUpdateDestroyView.as_view(), name='government-funding-detail'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
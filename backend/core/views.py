@@ -1,24 +1,30 @@
-from django.http import JsonResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics
 from rest_framework.generics import ListAPIView
 from rest_framework.filters import SearchFilter
 from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
-from core.models import Calendar, Withdrawal, Transition, Family, Child, Classroom, Attendance, Payment, Invoice, GovernmentFunding, AlternativeCapacity
-from core.serializers import WithdrawalSerializer, ChildDropdownSerializer, TransitionSerializer, ChildListSerializer, FamilySerializer, ChildSerializer, ClassroomSerializer, AttendanceSerializer, PaymentSerializer, InvoiceSerializer, GovernmentFundingSerializer, AlternativeCapacitySerializer
+from core.models import Withdrawal, Transition, Family, Child, Classroom, Attendance, Payment, Invoice, GovernmentFunding, AlternativeCapacity, FamilyBalance, FundingReconciliation, WaitlistEntry
+from core import ledger
+from core.calendar_service import STAT_HOLIDAY, WEEKDAY, get_calendar
+from core.exports import CsvExportMixin
+from core.forecast import capacity_forecast
+from core.pagination import KeysetPagination
+from core.occupancy import classroom_roster, occupancy_by_date, occupancy_for_date
+from core.reports import ar_aging
+from core.serializers import WithdrawalSerializer, ChildDropdownSerializer, TransitionSerializer, ChildListSerializer, FamilySerializer, ChildSerializer, ClassroomSerializer, AttendanceSerializer, PaymentSerializer, InvoiceSerializer, GovernmentFundingSerializer, AlternativeCapacitySerializer, FamilyBalanceSerializer, FamilyStatementSerializer, FamilyAgingSerializer, ArAgingReportSerializer, CapacityForecastSerializer, FundingReconciliationSerializer, WaitlistEntrySerializer
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q, Exists, OuterRef
+from django.db.models import F, OuterRef, Value
+from django.db.models.functions import Concat, ExtractMonth, ExtractYear
 from datetime import datetime
 from .serializers import ChildSerializer, FamilySerializer
 from django.shortcuts import get_object_or_404
-from datetime import date, timedelta
+from datetime import date
 from django.utils.timezone import now
-from rest_framework.pagination import PageNumberPagination
 
 @api_view(['GET'])
 def upcoming_enrollments(request):
@@ -26,10 +32,12 @@ def upcoming_enrollments(request):
     today = date.today()
     print(f"Fetching upcoming enrollments from {today}")  # Debug statement
 
-    # Query for children with future enrollment start dates
+    # Query for children with future enrollment start dates, placed in the
+    # classroom they will be in on their first day
     upcoming_enrollments = Child.objects.filter(
         enrollment_start_date__gte=today
-    ).order_by('enrollment_start_date')  # Order by enrollment date ascending
+    ).with_effective_classroom(OuterRef('enrollment_start_date')).order_by('enrollment_start_date')  # Order by enrollment date ascending
+    classroom_names = dict(Classroom.objects.values_list('id', 'classroom_name'))
 
     # Build the response data
     data = []
@@ -38,7 +46,7 @@ def upcoming_enrollments(request):
             "enrollment_start_date": child.enrollment_start_date,
             "child_name": f"{child.first_name} {child.last_name}",
             "date_of_birth": child.date_of_birth,
-            "classroom_name": child.classroom.classroom_name if child.classroom else "N/A",
+            "classroom_name": classroom_names.get(child.effective_classroom_id, "N/A"),
             "allergy_info": child.allergy_info,
             "notes": child.notes,
         })
@@ -61,67 +69,35 @@ def classroom_attendance(request):
     except ValueError:
         return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
 
-    try:
-        from core.models import Calendar  # Ensure Calendar is imported
-        calendar_entry = Calendar.objects.get(date=date)
+    flags = get_calendar().flags_for(date)
+    if flags is None:
+        return Response({"error": "Calendar data not found for the given date."}, status=404)
 
-        # Check if the date is a weekday and not a stat holiday
-        if not calendar_entry.is_weekday:
-            return Response({"error": "Attendance is not calculated for weekends."}, status=400)
+    # Check if the date is a weekday and not a stat holiday
+    if not flags & WEEKDAY:
+        return Response({"error": "Attendance is not calculated for weekends."}, status=400)
 
-        if calendar_entry.is_stat_holiday:
-            return Response({"error": "Attendance is not calculated for stat holidays."}, status=400)
-
-    except Calendar.DoesNotExist:
-        return Response({"error": "Calendar data not found for the given date."}, status=404)
+    if flags & STAT_HOLIDAY:
+        return Response({"error": "Attendance is not calculated for stat holidays."}, status=400)
 
     try:
         classroom = Classroom.objects.get(id=classroom_id)
     except Classroom.DoesNotExist:
         return Response({"error": "Classroom not found."}, status=404)
 
-    # Fetch children directly enrolled in the classroom
-    enrolled_children = Child.objects.filter(
-        classroom=classroom,
-        enrollment_start_date__lte=date
-    ).exclude(
-        enrollment_end_date__lt=date
-    )
-
-    # Fetch children transitioning into the classroom
-    transitioning_in = Transition.objects.filter(
-        next_classroom=classroom,
-        transition_date__lte=date
-    ).exclude(
-        child__enrollment_end_date__lt=date
-    ).select_related('child')
-
-    # Exclude children transitioning out of the classroom
-    transitioning_out = Transition.objects.filter(
-        child__classroom=classroom,
-        transition_date__lte=date
-    ).exclude(
-        next_classroom=classroom
-    ).select_related('child')
-
-    # Prepare the final list of children
-    final_children = list(enrolled_children)
-    final_children += [t.child for t in transitioning_in]
-    final_children = [
-        child for child in final_children if child not in [t.child for t in transitioning_out]
-    ]
+    final_children = classroom_roster(classroom.id, date)
 
     # Format the response data
     data = []
     for child in final_children:
         age_in_months = (
-            (date.year - child.date_of_birth.year) * 12 +
-            (date.month - child.date_of_birth.month)
+            (date.year - child['date_of_birth'].year) * 12 +
+            (date.month - child['date_of_birth'].month)
         )
         data.append({
-            "id": child.id,
-            "name": f"{child.first_name} {child.last_name}",
-            "date_of_birth": child.date_of_birth,
+            "id": child['id'],
+            "name": f"{child['first_name']} {child['last_name']}",
+            "date_of_birth": child['date_of_birth'],
             "age_in_months": age_in_months,
         })
 
@@ -141,33 +117,16 @@ def classroom_attendance_stats(request):
     except ValueError:
         return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
 
-    # Fetch all classrooms
-    classrooms = Classroom.objects.all()
-    stats = []
-
-    for classroom in classrooms:
-        # Children directly enrolled in the classroom
-        children = Child.objects.filter(
-            Q(enrollment_end_date__isnull=True) | Q(enrollment_end_date__gte=date),
-            enrollment_start_date__lte=date,
-            classroom=classroom
-        )
-
-        # Children transitioning into the classroom on this date
-        transitioning_in = Transition.objects.filter(
-            next_classroom=classroom,
-            transition_date__lte=date
-        ).exclude(
-            child__enrollment_end_date__lt=date  # Exclude children no longer active
-        )
-
-        total_enrolled = len(children) + transitioning_in.count()
-        stats.append({
-            "classroom_id": classroom.id,
-            "classroom_name": classroom.classroom_name,
-            "total_enrolled": total_enrolled,
-            "total_capacity": classroom.max_capacity,
-        })
+    # Children in each classroom after transitions, read from the daily occupancy table
+    stats = [
+        {
+            "classroom_id": room["classroom_id"],
+            "classroom_name": room["classroom_name"],
+            "total_enrolled": room["enrolled"],
+            "total_capacity": room["capacity"],
+        }
+        for room in occupancy_for_date(date)
+    ]
 
     return Response(stats)
 
@@ -187,21 +146,15 @@ def classrooms_for_date(request):
         return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
 
     # Fetch classrooms and their stats for the specified date
-    classrooms = Classroom.objects.all()
-    data = []
-    for classroom in classrooms:
-        total_enrolled = Child.objects.filter(
-            Q(enrollment_end_date__isnull=True) | Q(enrollment_end_date__gte=date),
-            enrollment_start_date__lte=date,
-            classroom=classroom
-        ).count()
-
-        data.append({
-            "id": classroom.id,
-            "classroom_name": classroom.classroom_name,
-            "total_enrolled": total_enrolled,
-            "total_capacity": classroom.max_capacity,
-        })
+    data = [
+        {
+            "id": room["classroom_id"],
+            "classroom_name": room["classroom_name"],
+            "total_enrolled": room["enrolled"],
+            "total_capacity": room["capacity"],
+        }
+        for room in occupancy_for_date(date)
+    ]
 
     return Response(data)
 
@@ -210,50 +163,32 @@ def classrooms_for_date(request):
 def calendar_stats(request):
     # Get parameters from the request
     classroom_id = request.GET.get('classroom_id', None)
-    open_dates = Calendar.objects.values('date', 'is_weekday', 'is_stat_holiday')
-
-    stats = []
+    open_dates = [
+        {'date': day, 'is_weekday': bool(flags & WEEKDAY), 'is_stat_holiday': bool(flags & STAT_HOLIDAY)}
+        for day, flags in get_calendar().days()
+    ]
 
     if classroom_id:
         # Filter stats for a specific classroom
         try:
             classroom = Classroom.objects.get(id=classroom_id)
-            for entry in open_dates:
-                date = entry['date']  # Use dictionary access here
-                total_enrolled = Child.objects.filter(
-                    Q(enrollment_end_date__isnull=True) | Q(enrollment_end_date__gte=date),
-                    enrollment_start_date__lte=date,
-                    classroom=classroom
-                ).count()
-
-                stats.append({
-                    "date": date,
-                    "total_capacity": classroom.max_capacity,
-                    "total_enrolled": total_enrolled,
-                    "is_weekday": entry['is_weekday'],  # Include is_weekday field
-                    "is_stat_holiday": entry['is_stat_holiday'],  # Include is_stat_holiday field
-                })
         except Classroom.DoesNotExist:
             return Response({"error": "Classroom not found."}, status=404)
+        totals = occupancy_by_date((entry['date'] for entry in open_dates), classroom_id=classroom.id)
     else:
         # Default: Centre-wide stats
-        classrooms = Classroom.objects.all()
-        total_capacity = sum(c.max_capacity for c in classrooms)
-
-        for entry in open_dates:
-            date = entry['date']  # Use dictionary access here
-            total_enrolled = Child.objects.filter(
-                Q(enrollment_end_date__isnull=True) | Q(enrollment_end_date__gte=date),
-                enrollment_start_date__lte=date
-            ).count()
-
-            stats.append({
-                "date": date,
-                "total_capacity": total_capacity,
-                "total_enrolled": total_enrolled,
-                "is_weekday": entry['is_weekday'],  # Include is_weekday field
-                "is_stat_holiday": entry['is_stat_holiday'],  # Include is_stat_holiday field
-            })
+        totals = occupancy_by_date(entry['date'] for entry in open_dates)
+
+    stats = [
+        {
+            "date": entry['date'],
+            "total_capacity": totals[entry['date']]['capacity'],
+            "total_enrolled": totals[entry['date']]['enrolled'],
+            "is_weekday": entry['is_weekday'],
+            "is_stat_holiday": entry['is_stat_holiday'],
+        }
+        for entry in open_dates
+    ]
 
     return Response(stats)
 
@@ -265,9 +200,15 @@ def get_classrooms(request):
 
 
 class WithdrawalViewSet(ModelViewSet):
-    queryset = Withdrawal.objects.filter(withdrawal_date__gte=now().date())  # Exclude past withdrawals
+    queryset = Withdrawal.objects.all()
     serializer_class = WithdrawalSerializer
 
+    def get_queryset(self):
+        # Exclude past withdrawals, evaluated per request rather than at import time
+        return super().get_queryset().filter(withdrawal_date__gte=now().date()).annotate(
+            child_full_name=Concat('child__first_name', Value(' '), 'child__last_name')
+        )
+
     def create(self, request, *args, **kwargs):
         # Get the child ID from the request data
         child_id = request.data.get("child")
@@ -327,9 +268,18 @@ class ChildrenDropdownListView(ListAPIView):
 class TransitionViewSet(ModelViewSet):
     queryset = Transition.objects.all()
     serializer_class = TransitionSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        # Names and age are computed in the query instead of per row in the serializer
+        queryset = super().get_queryset().annotate(
+            child_full_name=Concat('child__first_name', Value(' '), 'child__last_name'),
+            classroom_name=F('next_classroom__classroom_name'),
+            age_in_months=(
+                (ExtractYear('transition_date') - ExtractYear('child__date_of_birth')) * 12
+                + ExtractMonth('transition_date') - ExtractMonth('child__date_of_birth')
+            ),
+        )
         future_only = self.request.query_params.get('future_only', None)
         if future_only:
             today = now().date()
@@ -337,6 +287,14 @@ class TransitionViewSet(ModelViewSet):
         return queryset
     
 
+class WaitlistEntryViewSet(ModelViewSet):
+    # Matches are stored on the entries and kept current by core/signals.py,
+    # so listing the waitlist never runs the matcher
+    queryset = WaitlistEntry.objects.select_related('matched_classroom').order_by('-priority', 'date_added', 'id')
+    serializer_class = WaitlistEntrySerializer
+    filterset_fields = ['program_type', 'status']
+
+
 class ChildrenListView(ListAPIView):
     queryset = Child.objects.all()
     serializer_class = ChildListSerializer
@@ -377,7 +335,7 @@ class AddChildView(APIView):
 
 class ClassroomsListView(APIView):
     def get(self, request):
-        classrooms = Classroom.objects.all()
+        classrooms = Classroom.objects.prefetch_related('alternative_capacities')
         serializer = ClassroomSerializer(classrooms, many=True)
         return Response(serializer.data)
 
@@ -393,9 +351,11 @@ class FamiliesListView(APIView):
 class FamilyListCreateView(generics.ListCreateAPIView):
     queryset = Family.objects.all()
     serializer_class = FamilySerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['parent_1_name', 'parent_1_email', 'parent_2_name']
     search_fields = ['parent_1_name', 'parent_1_email', 'parent_2_name']
+    # Keyset-paged on (field, id); each field has a matching index on Family
     ordering_fields = ['parent_1_name', 'parent_1_email']
     ordering = ['parent_1_name']  # Default ordering
     permission_classes = [IsAuthenticated]
@@ -406,10 +366,83 @@ class FamilyRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = FamilySerializer
 
 
+def _date_param(request, name, default):
+    value = request.GET.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else default
+
+
+@api_view(['GET'])
+def family_statement(request, pk):
+    # Account statement from the ledger: ?start=YYYY-MM-DD&end=YYYY-MM-DD,
+    # defaulting to the current month to date
+    family = get_object_or_404(Family, pk=pk)
+    today = date.today()
+    try:
+        start = _date_param(request, 'start', today.replace(day=1))
+        end = _date_param(request, 'end', today)
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    data = {"family_id": family.id, "start": start, "end": end, **ledger.statement(family.id, start, end)}
+    return Response(FamilyStatementSerializer(data).data)
+
+
+@api_view(['GET'])
+def family_aging(request, pk):
+    # Unpaid tuition by age as of ?date=YYYY-MM-DD (default today)
+    family = get_object_or_404(Family, pk=pk)
+    try:
+        day = _date_param(request, 'date', date.today())
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    return Response(FamilyAgingSerializer({
+        "family_id": family.id,
+        "date": day,
+        "balance": ledger.balance_as_of(family.id, day),
+        "aging": ledger.family_aging(family.id, day),
+    }).data)
+
+
+@api_view(['GET'])
+def ar_aging_report(request):
+    # Unpaid parent portions per family and for the centre, bucketed by days
+    # past due as of ?date=YYYY-MM-DD (default today)
+    try:
+        day = _date_param(request, 'date', date.today())
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    families, totals = ar_aging(day)
+    return Response(ArAgingReportSerializer({
+        "date": day, "families": families, "totals": totals, "total": sum(totals.values()),
+    }).data)
+
+
+@api_view(['GET'])
+def capacity_forecast_report(request):
+    # Projected enrolment per classroom from ?start=YYYY-MM-DD (default today)
+    # for ?months=N (12 by default, at most 24)
+    try:
+        start = _date_param(request, 'start', date.today())
+    except ValueError:
+        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    months = request.GET.get('months', '12')
+    if not months.isdigit() or not 1 <= int(months) <= 24:
+        return Response({"error": "months must be between 1 and 24."}, status=400)
+    return Response(CapacityForecastSerializer(capacity_forecast(start, int(months))).data)
+
+
+@api_view(['GET'])
+def family_balance(request, pk):
+    # Denormalized totals kept by core/payments.py, so this is a single read
+    family = get_object_or_404(Family.objects.select_related('balance'), pk=pk)
+    balance = getattr(family, 'balance', None) or FamilyBalance(family=family)
+    return Response(FamilyBalanceSerializer(balance).data)
+
+
 # CRUD views for Child
 class ChildListCreateView(generics.ListCreateAPIView):
     queryset = Child.objects.all()
     serializer_class = ChildSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = ['name', 'date_of_birth', 'allergy_info']
 
@@ -421,7 +454,7 @@ class ChildRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 
 # CRUD views for Classroom
 class ClassroomListCreateView(generics.ListCreateAPIView):
-    queryset = Classroom.objects.all()
+    queryset = Classroom.objects.prefetch_related('alternative_capacities')
     serializer_class = ClassroomSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = ['name']
@@ -441,6 +474,7 @@ class AlternativeCapacityListCreateView(generics.ListCreateAPIView):
 class AttendanceListCreateView(generics.ListCreateAPIView):
     queryset = Attendance.objects.all()
     serializer_class = AttendanceSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = ['date', 'notes']
 
@@ -454,7 +488,9 @@ class AttendanceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView)
 class PaymentListCreateView(generics.ListCreateAPIView):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter]
+    filterset_fields = ['family', 'payment_date']
     search_fields = ['payment_date', 'method', 'notes']
 
 
@@ -467,8 +503,10 @@ class PaymentRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 class InvoiceListCreateView(generics.ListCreateAPIView):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter]
-    search_fields = ['amount', 'date']
+    filterset_fields = ['family', 'payment_status', 'due_date']
+    search_fields = ['due_date', 'payment_status', 'notes']
 
 
 class InvoiceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
@@ -476,6 +514,26 @@ class InvoiceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = InvoiceSerializer
 
 
+# CSV exports, filtered like the list views above
+class AttendanceExportView(CsvExportMixin, AttendanceListCreateView):
+    export_fields = ('id', 'date', 'classroom_id', 'classroom__classroom_name', 'notes')
+    export_filename = 'attendance.csv'
+
+
+class PaymentExportView(CsvExportMixin, PaymentListCreateView):
+    export_fields = ('id', 'payment_date', 'family_id', 'child_id', 'amount_paid', 'method', 'notes')
+    export_filename = 'payments.csv'
+
+
+class InvoiceExportView(CsvExportMixin, InvoiceListCreateView):
+    export_fields = (
+        'id', 'date_issued', 'due_date', 'family_id', 'child_id', 'full_tuition', 'subsidy_amount',
+        'parent_portion', 'paid_amount', 'payment_status', 'billing_period_start', 'billing_period_end',
+        'adjusts_id', 'notes',
+    )
+    export_filename = 'invoices.csv'
+
+
 # CRUD views for GovernmentFunding
 class GovernmentFundingListCreateView(generics.ListCreateAPIView):
     queryset = GovernmentFunding.objects.all()
@@ -487,3 +545,11 @@ class GovernmentFundingListCreateView(generics.ListCreateAPIView):
 class GovernmentFundingRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = GovernmentFunding.objects.all()
     serializer_class = GovernmentFundingSerializer
+
+
+# Precomputed by the reconcile_funding command and on funding changes
+class FundingReconciliationListView(generics.ListAPIView):
+    queryset = FundingReconciliation.objects.order_by('-period_start', 'stream')
+    serializer_class = FundingReconciliationSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['stream', 'period_start']
@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from core.forecast import ClassroomSeats, add_months
+from core.models import WaitlistEntry
+
+# How far ahead a seat is looked for
+WAITLIST_MONTHS = 24
+
+
+def match_waitlist(program_types=None, today=None):
+    """Store the earliest feasible seat on every waiting entry.
+
+    Only entries for ``program_types`` are recomputed (every program if
+    None); a seat in one program never affects another. Offered entries
+    keep the seat they were matched to. Waiting entries are then matched in
+    one pass, highest priority first and oldest first within a priority,
+    each against the seat timelines of its program's rooms. A matched
+    entry takes its seat for good, so later entries only see what is left.
+    An entry with no seat in the next WAITLIST_MONTHS months is left
+    unmatched. Returns the number of entries updated.
+    """
+    today = today or date.today()
+    last = add_months(today, WAITLIST_MONTHS) - timedelta(days=1)
+    entries = WaitlistEntry.objects.filter(status__in=['Waiting', 'Offered'])
+    if program_types is not None:
+        entries = entries.filter(program_type__in=program_types)
+    entries = list(entries.order_by('-priority', 'date_added', 'id').only(
+        'program_type', 'desired_start_date', 'status', 'matched_classroom', 'matched_start_date'
+    ))
+    if not entries:
+        return 0
+
+    seats = ClassroomSeats(today, last)
+    waiting = []
+    for entry in entries:
+        if entry.status == 'Offered' and entry.matched_classroom_id in seats.seats and entry.matched_start_date:
+            seats.add(entry.matched_classroom_id, max(entry.matched_start_date, today), None, -1)
+        elif entry.status == 'Waiting':
+            waiting.append(entry)
+
+    matched_at = now()
+    for entry in waiting:
+        best = seats.earliest(entry.program_type, max(entry.desired_start_date, today))
+        entry.matched_start_date, entry.matched_classroom_id = best or (None, None)
+        entry.matched_at = matched_at
+        if best:
+            seats.add(entry.matched_classroom_id, entry.matched_start_date, None, -1)
+
+    with transaction.atomic():
+        WaitlistEntry.objects.bulk_update(
+            waiting, ['matched_classroom', 'matched_start_date', 'matched_at'], batch_size=1000
+        )
+    return len(waiting)
@@ -42,7 +42,7 @@ const ChildMovementSummary: React.FC = () => {
                 setEnrollments(enrollmentsResponse.data.results || enrollmentsResponse.data);
 
                 // Fetch upcoming transitions
-                const transitionsResponse = await axios.get('http://127.0.0.1:8000/api/transitions/');
+                const transitionsResponse = await axios.get('http://127.0.0.1:8000/api/transitions/?page_size=1000');
                 const sortedTransitions = (transitionsResponse.data.results || transitionsResponse.data).sort(
                     (a: Transition, b: Transition) =>
                         new Date(a.transition_date).getTime() - new Date(b.transition_date).getTime()
@@ -29,7 +29,7 @@ const EditChild: React.FC = () => {
     // Fetch the list of children
     useEffect(() => {
         const fetchAllChildren = async () => {
-            let url = "http://127.0.0.1:8000/api/children/";
+            let url = "http://127.0.0.1:8000/api/children/?page_size=1000";
             let allChildren: Child[] = [];
             try {
                 while (url) {
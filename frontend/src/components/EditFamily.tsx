@@ -33,7 +33,7 @@ const EditFamily: React.FC = () => {
     
                 // Fetch children (handle pagination)
                 const allChildren = [];
-                let childrenResponse = await axios.get("http://127.0.0.1:8000/api/children/");
+                let childrenResponse = await axios.get("http://127.0.0.1:8000/api/children/?page_size=1000");
                 allChildren.push(...childrenResponse.data.results);
     
                 // Fetch additional pages if they exist
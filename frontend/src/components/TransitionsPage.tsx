@@ -37,7 +37,7 @@ const TransitionsPage: React.FC = () => {
     // Fetch children
     useEffect(() => {
         const fetchAllChildren = async () => {
-            let url = "http://127.0.0.1:8000/api/children/";
+            let url = "http://127.0.0.1:8000/api/children/?page_size=1000";
             let allChildren = [];
     
             try {
@@ -74,7 +74,7 @@ const TransitionsPage: React.FC = () => {
 
     useEffect(() => {
         axios
-            .get('http://127.0.0.1:8000/api/transitions/?future_only=true') // Add query param for future transitions
+            .get('http://127.0.0.1:8000/api/transitions/?future_only=true&page_size=1000') // Add query param for future transitions
             .then((response) => {
                 const fetchedTransitions = response.data.results || response.data;
                 // Sort transitions chronologically by transition_date
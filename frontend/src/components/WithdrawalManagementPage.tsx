@@ -18,7 +18,7 @@ const WithdrawalManagementPage = () => {
     // Fetch children for dropdown
     useEffect(() => {
         const fetchAllChildren = async () => {
-            let url = "http://127.0.0.1:8000/api/children/";
+            let url = "http://127.0.0.1:8000/api/children/?page_size=1000";
             let allChildren = [];
             try {
                 while (url) {